@@ -0,0 +1,115 @@
+import os
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+from dotenv import load_dotenv
+
+from airtable_scheduler import AirtableScheduler, Priority, get_scheduler
+from http_transport import HttpTransport, get_transport
+from metrics import track_external
+
+# Load environment variables
+load_dotenv()
+
+AIRTABLE_API_URL = os.getenv('AIRTABLE_API_URL', 'https://api.airtable.com/v0').rstrip('/')
+# Airtable's maximum page size for list requests
+PAGE_SIZE = 100
+
+
+class AsyncAirtable:
+    """Minimal async Airtable table client on the shared pooled transport
+
+    Mirrors the subset of the airtable-python-wrapper API this app uses;
+    non-2xx responses raise httpx.HTTPStatusError. Requests go through the
+    shared AirtableScheduler: reads default to interactive priority and
+    writes to bulk, and identical concurrent get_all calls share one fetch.
+    """
+
+    def __init__(self, base_id: str, table_name: str, api_key: Optional[str],
+                 transport: Optional[HttpTransport] = None,
+                 scheduler: Optional[AirtableScheduler] = None):
+        self.base_id = base_id
+        self.table_name = table_name
+        self.url = f"{AIRTABLE_API_URL}/{base_id}/{quote(table_name, safe='')}"
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+        self._transport = transport
+        self._scheduler = scheduler
+
+    @property
+    def transport(self) -> HttpTransport:
+        return self._transport or get_transport()
+
+    @property
+    def scheduler(self) -> AirtableScheduler:
+        return self._scheduler or get_scheduler()
+
+    async def _request(self, method: str, url: str,
+                       priority: Priority = Priority.INTERACTIVE, **kwargs) -> Dict:
+        acquire = lambda: self.scheduler.acquire(self.base_id, priority)
+        await acquire()
+        with track_external('airtable'):
+            # Retries wait for their own rate-limit token, so they count against the base's limit too
+            response = await self.transport.request(
+                method, url, before_retry=acquire, headers=self.headers, **kwargs
+            )
+            response.raise_for_status()
+        return response.json()
+
+    async def get_all(self, formula: Optional[str] = None, fields: Optional[List[str]] = None,
+                      maxRecords: Optional[int] = None, sort: Optional[List[str]] = None,
+                      view: Optional[str] = None,
+                      priority: Priority = Priority.INTERACTIVE) -> List[Dict]:
+        """Fetch every matching record, following Airtable's offset pagination"""
+        params: Dict = {"pageSize": PAGE_SIZE}
+        if formula:
+            params["filterByFormula"] = formula
+        if fields:
+            params["fields[]"] = list(fields)
+        if maxRecords:
+            params["maxRecords"] = maxRecords
+            params["pageSize"] = min(PAGE_SIZE, maxRecords)
+        if view:
+            params["view"] = view
+        for i, field in enumerate(sort or []):
+            direction = "desc" if field.startswith('-') else "asc"
+            params[f"sort[{i}][field]"] = field.lstrip('-')
+            params[f"sort[{i}][direction]"] = direction
+
+        key = (self.url, tuple(sorted(
+            (name, tuple(value) if isinstance(value, list) else value)
+            for name, value in params.items()
+        )))
+        records = await self.scheduler.coalesce(
+            key, lambda: self._fetch_pages(params, maxRecords, priority)
+        )
+        # Callers sharing a fetch each get their own list
+        return list(records)
+
+    async def _fetch_pages(self, params: Dict, maxRecords: Optional[int],
+                           priority: Priority) -> List[Dict]:
+        records: List[Dict] = []
+        while True:
+            data = await self._request("GET", self.url, priority, params=params)
+            records.extend(data.get("records", []))
+            offset = data.get("offset")
+            if not offset or (maxRecords and len(records) >= maxRecords):
+                break
+            params["offset"] = offset
+        return records[:maxRecords] if maxRecords else records
+
+    async def get(self, record_id: str) -> Dict:
+        return await self._request("GET", f"{self.url}/{record_id}")
+
+    async def insert(self, fields: Dict, typecast: bool = False) -> Dict:
+        return await self._request(
+            "POST", self.url, Priority.BULK, json={"fields": fields, "typecast": typecast}
+        )
+
+    async def update(self, record_id: str, fields: Dict, typecast: bool = False) -> Dict:
+        return await self._request(
+            "PATCH", f"{self.url}/{record_id}", Priority.BULK,
+            json={"fields": fields, "typecast": typecast}
+        )
+
+    async def delete(self, record_id: str) -> Dict:
+        return await self._request("DELETE", f"{self.url}/{record_id}", Priority.BULK)
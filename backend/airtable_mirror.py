@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from airtable_scheduler import Priority
+from filter_index import FilterIndex
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds between incremental syncs
+SYNC_INTERVAL = float(os.getenv('AIRTABLE_SYNC_INTERVAL', '30'))
+# Every N incremental syncs a full sync runs to pick up deleted records
+FULL_SYNC_EVERY = int(os.getenv('AIRTABLE_FULL_SYNC_EVERY', '20'))
+# Re-read records modified this many seconds before the last sync to absorb clock skew
+SYNC_OVERLAP = 5
+
+ChangeListener = Callable[[List[str], List[str]], None]
+
+
+class AirtableMirror:
+    """Local copy of an Airtable table, kept current by incremental last-modified syncs
+
+    get_client returns the Airtable client and is called on every sync, so
+    the client can be created lazily.
+    """
+
+    def __init__(self, get_client: Callable, sync_interval: float = SYNC_INTERVAL,
+                 full_sync_every: int = FULL_SYNC_EVERY):
+        self.get_client = get_client
+        self.sync_interval = sync_interval
+        self.full_sync_every = full_sync_every
+
+        # Replaced wholesale on every sync so readers always see a consistent snapshot
+        self.records: Dict[str, Dict] = {}
+        self.index = FilterIndex([])
+        # Bumped whenever the mirrored data changes
+        self.version = 0
+        self.last_synced_at: Optional[datetime] = None
+
+        self._syncs_since_full = 0
+        self._sync_lock = asyncio.Lock()
+        self._listeners: List[ChangeListener] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.last_synced_at is not None
+
+    def add_listener(self, listener: ChangeListener):
+        """Register a callback invoked with (changed_ids, removed_ids) after each sync that changes data"""
+        self._listeners.append(listener)
+
+    async def sync(self, full: bool = False) -> Dict[str, int]:
+        """Pull changes from Airtable into the mirror"""
+        async with self._sync_lock:
+            started_at = datetime.now(timezone.utc)
+            full = full or not self.ready or self._syncs_since_full >= self.full_sync_every
+
+            if full:
+                fetched = await self.get_client().get_all(priority=Priority.BACKGROUND)
+                records = {record['id']: record for record in fetched}
+                removed = [record_id for record_id in self.records if record_id not in records]
+                self._syncs_since_full = 0
+            else:
+                since = self.last_synced_at - timedelta(seconds=SYNC_OVERLAP)
+                formula = (
+                    "IS_AFTER(LAST_MODIFIED_TIME(), "
+                    f"DATETIME_PARSE('{since.strftime('%Y-%m-%dT%H:%M:%S.000Z')}'))"
+                )
+                fetched = await self.get_client().get_all(
+                    formula=formula, priority=Priority.BACKGROUND
+                )
+                records = dict(self.records)
+                records.update((record['id'], record) for record in fetched)
+                removed = []
+                self._syncs_since_full += 1
+
+            changed = [
+                record['id'] for record in fetched
+                if self.records.get(record['id']) != record
+            ]
+
+            if changed or removed or full:
+                # Building the index is CPU-bound, keep it off the event loop
+                self.index = await asyncio.to_thread(FilterIndex, list(records.values()))
+            self.records = records
+            self.last_synced_at = started_at
+            if changed or removed:
+                self.version += 1
+
+        if changed or removed:
+            logger.info(
+                f"Airtable mirror synced ({'full' if full else 'incremental'}): "
+                f"{len(changed)} changed, {len(removed)} removed, {len(records)} total"
+            )
+            for listener in self._listeners:
+                try:
+                    listener(changed, removed)
+                except Exception as e:
+                    logger.error(f"Airtable mirror listener failed: {e}")
+
+        return {"changed": len(changed), "removed": len(removed), "total": len(records)}
+
+    async def run(self):
+        """Sync forever, logging (not raising) Airtable failures"""
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Airtable mirror sync failed: {e}")
+            await asyncio.sleep(self.sync_interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
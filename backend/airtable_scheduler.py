@@ -0,0 +1,181 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from shared_state import SharedTokenBucket, get_shared_state
+from single_flight import SingleFlight
+
+# Load environment variables
+load_dotenv()
+
+# Requests per second allowed per Airtable base
+AIRTABLE_RATE_LIMIT = float(os.getenv('AIRTABLE_RATE_LIMIT', '5'))
+# Requests that may be sent back to back after an idle period
+AIRTABLE_RATE_BURST = int(os.getenv('AIRTABLE_RATE_BURST', '5'))
+
+
+class Priority(IntEnum):
+    """Lower values are sent first when requests queue up"""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+    BULK = 2
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    async def try_take(self) -> float:
+        """Take a token if one is available; returns 0, or the seconds to wait"""
+        delay = self.delay()
+        if delay == 0:
+            self.take()
+        return delay
+
+
+class BaseQueue:
+    """Waiting requests for one base, granted in priority order as tokens refill"""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        # Token taken from the bucket but not yet handed to a waiter
+        self.spare_token = False
+        self.waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self.task: Optional[asyncio.Task] = None
+        self.granted = 0
+        self.max_depth = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+
+class AirtableScheduler:
+    """Central rate limiter for Airtable with request coalescing
+
+    Every Airtable request takes a token from its base's bucket; when the
+    bucket is empty, requests wait and are granted interactive first, then
+    background, then bulk. Identical reads in flight at the same time share
+    one fetch. bucket_factory builds the bucket for a base; pass one backed by
+    shared state to hold several worker processes to a single limit.
+    """
+
+    def __init__(self, rate: float = AIRTABLE_RATE_LIMIT, burst: int = AIRTABLE_RATE_BURST,
+                 bucket_factory: Optional[Callable[[str], Any]] = None):
+        self.rate = rate
+        self.burst = burst
+        self.bucket_factory = bucket_factory or (lambda base_id: TokenBucket(self.rate, self.burst))
+        self._bases: Dict[str, BaseQueue] = {}
+        self._sequence = itertools.count()
+        self._inflight = SingleFlight()
+
+    def _queue(self, base_id: str) -> BaseQueue:
+        queue = self._bases.get(base_id)
+        if queue is None:
+            queue = self._bases[base_id] = BaseQueue(self.bucket_factory(base_id))
+        return queue
+
+    async def acquire(self, base_id: str, priority: Priority = Priority.INTERACTIVE):
+        """Wait until a request to this base may be sent"""
+        queue = self._queue(base_id)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(queue.waiters, (priority, next(self._sequence), future))
+        queue.max_depth = max(queue.max_depth, len(queue.waiters))
+        if queue.task is None or queue.task.done() or queue.task.get_loop() is not loop:
+            queue.task = asyncio.create_task(self._dispatch(queue))
+
+        started = time.monotonic()
+        await future
+        waited = time.monotonic() - started
+        queue.wait_seconds_total += waited
+        queue.wait_seconds_max = max(queue.wait_seconds_max, waited)
+
+    async def _dispatch(self, queue: BaseQueue):
+        while queue.waiters:
+            future = queue.waiters[0][2]
+            if future.done():
+                # Caller gave up while waiting
+                heapq.heappop(queue.waiters)
+                continue
+            if not queue.spare_token:
+                delay = await queue.bucket.try_take()
+                if delay > 0:
+                    # Re-check the head afterwards, a higher-priority request may have arrived
+                    await asyncio.sleep(delay)
+                    continue
+                # A shared bucket is read off the loop, so look at the head again before granting
+                queue.spare_token = True
+                continue
+            heapq.heappop(queue.waiters)
+            queue.spare_token = False
+            queue.granted += 1
+            future.set_result(None)
+
+    @property
+    def coalesced(self) -> int:
+        """Requests that joined an identical one in flight instead of being sent"""
+        return self._inflight.joined
+
+    async def coalesce(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Run call, or join an identical one already in flight"""
+        result, _ = self._inflight.join(key, lambda _: call())
+        return await result
+
+    def stats(self) -> Dict:
+        return {
+            "rate_limit": self.rate,
+            "burst": self.burst,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+            "bases": {
+                base_id: {
+                    "queue_depth": sum(1 for _, _, future in queue.waiters if not future.done()),
+                    "max_queue_depth": queue.max_depth,
+                    "granted": queue.granted,
+                    "wait_seconds_total": queue.wait_seconds_total,
+                    "wait_seconds_max": queue.wait_seconds_max,
+                }
+                for base_id, queue in self._bases.items()
+            },
+        }
+
+
+_scheduler: Optional[AirtableScheduler] = None
+
+
+def get_scheduler() -> AirtableScheduler:
+    """The process-wide scheduler shared by every Airtable client
+
+    With shared state enabled, all workers on the host draw from one bucket per base.
+    """
+    global _scheduler
+    if _scheduler is None:
+        state = get_shared_state()
+        bucket_factory = None
+        if state is not None:
+            bucket_factory = lambda base_id: SharedTokenBucket(
+                state, f"airtable:{base_id}", AIRTABLE_RATE_LIMIT, AIRTABLE_RATE_BURST
+            )
+        _scheduler = AirtableScheduler(bucket_factory=bucket_factory)
+    return _scheduler
@@ -1,18 +1,57 @@
-from fastapi import FastAPI, WebSocket, HTTPException
+import time  # Add this import at the top
+
+# Cold-start timer, started before the heavier imports below
+STARTUP_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Header, Query
 from pydantic import BaseModel
-from typing import List, Dict, Optional, Set
-from airtable import Airtable
+from typing import Awaitable, Callable, List, Dict, NamedTuple, Optional, Tuple, Union
+from airtable_client import AsyncAirtable
+from airtable_scheduler import Priority, get_scheduler
 from document_reference import DocumentReference
-from construction_ai_agent import ConstructionAIAgent
+from construction_ai_agent import ConstructionInsight, close_agent, get_agent
+from airtable_mirror import AirtableMirror
+from catalog import CatalogService
+from filter_index import FilterIndex
+from facets import FacetCache, compute_facets
+from http_transport import close_transport
+from insight_pipeline import InsightPipeline, insight_key
+from insight_prewarm import PREWARM_ON_SYNC, PREWARM_RESUME, InsightPrewarmer, PrewarmBusy
+from chat_sessions import ChatSession, ChatSessionStore
+from metrics import REGISTRY, STAGE_SECONDS, STREAMS, MetricsMiddleware
+from llm_usage import GROUP_FIELDS, LEDGER, LLMBudgetExceeded, LLMUsageMiddleware
+from progress_hub import BROADCAST_TOPIC, ProgressHub
+from response_cache import CachedResponse, ResponseCache, etag_matches, make_entry
+from shared_state import ProgressBroker, get_shared_state
+from response_encoding import (
+    COMPRESS_MIN_SIZE,
+    JSON_MEDIA_TYPE,
+    compress,
+    dumps_json,
+    encode,
+    negotiate_content_encoding,
+    negotiate_media_type,
+    parse_list,
+    project,
+)
+from pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    canonical_filter,
+    decode_cursor,
+    encode_cursor,
+    filter_fingerprint,
+)
+import asyncio
+import functools
 import os
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import logging
-import time  # Add this import at the top
+from contextlib import asynccontextmanager
 from functools import lru_cache
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import httpx
 
 # Load environment variables
 load_dotenv()
@@ -21,7 +60,37 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background work without blocking on Airtable; the app serves immediately"""
+    log_environment()
+    mirror.start()
+    catalog.start()
+    progress_broker.start()
+    connection_check = asyncio.create_task(check_airtable_connection())
+    if PREWARM_RESUME:
+        await insight_prewarmer.resume()
+    
+    app.state.startup_seconds = time.perf_counter() - STARTUP_STARTED
+    logger.info(f"Startup completed in {app.state.startup_seconds:.3f}s")
+    
+    yield
+    
+    connection_check.cancel()
+    await insight_prewarmer.stop()
+    await chat_sessions.stop()
+    await progress_broker.stop()
+    await catalog.stop()
+    await mirror.stop()
+    await close_transport()
+    await close_agent()
+
+app = FastAPI(lifespan=lifespan)
+
+# Per-route latency and in-flight requests for /metrics
+app.add_middleware(MetricsMiddleware)
+# LLM tokens and cost per request, checked against the request's budget
+app.add_middleware(LLMUsageMiddleware)
 
 # Add CORS middleware
 app.add_middleware(
@@ -30,64 +99,45 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Chat-Session", "X-LLM-Tokens", "X-LLM-Cost"],
 )
 
-# Store active WebSocket connections
-active_connections: Set[WebSocket] = set()
+# Progress pub/sub: clients subscribe to a topic, analytics requests publish to one;
+# the broker relays updates to sockets held by other worker processes
+progress_hub = ProgressHub()
+progress_broker = ProgressBroker(progress_hub, get_shared_state())
 
 # WebSocket connection handler
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, topic: str = BROADCAST_TOPIC):
     await websocket.accept()
-    active_connections.add(websocket)
+    subscriber = progress_hub.subscribe(websocket, topic)
     try:
         while True:
             # Keep the connection alive
             await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
-        active_connections.remove(websocket)
-
-# Helper function to send updates to all connected clients
-async def broadcast_progress(message: str, progress: float = None):
-    for connection in active_connections:
-        try:
-            await connection.send_json({
-                "message": message,
-                "progress": progress
-            })
-        except Exception as e:
-            logger.error(f"Error broadcasting to client: {e}")
-            active_connections.remove(connection)
-
-# Configure retry strategy
-retry_strategy = Retry(
-    total=3,  # number of retries
-    backoff_factor=1,  # wait 1, 2, 4 seconds between retries
-    status_forcelist=[429, 500, 502, 503, 504]  # HTTP status codes to retry on
-)
+        progress_hub.unsubscribe(subscriber)
 
-# Create a session with the retry strategy
-session = requests.Session()
-adapter = HTTPAdapter(
-    max_retries=retry_strategy,
-    pool_connections=10,
-    pool_maxsize=10
-)
-session.mount("https://", adapter)
-session.timeout = 30  # Set timeout for all requests
-
-# After load_dotenv()
-logger.info("Environment variables:")
-logger.info(f"AIRTABLE_BASE_ID: {os.getenv('AIRTABLE_BASE_ID')}")
-logger.info(f"AIRTABLE_TABLE_NAME: {os.getenv('AIRTABLE_TABLE_NAME')}")
-if os.getenv('AIRTABLE_API_KEY'):
-    logger.info("AIRTABLE_API_KEY: [Present]")
-else:
-    logger.info("AIRTABLE_API_KEY: [Missing]")
-
-# Initialize Airtable with environment variables and error checking
+# Helper function to send updates to the clients subscribed to a topic
+async def broadcast_progress(message: str, progress: float = None, topic: str = BROADCAST_TOPIC):
+    with STAGE_SECONDS.time(stage="progress_broadcast"):
+        progress_broker.publish(topic, message, progress)
+
+def log_environment():
+    logger.info("Environment variables:")
+    logger.info(f"AIRTABLE_BASE_ID: {os.getenv('AIRTABLE_BASE_ID')}")
+    logger.info(f"AIRTABLE_TABLE_NAME: {os.getenv('AIRTABLE_TABLE_NAME')}")
+    if os.getenv('AIRTABLE_API_KEY'):
+        logger.info("AIRTABLE_API_KEY: [Present]")
+    else:
+        logger.info("AIRTABLE_API_KEY: [Missing]")
+
+# Airtable settings; the client itself is created on first use
 airtable_base_id = "appuojNVDfs9U7ccy"
 airtable_table_name = "tbl60mtZmcPavvtQH"  # BIM Layers table
 airtable_api_key = os.getenv('AIRTABLE_API_KEY')
@@ -100,7 +150,10 @@ AIRTABLE_DURATION_FIELD = "Duration"
 # Add these constants near the top with other constants
 MIN_PHASE = 0
 MAX_PHASE = 16
-DEFAULT_MAX_RECORDS = 3
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
 
 # Add this validation function
 def validate_phase_range(phase_range: tuple[int, int]) -> tuple[int, int]:
@@ -117,109 +170,55 @@ def validate_phase_range(phase_range: tuple[int, int]) -> tuple[int, int]:
         )
     return phase_range
 
-# Add WBS categories cache
 @lru_cache(maxsize=1)
-def get_wbs_categories_cached():
-    """Cache WBS categories to avoid frequent Airtable calls"""
-    records = airtable.get_all(fields=[AIRTABLE_WBS_FIELD])
-    return list(set(
-        record['fields'].get(AIRTABLE_WBS_FIELD)
-        for record in records
-        if AIRTABLE_WBS_FIELD in record['fields']
-    ))
-
-# Test direct API access first
-try:
-    headers = {
-        'Authorization': f'Bearer {airtable_api_key}',
-        'Content-Type': 'application/json'
-    }
-    
-    # Test endpoint
-    test_url = f"https://api.airtable.com/v0/{airtable_base_id}/{airtable_table_name}"
-    
-    logger.info(f"Testing connection to Airtable...")
-    logger.info(f"URL: {test_url}")
-    logger.info(f"API Key starts with: {airtable_api_key[:10]}...")
-    
-    response = requests.get(
-        test_url,
-        headers=headers,
-        params={'maxRecords': 1}
-    )
-    
-    # Log the full response for debugging
-    logger.info(f"Response Status Code: {response.status_code}")
-    logger.info(f"Response Headers: {response.headers}")
-    logger.info(f"Response Body: {response.text[:500]}...")  # First 500 chars
-    
-    response.raise_for_status()
-    
-    data = response.json()
-    logger.info("Successfully connected to Airtable!")
-    logger.info(f"Retrieved {len(data.get('records', []))} records")
-    
-    # If we get here, the connection was successful
-    # Now initialize the regular Airtable client
-    airtable = Airtable(
+def get_airtable() -> AsyncAirtable:
+    """Create the Airtable client on first use"""
+    client = AsyncAirtable(
         base_id=airtable_base_id,
         table_name=airtable_table_name,
         api_key=airtable_api_key
     )
-    
-    # Store airtable client in app state
-    app.state.airtable = airtable
+    app.state.airtable = client
     logger.info("Airtable client initialized successfully")
-    
-    # Get the first record to see field names
-    response = requests.get(
-        f"https://api.airtable.com/v0/{airtable_base_id}/{airtable_table_name}",
-        headers={
-            'Authorization': f'Bearer {airtable_api_key}',
-            'Content-Type': 'application/json'
-        },
-        params={'maxRecords': 1}
-    )
-    data = response.json()
-    if 'records' in data and len(data['records']) > 0:
-        fields = data['records'][0]['fields']
-        logger.info("Available fields in Airtable:")
-        for field_name in fields.keys():
-            logger.info(f"  - {field_name}")
-    
-except Exception as e:
-    logger.error(f"Error: {str(e)}")
-    logger.error("Please verify:")
-    logger.error("1. Your API key starts with 'pat.'")
-    logger.error("2. You have access to the base")
-    logger.error("3. The table ID is correct")
-    logger.error("4. Your token has the correct permissions")
-    raise
-
-# After initial imports and before FastAPI setup
-try:
-    # Get metadata about the base
-    meta_url = f"https://api.airtable.com/v0/meta/bases/{airtable_base_id}/tables"
-    response = requests.get(
-        meta_url,
-        headers={
-            'Authorization': f'Bearer {airtable_api_key}',
-            'Content-Type': 'application/json'
-        }
-    )
-    response.raise_for_status()
-    tables_data = response.json()
-    
-    logger.info("\nAvailable tables in this base:")
-    for table in tables_data.get('tables', []):
-        logger.info(f"\nTable: {table.get('name')} (ID: {table.get('id')})")
-        logger.info("Fields:")
-        for field in table.get('fields', []):
-            logger.info(f"  - {field.get('name')} (Type: {field.get('type')})")
-            
-except Exception as e:
-    logger.error(f"Error getting table metadata: {e}")
-    raise
+    return client
+
+# Local mirror of the table, answers analytics filters once the first sync completes
+mirror = AirtableMirror(get_airtable)
+app.state.mirror = mirror
+
+# Distinct WBS/Division/Phase values, refreshed when the mirror changes
+catalog = CatalogService(mirror, get_airtable)
+
+# Seconds a connectivity result stays fresh for /api/ready
+READINESS_CHECK_TTL = 30
+
+# Last known Airtable connectivity, refreshed in the background
+airtable_status: Dict = {"ok": None, "checked_at": None, "error": None}
+airtable_check: Optional[asyncio.Task] = None
+
+async def check_airtable_connection() -> Dict:
+    """Probe Airtable and record the outcome"""
+    try:
+        await get_airtable().get_all(maxRecords=1)
+        airtable_status.update(ok=True, error=None)
+    except Exception as e:
+        logger.error(f"Airtable connectivity check failed: {e}")
+        logger.error("Please verify:")
+        logger.error("1. Your API key starts with 'pat.'")
+        logger.error("2. You have access to the base")
+        logger.error("3. The table ID is correct")
+        logger.error("4. Your token has the correct permissions")
+        airtable_status.update(ok=False, error=str(e))
+    airtable_status["checked_at"] = time.time()
+    return airtable_status
+
+def refresh_airtable_status():
+    """Start a background connectivity check if the last result is stale"""
+    global airtable_check
+    checked_at = airtable_status["checked_at"]
+    stale = checked_at is None or time.time() - checked_at > READINESS_CHECK_TTL
+    if stale and (airtable_check is None or airtable_check.done()):
+        airtable_check = asyncio.create_task(check_airtable_connection())
 
 # Pydantic models for request/response
 class AnalyticsRequest(BaseModel):
@@ -233,6 +232,8 @@ class AnalyticsResponse(BaseModel):
     document_references: Dict
     ai_insights: Dict
     processing_time: float
+    next_cursor: Optional[str] = None
+    total: int = 0
 
 class ChatRequest(BaseModel):
     item_key: Optional[str] = None
@@ -240,144 +241,448 @@ class ChatRequest(BaseModel):
     phase: Optional[str] = None
     division: Optional[str] = None
     wbs: Optional[str] = None
+    # Include notes specific to this element on top of its family's shared insight
+    element_notes: bool = False
+    # Continue this conversation; a new session is started when omitted or no longer held
+    session_id: Optional[str] = None
 
-# Add cache for AI insights
-@lru_cache(maxsize=100)
-def get_cached_ai_insights(item_key: str, phase: str, division: str, wbs: str):
-    """Cache AI insights based on key item parameters"""
-    ai_agent = ConstructionAIAgent()
-    return ai_agent.generate_construction_insight({
-        'key': item_key,
-        'Phase': phase,
-        'Division': division,
-        'WBS Category Level 1': wbs
-    })
+# Concurrent AI insight generation backed by the shared on-disk insight cache
+insight_pipeline = InsightPipeline()
+# Chat history per session, older turns summarized by the shared agent
+chat_sessions = ChatSessionStore(
+    summarize=lambda summary, turns: get_agent().asummarize_chat(summary, turns)
+)
 
-@app.post("/api/analytics", response_model=AnalyticsResponse)
-async def get_analytics(request: AnalyticsRequest, max_records: int = DEFAULT_MAX_RECORDS):
+async def load_prewarm_records() -> List[Dict]:
+    """Every record, from the mirror once it has synced, else from Airtable at background priority"""
+    if mirror.ready:
+        return list(mirror.records.values())
+    return await get_airtable().get_all(priority=Priority.BACKGROUND)
+
+# Fills the insight cache ahead of users, resumable from its checkpoint
+insight_prewarmer = InsightPrewarmer(insight_pipeline, load_prewarm_records,
+                                     get_record=lambda record_id: mirror.records.get(record_id))
+if PREWARM_ON_SYNC:
+    mirror.add_listener(insight_prewarmer.on_sync)
+
+# Facet results per filter, dropped whenever the mirror's data version changes
+facet_cache = FacetCache()
+
+# Serialized /api/analytics pages, keyed by canonical filter, page size and cursor
+analytics_cache = ResponseCache()
+
+ProgressReporter = Callable[..., Awaitable[None]]
+
+async def no_progress(message: str, progress: float = None):
+    pass
+
+class AnalyticsPage(NamedTuple):
+    records: List[Dict]
+    next_cursor: Optional[str]
+    total: int
+
+async def load_filter_index(request: AnalyticsRequest,
+                            progress: ProgressReporter = broadcast_progress) -> FilterIndex:
+    """Validate the analytics filter and return an index holding at least its matching records
+
+    This is the mirror's index once it has synced; until then the Airtable
+    formula matches are fetched and indexed on the fly.
+    """
+    # Validate phase range
+    validate_phase_range(request.phase_range)
+    
+    # Build filter formula with error handling
     try:
-        start_time = time.time()
-        await broadcast_progress("Starting analysis...", 0)
+        filter_parts = []
         
-        # Validate phase range
-        validate_phase_range(request.phase_range)
+        # Phase range filter - remove quotes around numbers
+        phase_filter = f"AND({{{AIRTABLE_PHASE_FIELD}}} >= {request.phase_range[0]}, {{{AIRTABLE_PHASE_FIELD}}} <= {request.phase_range[1]})"
+        filter_parts.append(phase_filter)
         
-        # Build filter formula with error handling
-        try:
-            filter_parts = []
-            
-            # Phase range filter - remove quotes around numbers
-            phase_filter = f"AND({{{AIRTABLE_PHASE_FIELD}}} >= {request.phase_range[0]}, {{{AIRTABLE_PHASE_FIELD}}} <= {request.phase_range[1]})"
-            filter_parts.append(phase_filter)
-            
-            # WBS Category filter with validation
-            if request.wbs_categories:
-                valid_categories = get_wbs_categories_cached()
-                invalid_categories = set(request.wbs_categories) - set(valid_categories)
-                if invalid_categories:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Invalid WBS categories: {', '.join(invalid_categories)}"
-                    )
-                
-                wbs_conditions = [
-                    f"{{{AIRTABLE_WBS_FIELD}}} = '{category}'"
-                    for category in request.wbs_categories
-                ]
-                wbs_filter = f"OR({','.join(wbs_conditions)})"
-                filter_parts.append(wbs_filter)
-            
-            # Duration filter
-            duration_filter = f"AND({{{AIRTABLE_DURATION_FIELD}}} >= {request.duration_range[0]}, {{{AIRTABLE_DURATION_FIELD}}} <= {request.duration_range[1]})"
-            filter_parts.append(duration_filter)
-            
-            filter_formula = f"AND({','.join(filter_parts)})"
-            logger.info(f"Using filter formula: {filter_formula}")
+        # WBS Category filter with validation
+        if request.wbs_categories:
+            await catalog.ensure_ready()
+            invalid_categories = catalog.invalid_wbs_categories(request.wbs_categories)
+            if invalid_categories:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid WBS categories: {', '.join(invalid_categories)}"
+                )
             
-        except Exception as e:
-            logger.error(f"Error building filter formula: {e}")
-            raise HTTPException(status_code=400, detail=f"Error building filter: {str(e)}")
-
-        await broadcast_progress("Querying Airtable...", 0.1)
+            wbs_conditions = [
+                f"{{{AIRTABLE_WBS_FIELD}}} = '{category}'"
+                for category in request.wbs_categories
+            ]
+            wbs_filter = f"OR({','.join(wbs_conditions)})"
+            filter_parts.append(wbs_filter)
         
-        try:
-            records = airtable.get_all(
-                formula=filter_formula,
-                maxRecords=max_records
-            )
-        except requests.exceptions.Timeout:
-            logging.error("Airtable request timed out")
-            await broadcast_progress("Airtable request timed out. Please try again.", -1)
-            raise HTTPException(status_code=504, detail="Airtable request timed out")
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Airtable request failed: {e}")
-            await broadcast_progress("Failed to fetch data from Airtable.", -1)
-            raise HTTPException(status_code=502, detail="Failed to fetch data from Airtable")
-            
-        if not records:
-            await broadcast_progress("No records found matching the criteria.", -1)
-            return AnalyticsResponse(
-                items=[],
-                document_references={},
-                ai_insights={},
-                processing_time=time.time() - start_time
+        # Duration filter
+        duration_filter = f"AND({{{AIRTABLE_DURATION_FIELD}}} >= {request.duration_range[0]}, {{{AIRTABLE_DURATION_FIELD}}} <= {request.duration_range[1]})"
+        filter_parts.append(duration_filter)
+        
+        filter_formula = f"AND({','.join(filter_parts)})"
+        logger.info(f"Using filter formula: {filter_formula}")
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error building filter formula: {e}")
+        raise HTTPException(status_code=400, detail=f"Error building filter: {str(e)}")
+
+    await progress("Querying Airtable...", 0.1)
+    
+    if mirror.ready:
+        # Served from the local mirror, no Airtable round trip
+        return mirror.index
+    
+    try:
+        records = await get_airtable().get_all(formula=filter_formula)
+    except httpx.TimeoutException:
+        logging.error("Airtable request timed out")
+        await progress("Airtable request timed out. Please try again.", -1)
+        raise HTTPException(status_code=504, detail="Airtable request timed out")
+    except httpx.HTTPError as e:
+        logging.error(f"Airtable request failed: {e}")
+        await progress("Failed to fetch data from Airtable.", -1)
+        raise HTTPException(status_code=502, detail="Failed to fetch data from Airtable")
+    
+    # Index the matches so paging and division matching behave exactly as with the mirror
+    return FilterIndex(records)
+
+def analytics_filter_fingerprint(request: AnalyticsRequest) -> str:
+    return filter_fingerprint(canonical_filter(
+        request.phase_range,
+        request.wbs_categories,
+        request.duration_range,
+        request.selected_divisions
+    ))
+
+async def fetch_analytics_records(request: AnalyticsRequest, page_size: int,
+                                  cursor: Optional[str] = None,
+                                  progress: ProgressReporter = broadcast_progress) -> AnalyticsPage:
+    """Return one page of records matching the analytics filter, from the mirror or Airtable"""
+    fingerprint = analytics_filter_fingerprint(request)
+    try:
+        after = decode_cursor(cursor, fingerprint)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    with STAGE_SECONDS.time(stage="airtable_fetch"):
+        index = await load_filter_index(request, progress)
+    with STAGE_SECONDS.time(stage="index_query"):
+        records, next_after, total = index.page(
+            phase_range=request.phase_range,
+            wbs_categories=request.wbs_categories,
+            duration_range=request.duration_range,
+            divisions=request.selected_divisions,
+            after=after,
+            limit=page_size
+        )
+    next_cursor = encode_cursor(next_after, fingerprint) if next_after is not None else None
+    return AnalyticsPage(records=records, next_cursor=next_cursor, total=total)
+
+class Projection(NamedTuple):
+    """Which parts of each analytics item to send; None means everything"""
+    fields: Optional[Tuple[str, ...]] = None
+    insight_sections: Optional[Tuple[str, ...]] = None
+    # Drop empty insight sections and the top-level copies of the last item
+    compact: bool = False
+
+FULL_PROJECTION = Projection()
+
+def parse_projection(fields: Optional[str], insight_sections: Optional[str],
+                     compact: bool) -> Projection:
+    sections = parse_list(insight_sections)
+    if sections is not None:
+        unknown = set(sections) - set(ConstructionInsight.model_fields)
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown insight sections: {', '.join(sorted(unknown))}"
             )
-            
-        await broadcast_progress(f"Processing {len(records)} records...", 0.2)
+    field_names = parse_list(fields)
+    return Projection(
+        fields=tuple(field_names) if field_names is not None else None,
+        insight_sections=tuple(sections) if sections is not None else None,
+        compact=compact
+    )
+
+def build_analytics_item(record: Dict, ai_insights: Union[ConstructionInsight, LLMBudgetExceeded],
+                         doc_reference: DocumentReference,
+                         projection: Projection = FULL_PROJECTION) -> Dict:
+    """Build one response item; an insight refused by the LLM budget is flagged instead of left out"""
+    item_data = record['fields']
+    item = {
+        'item_data': project(item_data, projection.fields),
+        'document_references': doc_reference.get_document_references(item_data),
+    }
+    if isinstance(ai_insights, LLMBudgetExceeded):
+        item['ai_insights'] = {}
+        item['budget_exceeded'] = True
+    else:
+        item['ai_insights'] = project(
+            ai_insights.model_dump(), projection.insight_sections, drop_empty=projection.compact
+        )
+    return item
+
+def encode_stream_frame(frame: Dict, stream_format: str) -> bytes:
+    data = dumps_json(frame)
+    if stream_format == "sse":
+        return f"event: {frame['type']}\ndata: ".encode() + data + b"\n\n"
+    return data + b"\n"
+
+async def stream_analytics(page: AnalyticsPage, start_time: float, stream_format: str,
+                           projection: Projection = FULL_PROJECTION, element_notes: bool = False):
+    """Yield one frame per processed item as soon as its insight is ready, then a summary frame"""
+    records = page.records
+    doc_reference = DocumentReference()
+    count = 0
+    try:
+        async for index, ai_insights in insight_pipeline.iter_completed(
+            [insight_key(record['fields']) for record in records], element_notes
+        ):
+            if ai_insights is None:
+                continue
+            try:
+                item = build_analytics_item(records[index], ai_insights, doc_reference, projection)
+            except Exception as e:
+                logging.error(f"Error processing record {index + 1}: {e}")
+                continue
+            count += 1
+            yield encode_stream_frame({"type": "item", "index": index, "item": item}, stream_format)
+    except Exception as e:
+        logging.error("Error streaming analytics: %s", str(e), exc_info=True)
+        yield encode_stream_frame({"type": "error", "detail": str(e)}, stream_format)
+    
+    yield encode_stream_frame({
+        "type": "summary",
+        "count": count,
+        "page_size": len(records),
+        "total": page.total,
+        "next_cursor": page.next_cursor,
+        "processing_time": time.time() - start_time
+    }, stream_format)
+
+async def analyze_page(request: AnalyticsRequest, page_size: int, cursor: Optional[str],
+                       report_progress: ProgressReporter,
+                       projection: Projection = FULL_PROJECTION,
+                       element_notes: bool = False) -> Tuple[AnalyticsResponse, bool]:
+    """Build one analytics page; the flag is False when some insights could not be generated"""
+    start_time = time.time()
+    await report_progress("Starting analysis...", 0)
+    
+    page = await fetch_analytics_records(request, page_size, cursor, progress=report_progress)
+    records = page.records
+    
+    if not records:
+        await report_progress("No records found matching the criteria.", -1)
+        return AnalyticsResponse(
+            items=[],
+            document_references={},
+            ai_insights={},
+            processing_time=time.time() - start_time,
+            total=page.total
+        ), True
         
-        processed_items = []
+    await report_progress(f"Processing {len(records)} records...", 0.2)
+    
+    async def report_insight_progress(done: int, total: int):
+        await report_progress(
+            f"Generated insights for {done}/{total} records...",
+            0.2 + (0.8 * (done / total))
+        )
+    
+    # Insights for all records are generated concurrently and come back in record order
+    with STAGE_SECONDS.time(stage="insights"):
+        insights = await insight_pipeline.generate_all(
+            [insight_key(record['fields']) for record in records],
+            on_progress=report_insight_progress,
+            element_notes=element_notes
+        )
+    
+    processed_items = []
+    
+    with STAGE_SECONDS.time(stage="document_references"):
         doc_reference = DocumentReference()
-        
-        for i, record in enumerate(records, 1):
-            progress = 0.2 + (0.8 * (i / len(records)))
-            await broadcast_progress(f"Processing record {i}/{len(records)}...", progress)
+        for i, (record, ai_insights) in enumerate(zip(records, insights), 1):
+            if ai_insights is None:
+                continue
             
             try:
-                item_data = record['fields']
-                doc_refs = doc_reference.get_document_references(item_data)
-                
-                # Get AI insights using cache
-                cache_key = (
-                    item_data.get('key', ''),
-                    str(item_data.get('Phase', '')),
-                    str(item_data.get('Division', '')),
-                    str(item_data.get('WBS Category Level 1', ''))
+                processed_items.append(
+                    build_analytics_item(record, ai_insights, doc_reference, projection)
                 )
-                
-                ai_insights = get_cached_ai_insights(*cache_key)
-                
-                processed_item = {
-                    'item_data': item_data,
-                    'document_references': doc_refs,
-                    'ai_insights': ai_insights.model_dump()
-                }
-                processed_items.append(processed_item)
-                
             except Exception as e:
                 logging.error(f"Error processing record {i}: {e}")
                 continue
-        
-        total_time = time.time() - start_time
-        await broadcast_progress("Analysis complete!", 1.0)
-        
-        if not processed_items:
-            return AnalyticsResponse(
-                items=[],
-                document_references={},
-                ai_insights={},
-                processing_time=total_time
-            )
-        
+    
+    total_time = time.time() - start_time
+    await report_progress("Analysis complete!", 1.0)
+    # Pages with failed or refused insights are not cached, so a later request can fill them in
+    complete = all(isinstance(ai_insights, ConstructionInsight) for ai_insights in insights)
+    
+    if not processed_items or projection.compact:
         return AnalyticsResponse(
             items=processed_items,
-            document_references=processed_items[-1]['document_references'],
-            ai_insights=processed_items[-1]['ai_insights'],
-            processing_time=total_time
+            document_references={},
+            ai_insights={},
+            processing_time=total_time,
+            next_cursor=page.next_cursor,
+            total=page.total
+        ), complete
+    
+    return AnalyticsResponse(
+        items=processed_items,
+        document_references=processed_items[-1]['document_references'],
+        ai_insights=processed_items[-1]['ai_insights'],
+        processing_time=total_time,
+        next_cursor=page.next_cursor,
+        total=page.total
+    ), complete
+
+async def cached_analytics_response(entry: CachedResponse, if_none_match: Optional[str],
+                                    content_encoding: Optional[str] = None) -> Response:
+    """Send a cached body with its ETag, compressed if negotiated, or 304 when the client already has it"""
+    body, etag = entry.body, entry.etag
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept, Accept-Encoding"}
+    if content_encoding is not None and len(body) >= COMPRESS_MIN_SIZE:
+        compressed = entry.variants.get(content_encoding)
+        if compressed is None:
+            compressed = await asyncio.to_thread(compress, body, content_encoding)
+            entry.variants[content_encoding] = compressed
+        body = compressed
+        # Each coding of the body is a different representation, so it gets its own ETag
+        etag = f'{etag[:-1]}-{content_encoding}"'
+        headers["Content-Encoding"] = content_encoding
+    headers["ETag"] = etag
+    if etag_matches(if_none_match, etag) or etag_matches(if_none_match, entry.etag):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=entry.media_type, headers=headers)
+
+@app.post("/api/analytics", response_model=AnalyticsResponse)
+async def get_analytics(request: AnalyticsRequest,
+                        page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                        cursor: Optional[str] = None,
+                        max_records: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE,
+                                                           deprecated=True),
+                        stream: Optional[str] = None, progress_topic: Optional[str] = None,
+                        fields: Optional[str] = None, insight_sections: Optional[str] = None,
+                        compact: bool = False, element_notes: bool = False,
+                        if_none_match: Optional[str] = Header(None),
+                        accept: Optional[str] = Header(None),
+                        accept_encoding: Optional[str] = Header(None)):
+    """One page of filtered records with document references and AI insights
+
+    Records are ordered by (Phase, key, id). Pass the returned next_cursor back
+    as cursor, with the same filter, to fetch the following page; AI insights
+    are only generated for the records on the returned page.
+
+    With stream=ndjson or stream=sse each item is sent as soon as it is ready,
+    followed by a summary frame carrying processing_time. Otherwise progress is
+    published to progress_topic (see /ws?topic=...), or to every client
+    subscribed to the broadcast topic when none is given.
+    
+    Non-streamed responses carry an ETag and are cached until the mirrored
+    data changes or RESPONSE_CACHE_TTL passes; send If-None-Match to get a
+    304 when nothing changed.
+    
+    fields and insight_sections (comma-separated) limit each item's item_data
+    and ai_insights to the named keys; compact drops empty insight sections
+    and the top-level copies of the last item. Responses are MessagePack when
+    Accept asks for application/msgpack (and msgpack is installed), and br or
+    gzip compressed per Accept-Encoding.
+    
+    Elements of the same family, Phase, Division and WBS share one AI
+    insight; element_notes adds what is specific to each element, at the
+    cost of one more OpenAI call per element not yet cached.
+    """
+    projection = parse_projection(fields, insight_sections, compact)
+    if stream is not None and stream not in STREAM_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"stream must be one of: {', '.join(STREAM_MEDIA_TYPES)}"
         )
-            
+    
+    if max_records is not None:
+        page_size = max_records
+    
+    if stream is not None:
+        start_time = time.time()
+        page = await fetch_analytics_records(request, page_size, cursor, progress=no_progress)
+        return StreamingResponse(
+            stream_analytics(page, start_time, stream, projection, element_notes),
+            media_type=STREAM_MEDIA_TYPES[stream]
+        )
+    
+    report_progress = functools.partial(
+        broadcast_progress, topic=progress_topic or BROADCAST_TOPIC
+    )
+    
+    # Identical requests against unchanged data are served from the response cache
+    media_type = negotiate_media_type(accept)
+    content_encoding = negotiate_content_encoding(accept_encoding)
+    version = mirror.version if mirror.ready else None
+    cache_key = (analytics_filter_fingerprint(request), page_size, cursor, projection, element_notes,
+                 media_type)
+    cached = analytics_cache.get(version, cache_key)
+    if cached is not None:
+        await report_progress("Analysis complete!", 1.0)
+        return await cached_analytics_response(cached, if_none_match, content_encoding)
+    
+    try:
+        response, complete = await analyze_page(
+            request, page_size, cursor, report_progress, projection, element_notes
+        )
+        if media_type == JSON_MEDIA_TYPE:
+            # pydantic's own serializer is the fastest path for the JSON case
+            body = response.model_dump_json().encode()
+        else:
+            body = encode(response.model_dump(), media_type)
+        if complete:
+            entry = analytics_cache.set(version, cache_key, body, media_type)
+        else:
+            entry = make_entry(body, media_type)
+        return await cached_analytics_response(entry, if_none_match, content_encoding)
+    except HTTPException as e:
+        await report_progress(f"Error: {e.detail}", -1)
+        raise
     except Exception as e:
         logging.error("Error in get_analytics: %s", str(e), exc_info=True)
-        await broadcast_progress(f"Error: {str(e)}", -1)
+        await report_progress(f"Error: {str(e)}", -1)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/facets")
+async def get_facets(request: AnalyticsRequest):
+    """Counts, duration and labor totals by Phase x Division x WBS for the filtered records
+
+    Results are cached until the mirrored data changes.
+    """
+    try:
+        version = mirror.version if mirror.ready else None
+        cache_key = analytics_filter_fingerprint(request)
+        if version is not None:
+            cached = facet_cache.get(version, cache_key)
+            if cached is not None:
+                return cached
+        
+        index = await load_filter_index(request, progress=no_progress)
+        with STAGE_SECONDS.time(stage="facets"):
+            mask = index.mask(
+                phase_range=request.phase_range,
+                wbs_categories=request.wbs_categories,
+                duration_range=request.duration_range,
+                divisions=request.selected_divisions
+            )
+            result = dict(compute_facets(index, mask), data_version=version)
+        
+        if version is not None:
+            facet_cache.set(version, cache_key, result)
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error("Error in get_facets: %s", str(e), exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/divisions")
@@ -391,16 +696,188 @@ async def get_divisions():
 
 @app.get("/api/wbs-categories")
 async def get_wbs_categories():
-    """Get unique WBS categories from Airtable"""
+    """Get unique WBS categories from the catalog"""
+    try:
+        await catalog.ensure_ready()
+        return {"categories": catalog.wbs_categories}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/catalog")
+async def get_catalog():
+    """Distinct WBS categories, divisions and phases present in the data"""
     try:
-        records = airtable.get_all(fields=['wbs_category'])
-        categories = list(set(record['fields'].get('wbs_category') 
-                            for record in records 
-                            if 'wbs_category' in record['fields']))
-        return {"categories": categories}
+        await catalog.ensure_ready()
+        return catalog.snapshot()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/llm/usage")
+async def get_llm_usage(minutes: float = Query(60, gt=0), group_by: str = "endpoint"):
+    """LLM calls, tokens, cost and latency over the last `minutes`, grouped by the given fields
+
+    group_by is a comma-separated subset of endpoint, operation, model, phase
+    and division. Totals are per worker process.
+    """
+    fields = parse_list(group_by) or []
+    unknown = set(fields) - set(GROUP_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown group_by fields: {', '.join(sorted(unknown))}"
+        )
+    return LEDGER.summary(minutes * 60, fields)
+
+@app.get("/api/insights/cache-stats")
+async def get_insight_cache_stats():
+    """Hit/miss counters and size of the shared AI insight cache"""
+    try:
+        return await asyncio.to_thread(insight_pipeline.store.stats)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/insights/prewarm", status_code=202)
+async def start_insight_prewarm(
+    phase: Optional[float] = Query(None, description="Only pre-warm records of this phase"),
+    division: Optional[str] = Query(None, description="Only pre-warm records of this division")
+):
+    """Start a background job generating every missing insight, for the whole table or one phase or division"""
+    try:
+        job = await insight_prewarmer.start(phase, division)
+        return job.summary()
+    except PrewarmBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/insights/prewarm")
+async def get_insight_prewarm_status():
+    """Progress of the running pre-warm job, or of the last one checkpointed"""
+    try:
+        return await asyncio.to_thread(insight_prewarmer.status)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/insights/prewarm")
+async def cancel_insight_prewarm():
+    if not await insight_prewarmer.cancel():
+        raise HTTPException(status_code=404, detail="No pre-warm job is running in this worker")
+    return await asyncio.to_thread(insight_prewarmer.status)
+
+@app.get("/api/airtable/scheduler-stats")
+async def get_airtable_scheduler_stats():
+    """Queue depth, wait times and coalesced requests of the Airtable rate limiter"""
+    return get_scheduler().stats()
+
+def cache_counts() -> Dict[tuple, float]:
+    """Hit/miss counts of the in-process caches plus the shared insight store"""
+    store = insight_pipeline.store.stats()
+    return {
+        ("analytics", "hit"): analytics_cache.hits,
+        ("analytics", "miss"): analytics_cache.misses,
+        ("facets", "hit"): facet_cache.hits,
+        ("facets", "miss"): facet_cache.misses,
+        ("insights", "hit"): store["hits"],
+        ("insights", "miss"): store["misses"],
+        ("chat_sessions", "hit"): chat_sessions.hits,
+        ("chat_sessions", "miss"): chat_sessions.misses,
+    }
+
+def cache_hit_ratios() -> Dict[tuple, float]:
+    counts = cache_counts()
+    ratios = {}
+    for cache in ("analytics", "facets", "insights", "chat_sessions"):
+        hits, misses = counts[(cache, "hit")], counts[(cache, "miss")]
+        ratios[(cache,)] = hits / (hits + misses) if hits + misses else 0.0
+    return ratios
+
+def scheduler_values(field: str) -> Callable[[], Dict[tuple, float]]:
+    return lambda: {
+        (base_id,): stats[field] for base_id, stats in get_scheduler().stats()["bases"].items()
+    }
+
+REGISTRY.counter("cache_requests_total", "Cache lookups by cache and result",
+                 ("cache", "result"), function=cache_counts)
+REGISTRY.gauge("cache_hit_ratio", "Share of cache lookups that were hits", ("cache",),
+               function=cache_hit_ratios)
+REGISTRY.gauge("insight_generations_in_flight", "Distinct AI insights being generated",
+               function=lambda: {(): len(insight_pipeline._inflight)})
+REGISTRY.counter("insight_batches_total", "Batched insight requests sent to OpenAI",
+                 function=lambda: {(): insight_pipeline.batches_sent})
+REGISTRY.counter("insight_batch_items_retried_total",
+                 "Insights retried because a batched response left them out",
+                 function=lambda: {(): insight_pipeline.items_retried})
+REGISTRY.counter("insight_element_notes_total", "Element notes generated on top of shared family insights",
+                 function=lambda: {(): insight_pipeline.element_notes_generated})
+REGISTRY.counter("insight_generations_joined_total",
+                 "AI insights taken from another worker's generation instead of calling OpenAI",
+                 function=lambda: {(): insight_pipeline.joined_other_workers})
+REGISTRY.gauge("chat_sessions", "Chat sessions held in memory",
+               function=lambda: {(): len(chat_sessions)})
+REGISTRY.gauge("chat_session_bytes", "Approximate memory held by chat sessions",
+               function=lambda: {(): chat_sessions.total_bytes})
+REGISTRY.counter("chat_sessions_evicted_total", "Chat sessions dropped by the count or memory cap",
+                 function=lambda: {(): chat_sessions.evicted})
+REGISTRY.counter("chat_summaries_total", "Times older chat turns were folded into a session summary",
+                 function=lambda: {(): chat_sessions.summarized})
+REGISTRY.gauge("insight_prewarm_keys", "Insights of the current pre-warm job by state", ("state",),
+               function=lambda: {
+                   (state,): insight_prewarmer.job.summary()[state]
+                   for state in ("total", "generated", "cached", "failed", "remaining")
+               } if insight_prewarmer.job is not None else {})
+REGISTRY.gauge("websocket_subscribers", "Connected progress WebSocket clients",
+               function=lambda: {(): progress_hub.subscriber_count()})
+REGISTRY.gauge("airtable_queue_depth", "Airtable requests waiting for a rate-limit token",
+               ("base",), function=scheduler_values("queue_depth"))
+REGISTRY.counter("airtable_scheduler_granted_total", "Airtable requests granted a rate-limit token",
+                 ("base",), function=scheduler_values("granted"))
+REGISTRY.counter("airtable_scheduler_wait_seconds_total",
+                 "Total time Airtable requests waited for a rate-limit token",
+                 ("base",), function=scheduler_values("wait_seconds_total"))
+REGISTRY.counter("airtable_coalesced_requests_total", "Airtable reads that joined an identical fetch",
+                 function=lambda: {(): get_scheduler().coalesced})
+REGISTRY.gauge("airtable_mirror_records", "Records held by the Airtable mirror",
+               function=lambda: {(): len(mirror.records)})
+REGISTRY.gauge("airtable_mirror_version", "Data version of the Airtable mirror",
+               function=lambda: {(): mirror.version})
+REGISTRY.gauge("startup_seconds", "Seconds from process import to serving",
+               function=lambda: {(): app.state.startup_seconds}
+               if hasattr(app.state, "startup_seconds") else {})
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text-format metrics"""
+    try:
+        body = await asyncio.to_thread(REGISTRY.render)
+        return Response(content=body, media_type="text/plain; version=0.0.4")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/health")
+async def health():
+    """Liveness: the process is up and serving"""
+    return {
+        "status": "ok",
+        "startup_seconds": getattr(app.state, "startup_seconds", None),
+        "uptime_seconds": time.perf_counter() - STARTUP_STARTED
+    }
+
+@app.get("/api/ready")
+async def ready():
+    """Readiness: analytics can be answered from the mirror or from Airtable directly"""
+    refresh_airtable_status()
+    is_ready = mirror.ready or bool(airtable_status["ok"])
+    body = {
+        "status": "ready" if is_ready else "not_ready",
+        "mirror": {
+            "ready": mirror.ready,
+            "records": len(mirror.records),
+            "last_synced_at": mirror.last_synced_at.isoformat() if mirror.last_synced_at else None
+        },
+        "airtable": airtable_status
+    }
+    return JSONResponse(status_code=200 if is_ready else 503, content=body)
+
 @app.get("/api/test")
 async def test_endpoint():
     return {"status": "ok", "message": "API is working"}
@@ -409,33 +886,118 @@ async def test_endpoint():
 async def test_airtable_connection():
     """Test the Airtable connection"""
     try:
-        records = airtable.get_all(maxRecords=1)
+        records = await get_airtable().get_all(maxRecords=1)
         return {"status": "success", "message": "Successfully connected to Airtable"}
     except Exception as e:
         logger.error(f"Airtable connection test failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def chat_insight(request: ChatRequest) -> ConstructionInsight:
+    """The cached (or freshly generated) insight a chat question is about"""
+    return await insight_pipeline.get((
+        request.item_key,
+        request.phase,
+        request.division,
+        request.wbs
+    ), element_notes=request.element_notes)
+
+async def chat_session(request: ChatRequest) -> ChatSession:
+    """The session a chat message belongs to, started on the insight it is about if needed"""
+    if request.session_id:
+        session = chat_sessions.get(request.session_id)
+        if session is not None:
+            return session
+    return chat_sessions.create(await chat_insight(request), request.session_id)
+
 @app.post("/api/chat")
 async def chat_with_ai(request: ChatRequest):
     try:
-        # Get cached insights first
-        insights = get_cached_ai_insights(
-            request.item_key,
-            request.phase,
-            request.division,
-            request.wbs
-        )
-        
-        # Initialize AI agent
-        ai_agent = ConstructionAIAgent()
+        # Get the session, or start one on the cached insights
+        session = await chat_session(request)
         
-        # Get chat response
-        response = ai_agent.chat_with_insight(insights, request.message)
+        # Get chat response from the shared agent, with the conversation so far
+        async with session.lock:
+            response = await get_agent().achat_with_insight(
+                session.insight, request.message, session.summary, session.turns
+            )
+            chat_sessions.record(session, request.message, response)
         
-        return {"response": response}
+        return {"response": response, "session_id": session.id}
+    except LLMBudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        logging.error(f"Chat error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def stream_chat(session: ChatSession, message: str):
+    """Yield SSE frames: a token frame per piece of the answer, then a done frame
+
+    If the client disconnects, Starlette cancels this generator and the
+    OpenAI stream is closed with it; only completed answers join the session.
+    """
+    started = time.perf_counter()
+    first_token_seconds = None
+    parts = []
+    outcome = 'cancelled'
+    await session.lock.acquire()
+    tokens = get_agent().astream_chat_with_insight(
+        session.insight, message, session.summary, session.turns
+    )
+    try:
+        async for text in tokens:
+            if first_token_seconds is None:
+                first_token_seconds = time.perf_counter() - started
+            parts.append(text)
+            yield encode_stream_frame({"type": "token", "text": text}, "sse")
+        outcome = 'completed'
+        chat_sessions.record(session, message, "".join(parts))
+        yield encode_stream_frame({
+            "type": "done",
+            "response": "".join(parts),
+            "session_id": session.id,
+            "time_to_first_token": first_token_seconds,
+            "processing_time": time.perf_counter() - started
+        }, "sse")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        outcome = 'error'
+        logging.error(f"Chat stream error: {e}")
+        yield encode_stream_frame({"type": "error", "detail": str(e)}, "sse")
+    finally:
+        await tokens.aclose()
+        session.lock.release()
+        STREAMS.inc(route='/api/chat/stream', outcome=outcome)
+
+@app.post("/api/chat/stream")
+async def chat_with_ai_stream(request: ChatRequest):
+    """Like /api/chat, but streams the answer as Server-Sent Events while it is generated"""
+    try:
+        session = await chat_session(request)
+    except LLMBudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         logging.error(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        stream_chat(session, request.message),
+        media_type=STREAM_MEDIA_TYPES["sse"],
+        headers={"Cache-Control": "no-cache", "X-Chat-Session": session.id}
+    )
+
+@app.get("/api/chat/sessions/{session_id}")
+async def get_chat_session(session_id: str):
+    """Summary and recent turns of a chat session"""
+    session = chat_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return session.to_dict()
+
+@app.delete("/api/chat/sessions/{session_id}")
+async def delete_chat_session(session_id: str):
+    if not chat_sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return {"deleted": session_id}
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,26 +1,45 @@
 from fastapi import FastAPI, HTTPException
-from airtable import Airtable
+from airtable_client import AsyncAirtable
 import os
 from dotenv import load_dotenv
 from typing import Dict, List, Optional
 from pydantic import BaseModel
 from datetime import date
-from construction_ai_agent import ConstructionAIAgent, ConstructionInsight
+from functools import lru_cache
+from contextlib import asynccontextmanager
+from construction_ai_agent import ConstructionInsight, close_agent, get_agent
 from procore_client import ProcoreClient
+from http_transport import close_transport
+from metrics import REGISTRY, MetricsMiddleware
+from llm_usage import LLMBudgetExceeded, LLMUsageMiddleware
+from fastapi.responses import Response
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release the pooled Airtable and OpenAI connections
+    await close_transport()
+    await close_agent()
 
-# Initialize clients
-airtable = Airtable(
-    os.getenv('AIRTABLE_BASE_ID'),
-    os.getenv('AIRTABLE_TABLE_NAME'),
-    api_key=os.getenv('AIRTABLE_API_KEY')
-)
-ai_agent = ConstructionAIAgent()
-procore_client = ProcoreClient()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(LLMUsageMiddleware)
+
+# Clients are created on first use so importing the app never touches the network
+@lru_cache(maxsize=1)
+def get_airtable() -> AsyncAirtable:
+    return AsyncAirtable(
+        os.getenv('AIRTABLE_BASE_ID'),
+        os.getenv('AIRTABLE_TABLE_NAME'),
+        api_key=os.getenv('AIRTABLE_API_KEY')
+    )
+
+@lru_cache(maxsize=1)
+def get_procore_client() -> ProcoreClient:
+    return ProcoreClient()
 
 class PhaseMapping(BaseModel):
     key: str
@@ -46,7 +65,7 @@ async def get_phase_mappings():
     Fetch all phase mappings from Airtable
     """
     try:
-        records = airtable.get_all()
+        records = await get_airtable().get_all()
         return [
             PhaseMappingResponse(
                 id=record['id'],
@@ -64,14 +83,16 @@ async def get_construction_insights(record_id: str):
     """
     try:
         # Get the record from Airtable
-        record = airtable.get(record_id)
+        record = await get_airtable().get(record_id)
         if not record:
             raise HTTPException(status_code=404, detail="Phase mapping not found")
             
         # Generate insights using AI
-        insights = ai_agent.generate_construction_insight(record['fields'])
+        insights = await get_agent().agenerate_construction_insight(record['fields'])
         return insights
         
+    except LLMBudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -81,7 +102,7 @@ async def get_phase_mapping(record_id: str, include_insights: bool = False):
     Fetch a specific phase mapping by ID, optionally including AI insights
     """
     try:
-        record = airtable.get(record_id)
+        record = await get_airtable().get(record_id)
         if not record:
             raise HTTPException(status_code=404, detail="Phase mapping not found")
             
@@ -91,11 +112,13 @@ async def get_phase_mapping(record_id: str, include_insights: bool = False):
         )
         
         if include_insights:
-            insights = ai_agent.generate_construction_insight(record['fields'])
+            insights = await get_agent().agenerate_construction_insight(record['fields'])
             response.ai_insights = insights
             
         return response
         
+    except LLMBudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -108,7 +131,7 @@ async def add_phase_mapping(mapping: PhaseMapping):
         fields = mapping.dict()
         fields['start_date'] = fields['start_date'].isoformat()
         fields['end_date'] = fields['end_date'].isoformat()
-        record = airtable.insert(fields)
+        record = await get_airtable().insert(fields)
         return PhaseMappingResponse(id=record['id'], **mapping.dict())
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -122,7 +145,7 @@ async def update_phase_mapping(record_id: str, mapping: PhaseMapping):
         fields = mapping.dict()
         fields['start_date'] = fields['start_date'].isoformat()
         fields['end_date'] = fields['end_date'].isoformat()
-        record = airtable.update(record_id, fields)
+        record = await get_airtable().update(record_id, fields)
         return PhaseMappingResponse(id=record['id'], **mapping.dict())
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -133,7 +156,7 @@ async def delete_phase_mapping(record_id: str):
     Delete a phase mapping
     """
     try:
-        airtable.delete(record_id)
+        await get_airtable().delete(record_id)
         return {"message": "Phase mapping deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -145,12 +168,12 @@ async def sync_to_procore(record_id: str, project_id: int):
     """
     try:
         # Get the record from Airtable
-        record = airtable.get(record_id)
+        record = await get_airtable().get(record_id)
         if not record:
             raise HTTPException(status_code=404, detail="Phase mapping not found")
             
         # Sync to Procore
-        procore_task = procore_client.sync_airtable_to_procore(
+        procore_task = get_procore_client().sync_airtable_to_procore(
             project_id,
             record['fields']
         )
@@ -169,7 +192,7 @@ async def get_procore_projects():
     Get all projects from Procore
     """
     try:
-        projects = procore_client.get_projects()
+        projects = get_procore_client().get_projects()
         return projects
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -180,7 +203,12 @@ async def get_procore_tasks(project_id: int):
     Get all tasks for a Procore project
     """
     try:
-        tasks = procore_client.get_tasks(project_id)
+        tasks = get_procore_client().get_tasks(project_id)
         return tasks
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e)) 
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text-format metrics"""
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4")
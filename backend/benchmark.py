@@ -0,0 +1,441 @@
+"""Offline benchmark of the backend against local fake Airtable, OpenAI and Procore services
+
+Starts the fakes in-process, runs api_analytics and api_phases under uvicorn
+pointed at them, drives /api/analytics, /api/chat (plain and streamed), /phase-mappings and the
+progress WebSocket, then prints throughput and p50/p95/p99 latency. Results
+are written to benchmark_results/ and compared with the previous run.
+
+    python benchmark.py --records 2000 --requests 200 --concurrency 16
+    python benchmark.py --openai-latency 1.5 --error-rate 0.05 --compare benchmark_results/<run>.json
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from fake_services import (
+    WBS_CATEGORIES,
+    BackgroundServer,
+    FakeAirtable,
+    FakeOpenAI,
+    FakeProcore,
+    FakeServiceConfig,
+    free_port,
+)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'benchmark_results')
+SCENARIOS = ('analytics', 'chat', 'chat_stream', 'phases', 'websocket')
+# Summary fields compared between runs
+COMPARED = ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'error_rate')
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linear-interpolated percentile of values (q in 0..100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    count = len(latencies) + errors
+    return {
+        "requests": count,
+        "errors": errors,
+        "error_rate": errors / count if count else 0.0,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "mean_ms": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50_ms": 1000 * percentile(latencies, 50),
+        "p95_ms": 1000 * percentile(latencies, 95),
+        "p99_ms": 1000 * percentile(latencies, 99),
+    }
+
+
+async def run_load(call: Callable[[int], Awaitable[bool]], total: int, concurrency: int) -> Dict:
+    """Run call(0..total-1) with bounded concurrency; call returns False (or raises) on error"""
+    latencies: List[float] = []
+    errors = 0
+    next_index = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in next_index:
+            started = time.perf_counter()
+            try:
+                ok = await call(i)
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def analytics_body(rng: random.Random) -> Dict:
+    start = rng.randint(0, 12)
+    return {
+        "selected_divisions": [],
+        "phase_range": [start, rng.randint(start, 16)],
+        "wbs_categories": rng.sample(WBS_CATEGORIES, rng.randint(0, 2)),
+        "duration_range": [0, rng.randint(1, 5)],
+    }
+
+
+async def bench_analytics(client: httpx.AsyncClient, args, rng: random.Random) -> Dict:
+    bodies = [analytics_body(rng) for _ in range(args.distinct_filters)]
+
+    async def call(i: int) -> bool:
+        response = await client.post(
+            '/api/analytics', params={"page_size": args.page_size}, json=rng.choice(bodies)
+        )
+        return response.status_code == 200
+
+    return await run_load(call, args.requests, args.concurrency)
+
+
+def chat_body(args, rng: random.Random) -> Dict:
+    element = rng.randint(0, args.records - 1)
+    return {
+        "item_key": f"{element}.1: EL_{element % 97}",
+        "phase": str(rng.randint(0, 16)),
+        "division": "['03']",
+        "wbs": rng.choice(WBS_CATEGORIES),
+        "message": "What inspections are required before the next phase?",
+    }
+
+
+async def bench_chat(client: httpx.AsyncClient, args, rng: random.Random) -> Dict:
+    async def call(i: int) -> bool:
+        response = await client.post('/api/chat', json=chat_body(args, rng))
+        return response.status_code == 200
+
+    return await run_load(call, args.requests, args.concurrency)
+
+
+async def bench_chat_stream(client: httpx.AsyncClient, args, rng: random.Random) -> Dict:
+    """Latency here is time to the first token; the client then disconnects"""
+    async def call(i: int) -> bool:
+        async with client.stream('POST', '/api/chat/stream', json=chat_body(args, rng)) as response:
+            if response.status_code != 200:
+                return False
+            async for line in response.aiter_lines():
+                if line.startswith('event: '):
+                    return line == 'event: token'
+        return False
+
+    return await run_load(call, args.requests, args.concurrency)
+
+
+async def bench_phases(client: httpx.AsyncClient, args, rng: random.Random) -> Dict:
+    listing = (await client.get('/phase-mappings')).json()
+    records = listing if isinstance(listing, list) else []
+
+    async def call(i: int) -> bool:
+        roll = rng.random()
+        if roll < 0.2 or not records:
+            response = await client.get('/phase-mappings')
+        elif roll < 0.8:
+            response = await client.get(f"/phase-mappings/{rng.choice(records)['id']}")
+        else:
+            mapping = dict(rng.choice(records))
+            record_id = mapping.pop('id')
+            mapping['percent_complete'] = round(rng.random(), 2)
+            response = await client.put(f'/phase-mappings/{record_id}', json=mapping)
+        return response.status_code == 200
+
+    return await run_load(call, args.requests, args.concurrency)
+
+
+async def bench_websocket(client: httpx.AsyncClient, args, rng: random.Random,
+                          ws_url: str) -> Optional[Dict]:
+    """Time from each analytics request's start until every subscriber saw its final progress"""
+    try:
+        import websockets
+    except ImportError:
+        print("  websocket: skipped (pip install websockets to enable)")
+        return None
+
+    topic = "benchmark"
+    sockets = [
+        await websockets.connect(f"{ws_url}/ws?topic={topic}")
+        for _ in range(args.ws_clients)
+    ]
+    bodies = [analytics_body(rng) for _ in range(args.distinct_filters)]
+
+    async def wait_final(socket) -> float:
+        while True:
+            message = json.loads(await socket.recv())
+            progress = message.get("progress")
+            if progress is None or progress >= 1 or progress < 0:
+                return time.perf_counter()
+
+    latencies: List[float] = []
+    errors = 0
+    started_all = time.perf_counter()
+    try:
+        # One request at a time so every final message belongs to the request being timed
+        for _ in range(args.ws_requests):
+            started = time.perf_counter()
+            waiters = [asyncio.ensure_future(wait_final(socket)) for socket in sockets]
+            response = await client.post(
+                '/api/analytics',
+                params={"page_size": args.page_size, "progress_topic": topic},
+                json=rng.choice(bodies)
+            )
+            try:
+                finished = await asyncio.wait_for(asyncio.gather(*waiters), timeout=30)
+            except asyncio.TimeoutError:
+                errors += 1
+                continue
+            if response.status_code != 200:
+                errors += 1
+                continue
+            latencies.append(max(finished) - started)
+    finally:
+        for socket in sockets:
+            await socket.close()
+    return dict(summarize(latencies, errors, time.perf_counter() - started_all),
+                clients=args.ws_clients)
+
+
+def stage_means(metrics_text: str) -> Dict[str, float]:
+    """Mean milliseconds per analytics stage, from the backend's /metrics"""
+    sums = dict(re.findall(r'stage_duration_seconds_sum\{stage="([^"]+)"\} (\S+)', metrics_text))
+    counts = dict(re.findall(r'stage_duration_seconds_count\{stage="([^"]+)"\} (\S+)', metrics_text))
+    return {
+        stage: 1000 * float(sums[stage]) / float(counts[stage])
+        for stage in sums if float(counts.get(stage, 0))
+    }
+
+
+def start_backend(module: str, port: int, env: Dict[str, str], logs: bool,
+                  workers: int = 1) -> subprocess.Popen:
+    output = None if logs else subprocess.DEVNULL
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', f'{module}:app', '--host', '127.0.0.1',
+         '--port', str(port), '--log-level', 'warning', '--workers', str(workers)],
+        cwd=BACKEND_DIR, env=env, stdout=output, stderr=output
+    )
+
+
+async def wait_for(url: str, ready: Callable[[httpx.Response], bool], timeout: float):
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.time() < deadline:
+            try:
+                if ready(await client.get(url)):
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout:.0f}s")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, text=True,
+            stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_result(exclude: str) -> Optional[str]:
+    paths = sorted(p for p in glob.glob(os.path.join(RESULTS_DIR, '*.json')) if p != exclude)
+    return paths[-1] if paths else None
+
+
+def print_report(results: Dict, baseline: Optional[Dict]):
+    print(f"\n{'scenario':<12}{'req':>6}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, summary in results["scenarios"].items():
+        print(f"{name:<12}{summary['requests']:>6}{summary['errors']:>6}"
+              f"{summary['throughput_rps']:>9.1f}{summary['p50_ms']:>10.1f}"
+              f"{summary['p95_ms']:>10.1f}{summary['p99_ms']:>10.1f}")
+    if results.get("stages_ms"):
+        print("\nmean ms per analytics stage: " + ", ".join(
+            f"{stage} {ms:.1f}" for stage, ms in sorted(results["stages_ms"].items())
+        ))
+    if not baseline:
+        return
+    print(f"\ncompared with {baseline.get('started_at')} ({baseline.get('commit')}):")
+    for name, summary in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        changes = []
+        for field in COMPARED:
+            old, new = before.get(field, 0.0), summary.get(field, 0.0)
+            change = f"{100 * (new - old) / old:+.1f}%" if old else f"{old:.2f} -> {new:.2f}"
+            changes.append(f"{field} {change}")
+        print(f"  {name:<12}" + ", ".join(changes))
+
+
+async def main(args) -> Dict:
+    rng = random.Random(args.seed)
+    airtable = FakeAirtable(
+        FakeServiceConfig(latency=args.airtable_latency, error_rate=args.error_rate, seed=args.seed),
+        records=args.records
+    )
+    openai = FakeOpenAI(
+        FakeServiceConfig(latency=args.openai_latency, error_rate=args.error_rate, seed=args.seed),
+        token_delay=args.token_delay
+    )
+    procore = FakeProcore(
+        FakeServiceConfig(latency=args.procore_latency, error_rate=args.error_rate, seed=args.seed)
+    )
+    fakes = [BackgroundServer(service.app()).start() for service in (airtable, openai, procore)]
+    airtable_url, openai_url, procore_url = (fake.url for fake in fakes)
+
+    store_dir = tempfile.mkdtemp(prefix='benchmark-')
+    env = dict(
+        os.environ,
+        AIRTABLE_API_URL=f"{airtable_url}/v0",
+        AIRTABLE_API_KEY="benchmark",
+        AIRTABLE_BASE_ID="appbenchmark",
+        AIRTABLE_TABLE_NAME=airtable.phase_table,
+        AIRTABLE_RATE_LIMIT=str(args.airtable_rate),
+        OPENAI_API_KEY="benchmark",
+        OPENAI_BASE_URL=f"{openai_url}/v1",
+        PROCORE_BASE_URL=procore_url,
+        PROCORE_CLIENT_ID="benchmark",
+        PROCORE_CLIENT_SECRET="benchmark",
+        INSIGHT_STORE_PATH=os.path.join(store_dir, 'insights.sqlite3'),
+        SHARED_STATE_PATH=os.path.join(store_dir, 'shared_state.sqlite3'),
+        # Never pick up, or write over, a pre-warm job of the real backend
+        PREWARM_CHECKPOINT_PATH=os.path.join(store_dir, 'prewarm_checkpoint.json'),
+        PREWARM_RESUME='false',
+    )
+    analytics_port, phases_port = free_port(), free_port()
+    processes = [
+        start_backend('api_analytics', analytics_port, env, args.backend_logs, args.workers),
+        start_backend('api_phases', phases_port, env, args.backend_logs, args.workers),
+    ]
+    analytics_url = f"http://127.0.0.1:{analytics_port}"
+    phases_url = f"http://127.0.0.1:{phases_port}"
+
+    results = {
+        "started_at": datetime.now().isoformat(timespec='seconds'),
+        "commit": git_commit(),
+        "config": vars(args),
+        "scenarios": {},
+    }
+    try:
+        # Analytics is measured against a synced mirror, as in steady state
+        await wait_for(
+            f"{analytics_url}/api/ready",
+            lambda r: r.status_code == 200 and r.json()["mirror"]["ready"],
+            args.startup_timeout
+        )
+        await wait_for(f"{phases_url}/metrics", lambda r: r.status_code == 200, args.startup_timeout)
+
+        timeout = httpx.Timeout(120)
+        limits = httpx.Limits(max_connections=args.concurrency * 2)
+        async with httpx.AsyncClient(base_url=analytics_url, timeout=timeout, limits=limits) as analytics, \
+                httpx.AsyncClient(base_url=phases_url, timeout=timeout, limits=limits) as phases:
+            for name in args.scenarios:
+                print(f"running {name}...")
+                if name == 'analytics':
+                    summary = await bench_analytics(analytics, args, rng)
+                elif name == 'chat':
+                    summary = await bench_chat(analytics, args, rng)
+                elif name == 'chat_stream':
+                    summary = await bench_chat_stream(analytics, args, rng)
+                elif name == 'phases':
+                    summary = await bench_phases(phases, args, rng)
+                else:
+                    summary = await bench_websocket(
+                        analytics, args, rng, analytics_url.replace('http', 'ws', 1)
+                    )
+                if summary is not None:
+                    results["scenarios"][name] = summary
+            results["stages_ms"] = stage_means((await analytics.get('/metrics')).text)
+        results["fake_services"] = {
+            "airtable": {"requests": airtable.requests, "errors": airtable.errors},
+            "openai": {"requests": openai.requests, "errors": openai.errors,
+                       "streams_completed": openai.streams_completed,
+                       "streams_cancelled": openai.streams_cancelled},
+            "procore": {"requests": procore.requests, "errors": procore.errors},
+        }
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+        for fake in fakes:
+            fake.stop()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline backend benchmark")
+    parser.add_argument('--scenarios', type=lambda s: s.split(','), default=list(SCENARIOS),
+                        help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument('--records', type=int, default=2000, help="BIM Layers records in the fake table")
+    parser.add_argument('--requests', type=int, default=200, help="requests per scenario")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--page-size', type=int, default=25)
+    parser.add_argument('--distinct-filters', type=int, default=20,
+                        help="analytics filters to draw from; fewer means more cache hits")
+    parser.add_argument('--ws-clients', type=int, default=50)
+    parser.add_argument('--ws-requests', type=int, default=20)
+    parser.add_argument('--airtable-latency', type=float, default=0.05, help="seconds")
+    parser.add_argument('--openai-latency', type=float, default=0.5, help="seconds")
+    parser.add_argument('--token-delay', type=float, default=0.02,
+                        help="seconds between streamed OpenAI tokens")
+    parser.add_argument('--procore-latency', type=float, default=0.05, help="seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="share of fake responses that are 429/503")
+    parser.add_argument('--airtable-rate', type=float, default=5.0,
+                        help="AIRTABLE_RATE_LIMIT for the backend")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="uvicorn worker processes per backend (stage means then come from one worker)")
+    parser.add_argument('--startup-timeout', type=float, default=120.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--backend-logs', action='store_true', help="show the backend's log output")
+    parser.add_argument('--output', help="result file (default benchmark_results/<timestamp>.json)")
+    parser.add_argument('--compare', help="result file to compare with (default: the previous run)")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(main(args))
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(
+        RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json'
+    )
+    baseline_path = args.compare or previous_result(exclude=os.path.abspath(output))
+    baseline = None
+    if baseline_path and os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print_report(results, baseline)
+    print(f"\nresults saved to {output}")
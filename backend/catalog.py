@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+from airtable_mirror import AirtableMirror
+from airtable_scheduler import Priority
+from filter_index import DIVISION_FIELD, PHASE_FIELD, WBS_FIELD, FilterIndex
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds between scheduled catalog refreshes; mirror data changes refresh it immediately
+CATALOG_REFRESH_INTERVAL = float(os.getenv('CATALOG_REFRESH_INTERVAL', '300'))
+
+
+def _phase_label(value: float):
+    return int(value) if float(value).is_integer() else value
+
+
+class CatalogService:
+    """Distinct WBS Category, Division and Phase values, held in memory
+
+    Refreshed from the mirror's index whenever the mirror reports changed data,
+    and on a schedule; until the mirror has synced, the three fields are
+    fetched from Airtable directly.
+    """
+
+    def __init__(self, mirror: AirtableMirror, get_client: Callable,
+                 refresh_interval: float = CATALOG_REFRESH_INTERVAL):
+        self.mirror = mirror
+        self.get_client = get_client
+        self.refresh_interval = refresh_interval
+
+        self.wbs_categories: List[str] = []
+        self.divisions: List[str] = []
+        self.phases: List = []
+        self._wbs_set: FrozenSet[str] = frozenset()
+        self.refreshed_at: Optional[float] = None
+
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        mirror.add_listener(lambda changed, removed: self.load(mirror.index))
+
+    @property
+    def ready(self) -> bool:
+        return self.refreshed_at is not None
+
+    def load(self, index: FilterIndex):
+        """Replace the catalog with the distinct values of an index"""
+        wbs = sorted(index.values('wbs'))
+        self.divisions = sorted(index.values('division'))
+        self.phases = [_phase_label(phase) for phase in sorted(index.values('phase'))]
+        self.wbs_categories = wbs
+        self._wbs_set = frozenset(wbs)
+        self.refreshed_at = time.time()
+
+    async def refresh(self):
+        """Reload from the mirror if it has synced, otherwise from Airtable"""
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            if self.mirror.ready:
+                index = self.mirror.index
+            else:
+                records = await self.get_client().get_all(
+                    fields=[WBS_FIELD, DIVISION_FIELD, PHASE_FIELD],
+                    priority=Priority.BACKGROUND
+                )
+                index = await asyncio.to_thread(FilterIndex, records)
+            self.load(index)
+
+    async def ensure_ready(self):
+        if not self.ready:
+            await self.refresh()
+
+    def invalid_wbs_categories(self, categories: Iterable[str]) -> List[str]:
+        return [category for category in categories if category not in self._wbs_set]
+
+    def snapshot(self) -> Dict:
+        return {
+            "wbs_categories": self.wbs_categories,
+            "divisions": self.divisions,
+            "phases": self.phases,
+            "refreshed_at": self.refreshed_at,
+        }
+
+    async def run(self):
+        """Refresh on a schedule, logging (not raising) failures
+
+        The first load comes from the mirror's initial sync or from
+        ensure_ready, so the loop starts by sleeping.
+        """
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Catalog refresh failed: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
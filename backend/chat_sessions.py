@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set
+
+from dotenv import load_dotenv
+
+from construction_ai_agent import ConstructionInsight, estimate_tokens
+from llm_usage import start_in_background
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Tokens of recent turns sent verbatim with each message; older turns are summarized
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv('CHAT_HISTORY_TOKEN_BUDGET', '2000'))
+# Most chat sessions kept per process
+CHAT_SESSION_MAX = int(os.getenv('CHAT_SESSION_MAX', '1000'))
+# Approximate bytes all chat sessions may hold before the least recently used are dropped
+CHAT_SESSION_MAX_BYTES = int(os.getenv('CHAT_SESSION_MAX_BYTES', str(32 * 1024 * 1024)))
+
+Turn = Dict[str, str]
+Summarizer = Callable[[str, Sequence[Turn]], Awaitable[str]]
+
+
+def turn_tokens(turns: Sequence[Turn]) -> int:
+    return sum(estimate_tokens(turn['content']) for turn in turns)
+
+
+class ChatSession:
+    """One conversation about an insight: a summary of older turns plus the recent ones
+
+    The lock keeps messages of a session, and the summarizing of its older
+    turns, in order.
+    """
+
+    def __init__(self, session_id: str, insight: ConstructionInsight):
+        self.id = session_id
+        self.insight = insight
+        self.summary = ''
+        self.turns: List[Turn] = []
+        self.lock = asyncio.Lock()
+        self.updated_at = time.time()
+        self._insight_size = len(insight.model_dump_json())
+        self.size = self._insight_size
+
+    def measure(self) -> int:
+        """Approximate bytes held by this session"""
+        self.size = self._insight_size + len(self.summary.encode()) + sum(
+            len(turn['content'].encode()) for turn in self.turns
+        )
+        return self.size
+
+    def to_dict(self) -> Dict:
+        return {
+            "session_id": self.id,
+            "item_key": self.insight.item_key,
+            "summary": self.summary,
+            "turns": self.turns,
+            "history_tokens": turn_tokens(self.turns),
+            "updated_at": self.updated_at
+        }
+
+
+class ChatSessionStore:
+    """In-process LRU of chat sessions, capped by count and approximate memory
+
+    When a session's recent turns exceed token_budget, the oldest are folded
+    into its summary in the background, keeping about half the budget
+    verbatim. If summarizing fails the oldest turns are dropped instead, so a
+    session never grows past its budget.
+    """
+
+    def __init__(self, summarize: Summarizer, token_budget: int = CHAT_HISTORY_TOKEN_BUDGET,
+                 max_sessions: int = CHAT_SESSION_MAX, max_bytes: int = CHAT_SESSION_MAX_BYTES):
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.summarized = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                self.misses += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            self.hits += 1
+            return session
+
+    def create(self, insight: ConstructionInsight, session_id: Optional[str] = None) -> ChatSession:
+        """Start a session; an unknown or evicted session_id is reused so clients can keep sending it"""
+        session = ChatSession(session_id or uuid.uuid4().hex, insight)
+        with self._lock:
+            previous = self._sessions.pop(session.id, None)
+            if previous is not None:
+                self.total_bytes -= previous.size
+            self._sessions[session.id] = session
+            self.total_bytes += session.size
+            self._evict()
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                return False
+            self.total_bytes -= session.size
+            return True
+
+    def _evict(self):
+        # Never evicts the most recently used session, however large it is
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self.total_bytes > self.max_bytes
+        ):
+            _, session = self._sessions.popitem(last=False)
+            self.total_bytes -= session.size
+            self.evicted += 1
+
+    def _resize(self, session: ChatSession):
+        with self._lock:
+            before = session.size
+            session.measure()
+            if self._sessions.get(session.id) is session:
+                self.total_bytes += session.size - before
+                self._evict()
+
+    def record(self, session: ChatSession, question: str, answer: str):
+        """Add a question and its answer, summarizing older turns once over the token budget
+
+        Call it while holding session.lock.
+        """
+        session.turns.append({"role": "user", "content": question})
+        session.turns.append({"role": "assistant", "content": answer})
+        session.updated_at = time.time()
+        self._resize(session)
+        if turn_tokens(session.turns) > self.token_budget:
+            # Charged to background, not held to the budget of the message that triggered it
+            task = start_in_background(self._compact(session))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _compact(self, session: ChatSession):
+        async with session.lock:
+            keep = len(session.turns)
+            kept_tokens = 0
+            # Keep the newest whole question/answer pairs that fit in half the budget
+            while keep >= 2:
+                pair = turn_tokens(session.turns[keep - 2:keep])
+                if kept_tokens + pair > self.token_budget // 2:
+                    break
+                kept_tokens += pair
+                keep -= 2
+            older = session.turns[:keep]
+            if not older:
+                return
+            try:
+                session.summary = await self.summarize(session.summary, older)
+                self.summarized += 1
+            except Exception as e:
+                logger.error(f"Failed to summarize chat session {session.id}, dropping {len(older)} turns: {e}")
+            session.turns = session.turns[keep:]
+            self._resize(session)
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+            "summarized": self.summarized
+        }
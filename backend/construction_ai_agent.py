@@ -1,49 +1,57 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+import asyncio
+import hashlib
+import json
+import logging
 import os
+import time
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator, List, Sequence
+import httpx
 from pydantic import BaseModel
+from insight_parser import INSIGHT_SECTION_FIELDS, parse_sections
+from llm_usage import record_call, request_usage, usage_counts
+from metrics import LLM_TIME_TO_FIRST_TOKEN, track_external
 
 # Load environment variables
 load_dotenv()
 
-class ConstructionInsight(BaseModel):
-    item_key: str
-    phase_number: str
-    construction_details: str
-    best_practices: str
-    safety_considerations: str
-    dependencies: str
-    estimated_labor_hours: Optional[str]
-    material_specifications: Optional[str]
-    submittals: Optional[str]
-    specifications: Optional[str]
-    rfis: Optional[str]
-    quality_control: Optional[str]
-    photos_required: Optional[str]
-    coordination_notes: Optional[str]
+logger = logging.getLogger(__name__)
 
-class ConstructionAIAgent:
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        
-    def generate_construction_insight(self, item_data: Dict[str, Any]) -> ConstructionInsight:
-        """Generate construction insights for a specific item"""
-        
-        # Create a prompt based on the item data
-        prompt = f"""
+# Maximum open connections to the OpenAI API per process
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '20'))
+# Idle connections kept alive so later calls skip the TLS handshake
+OPENAI_KEEPALIVE_CONNECTIONS = int(os.getenv('OPENAI_KEEPALIVE_CONNECTIONS', '10'))
+# Seconds an idle keep-alive connection is kept open
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', '60'))
+# Async LLM calls in flight at once per process; further calls wait their turn
+OPENAI_MAX_CONCURRENCY = int(os.getenv('OPENAI_MAX_CONCURRENCY', str(OPENAI_MAX_CONNECTIONS)))
+# Seconds before an OpenAI request is abandoned
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '120'))
+# Retries the OpenAI SDK makes for connection errors, 429 and 5xx
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '2'))
+
+INSIGHT_MODEL = "gpt-4o-mini"
+CHAT_MODEL = "gpt-4-turbo-preview"
+INSIGHT_SYSTEM_PROMPT = "You are a construction expert with deep knowledge of building methods, safety requirements, and best practices."
+INSIGHT_PROMPT_FIELDS = (
+    'key', 'phase_number', 'wbs_category', 'division', 'duration',
+    'predecessor', 'start_date', 'end_date', 'labor'
+)
+INSIGHT_PROMPT_TEMPLATE = """
         As a construction expert specializing in foundations, provide detailed information about the following foundation element:
         
         Item Details:
-        - Key: {item_data.get('key', 'N/A')}
-        - Phase: {item_data.get('phase_number', 'N/A')}
-        - WBS Category: {item_data.get('wbs_category', 'N/A')}
-        - Division: {item_data.get('division', 'N/A')}
-        - Duration: {item_data.get('duration', 'N/A')} days
-        - Predecessor: {item_data.get('predecessor', 'N/A')}
-        - Start Date: {item_data.get('start_date', 'N/A')}
-        - End Date: {item_data.get('end_date', 'N/A')}
-        - Labor Hours: {item_data.get('labor', 'N/A')}
+        - Key: {key}
+        - Phase: {phase_number}
+        - WBS Category: {wbs_category}
+        - Division: {division}
+        - Duration: {duration} days
+        - Predecessor: {predecessor}
+        - Start Date: {start_date}
+        - End Date: {end_date}
+        - Labor Hours: {labor}
         
         Please provide comprehensive information in the following sections:
 
@@ -118,56 +126,147 @@ class ConstructionAIAgent:
         - Drainage materials
         - Required testing and submittals
 
+        11. Quality Control:
+        - Critical quality control points
+        - Inspection and testing hold points
+        - Acceptance criteria and tolerances
+        - Nonconformance handling
+
         Format the response in clear sections with detailed technical information.
         Focus on practical implementation and coordination requirements.
         Include specific callouts for critical quality control points.
         """
-        
-        # Get completion from OpenAI
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a construction expert with deep knowledge of building methods, safety requirements, and best practices."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        
-        # Parse the response
-        content = response.choices[0].message.content
-        sections = content.split('\n\n')
-        
-        # Create ConstructionInsight object
-        return ConstructionInsight(
-            item_key=item_data.get('key', ''),
-            phase_number=item_data.get('phase_number', ''),
-            construction_details=self._extract_section(sections, "construction process"),
-            submittals=self._extract_section(sections, "submittals"),
-            specifications=self._extract_section(sections, "specifications"),
-            rfis=self._extract_section(sections, "rfi"),
-            photos_required=self._extract_section(sections, "photos"),
-            best_practices=self._extract_section(sections, "best practices"),
-            safety_considerations=self._extract_section(sections, "safety"),
-            dependencies=self._extract_section(sections, "dependencies"),
-            estimated_labor_hours=self._extract_section(sections, "labor"),
-            material_specifications=self._extract_section(sections, "material"),
-            quality_control=self._extract_section(sections, "quality"),
-            coordination_notes=self._extract_section(sections, "coordination")
-        )
-    
-    def _extract_section(self, sections: list, keyword: str) -> str:
-        """Helper method to extract specific sections from the AI response"""
-        for section in sections:
-            if keyword.lower() in section.lower():
-                return section.strip()
-        return ""
-
-    def chat_with_insight(self, insight: ConstructionInsight, user_message: str) -> str:
-        """Chat with the AI about specific construction insights"""
-        
-        prompt = f"""
-        You are a construction expert assistant. Use the following construction insight data to answer the user's question.
-        Be specific and reference the data when possible.
 
+# The shared instructions are sent once per batch; only the element list grows with it
+INSIGHT_BATCH_PROMPT_TEMPLATE = """
+        As a construction expert, provide detailed information about each of the construction elements listed below.
+
+        Return one entry in "insights" per element, with its item_index and these fields:
+        - construction_details: construction process; excavation and soil preparation, reinforcement placement, concrete specifications and pouring methods, waterproofing and drainage, quality control checkpoints
+        - submittals: shop drawings, product data, mix design approvals, engineering calculations, samples, testing reports
+        - specifications: applicable specification sections, key requirements, testing and tolerance requirements, referenced standards, quality assurance requirements
+        - rfis: common RFI topics, critical clarifications, design coordination issues, construction method verifications
+        - photos_required: pre-installation, progress, quality control and as-built documentation, testing and inspection records
+        - best_practices: site preparation, formwork and reinforcement, placement techniques, curing and protection, quality assurance
+        - safety_considerations: excavation safety, fall protection, placement safety, equipment operation, required PPE
+        - dependencies: site investigations, utility coordination, sequencing with other trades, inspections and approvals, weather
+        - estimated_labor_hours: crew composition, specialized skills, time estimates for each phase, equipment operators
+        - material_specifications: mix design, reinforcement, waterproofing and drainage materials, required testing
+        - quality_control: critical quality control points, inspections and acceptance criteria
+        - coordination_notes: coordination with other trades, the design team and inspectors
+
+        Focus on practical implementation and coordination requirements; keep each field to a few specific sentences.
+
+        Elements:
+        {items}
+        """
+INSIGHT_BATCH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "construction_insights",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "insights": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "item_index": {"type": "integer"},
+                            **{field: {"type": "string"} for field in INSIGHT_SECTION_FIELDS},
+                        },
+                        "required": ["item_index", *INSIGHT_SECTION_FIELDS],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["insights"],
+            "additionalProperties": False,
+        },
+    },
+}
+# Expected completion tokens per element in a batched response, used to size batches
+INSIGHT_OUTPUT_TOKENS_PER_ITEM = 700
+# Insights are shared by a whole element family; this asks only for what one element adds
+ELEMENT_NOTES_PROMPT_TEMPLATE = """
+        The construction guidance below was written once for every element of the {family} family
+        (Phase {phase_number}, Division {division}, WBS Category {wbs_category}).
+
+        Element: {key}
+
+        Shared guidance:
+        - Construction Details: {construction_details}
+        - Dependencies: {dependencies}
+        - Safety Considerations: {safety_considerations}
+        - Quality Control: {quality_control}
+
+        List only what is different or additionally required for this specific element, such as its
+        location, size, sequencing or interfaces, in at most five short bullet points.
+        Do not repeat the shared guidance. Answer "None" if nothing differs.
+        """
+
+def insight_prompt_version() -> str:
+    """Hash of everything that shapes an insight response; cached insights from other versions are ignored"""
+    return hashlib.sha256(
+        "\0".join([
+            INSIGHT_MODEL, INSIGHT_SYSTEM_PROMPT, INSIGHT_PROMPT_TEMPLATE,
+            INSIGHT_BATCH_PROMPT_TEMPLATE, json.dumps(INSIGHT_BATCH_RESPONSE_FORMAT, sort_keys=True),
+            ELEMENT_NOTES_PROMPT_TEMPLATE
+        ]).encode()
+    ).hexdigest()[:16]
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (about four characters per token)"""
+    return len(text) // 4 + 1
+
+def request_prompt_tokens(request: Dict[str, Any]) -> int:
+    """Estimated prompt tokens of chat completion arguments"""
+    return sum(estimate_tokens(message['content']) for message in request['messages'])
+
+def batch_item_line(index: int, item_data: Dict[str, Any]) -> str:
+    """One element of a batched insight prompt; unknown details are left out"""
+    details = {"item_index": index}
+    details.update(
+        (field, item_data[field]) for field in INSIGHT_PROMPT_FIELDS
+        if item_data.get(field) not in (None, '', 'N/A')
+    )
+    return json.dumps(details, default=str)
+
+def shared_label(items: List[Dict[str, Any]], field: str) -> str:
+    """The value all items share for a usage label, or 'mixed'"""
+    values = {str(item.get(field, '')) for item in items}
+    return values.pop() if len(values) == 1 else 'mixed'
+
+def estimate_batch_item_tokens(item_data: Dict[str, Any]) -> int:
+    """Prompt plus expected completion tokens one element adds to a batch"""
+    return estimate_tokens(batch_item_line(0, item_data)) + INSIGHT_OUTPUT_TOKENS_PER_ITEM
+
+# Tokens every batch costs regardless of its size
+INSIGHT_BATCH_BASE_TOKENS = estimate_tokens(INSIGHT_SYSTEM_PROMPT + INSIGHT_BATCH_PROMPT_TEMPLATE)
+
+class ConstructionInsight(BaseModel):
+    item_key: str
+    phase_number: str
+    construction_details: str
+    best_practices: str
+    safety_considerations: str
+    dependencies: str
+    estimated_labor_hours: Optional[str]
+    material_specifications: Optional[str]
+    submittals: Optional[str]
+    specifications: Optional[str]
+    rfis: Optional[str]
+    quality_control: Optional[str]
+    photos_required: Optional[str]
+    coordination_notes: Optional[str]
+    # What sets this element apart from its family's shared insight; only filled in on request
+    element_notes: Optional[str] = None
+
+CHAT_SYSTEM_PROMPT = """You are a knowledgeable construction expert assistant providing detailed technical information.
+Use the construction insight data you are given to answer the user's questions. Be specific and reference the data when possible.
+Provide clear, concise, and professional responses focusing on the specific aspects mentioned in each question."""
+CHAT_CONTEXT_TEMPLATE = """
         Construction Item Data:
         - Key: {insight.item_key}
         - Phase: {insight.phase_number}
@@ -181,18 +280,344 @@ class ConstructionAIAgent:
         - Material Specifications: {insight.material_specifications}
         - Quality Control: {insight.quality_control}
         - Coordination Notes: {insight.coordination_notes}
+        - Element Notes: {element_notes}
+        """
+CHAT_SUMMARY_PROMPT_TEMPLATE = """
+        Update the summary of a conversation about a construction element with the turns below.
+        Keep every decision, figure, constraint and open question; drop pleasantries.
+        Answer with the updated summary only, in at most 200 words.
 
-        User Question: {user_message}
+        Current summary:
+        {summary}
 
-        Provide a clear, concise, and professional response focusing on the specific aspects mentioned in the question.
+        New turns:
+        {conversation}
         """
+# Longest summary of older chat turns
+CHAT_SUMMARY_MAX_TOKENS = 400
+# Expected completion tokens of a chat answer and of element notes, used for budget checks
+CHAT_OUTPUT_TOKENS = 600
+ELEMENT_NOTES_OUTPUT_TOKENS = 200
 
-        response = self.client.chat.completions.create(
-            model="gpt-4-turbo-preview",
+def chat_context(insight: ConstructionInsight) -> str:
+    """The insight data a chat is about, identical for every message about the same insight"""
+    return CHAT_CONTEXT_TEMPLATE.format(insight=insight, element_notes=insight.element_notes or 'N/A')
+
+def openai_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+    )
+
+
+class ConstructionAIAgent:
+    """LLM calls for construction insights and chat
+
+    Build it through get_agent() so the whole process shares one pair of
+    OpenAI clients and their keep-alive connection pools.
+    """
+
+    def __init__(self, client: Optional[OpenAI] = None, async_client: Optional[AsyncOpenAI] = None,
+                 max_concurrency: int = OPENAI_MAX_CONCURRENCY):
+        self.client = client or OpenAI(
+            api_key=os.getenv('OPENAI_API_KEY'),
+            timeout=OPENAI_TIMEOUT,
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=DefaultHttpxClient(limits=openai_limits())
+        )
+        self.async_client = async_client or AsyncOpenAI(
+            api_key=os.getenv('OPENAI_API_KEY'),
+            timeout=OPENAI_TIMEOUT,
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=DefaultAsyncHttpxClient(limits=openai_limits())
+        )
+        self.limit = asyncio.Semaphore(max_concurrency)
+
+    @asynccontextmanager
+    async def _openai_call(self):
+        """Hold a concurrency slot for one async OpenAI call and track it in metrics"""
+        async with self.limit:
+            with track_external('openai'):
+                yield
+
+    def _admit(self, request: Dict[str, Any], expected_output: int) -> Dict[str, Any]:
+        """Check a call against the current request's LLM budget, degrading it if configured to
+
+        Structured-output calls are never given a lower max_tokens: a cut-off
+        JSON response loses every item in it.
+        """
+        model, max_tokens = request_usage().admit(
+            request['model'], request_prompt_tokens(request), expected_output,
+            truncate='response_format' not in request
+        )
+        if max_tokens is None:
+            return dict(request, model=model)
+        return dict(request, model=model, max_tokens=min(max_tokens, request.get('max_tokens', max_tokens)))
+
+    def _complete(self, operation: str, request: Dict[str, Any], expected_output: int,
+                  phase: str = '', division: str = ''):
+        """Send a chat completion and account its usage"""
+        request = self._admit(request, expected_output)
+        started = time.perf_counter()
+        with track_external('openai'):
+            response = self.client.chat.completions.create(**request)
+        record_call(operation, request['model'], *usage_counts(response.usage),
+                    time.perf_counter() - started, phase, division)
+        return response
+
+    async def _acomplete(self, operation: str, request: Dict[str, Any], expected_output: int,
+                         phase: str = '', division: str = ''):
+        """Async variant of _complete, within the concurrency limit"""
+        request = self._admit(request, expected_output)
+        async with self._openai_call():
+            started = time.perf_counter()
+            response = await self.async_client.chat.completions.create(**request)
+        record_call(operation, request['model'], *usage_counts(response.usage),
+                    time.perf_counter() - started, phase, division)
+        return response
+
+    async def aclose(self):
+        """Close both clients and their pooled connections"""
+        self.client.close()
+        await self.async_client.close()
+
+    def generate_construction_insight(self, item_data: Dict[str, Any]) -> ConstructionInsight:
+        """Generate construction insights for a specific item"""
+        response = self._complete(
+            'insight', self._insight_request(item_data), INSIGHT_OUTPUT_TOKENS_PER_ITEM,
+            item_data.get('phase_number', ''), item_data.get('division', '')
+        )
+        return self._parse_insight(item_data, response.choices[0].message.content)
+
+    async def agenerate_construction_insight(self, item_data: Dict[str, Any]) -> ConstructionInsight:
+        """Async variant of generate_construction_insight that does not block the event loop"""
+        response = await self._acomplete(
+            'insight', self._insight_request(item_data), INSIGHT_OUTPUT_TOKENS_PER_ITEM,
+            item_data.get('phase_number', ''), item_data.get('division', '')
+        )
+        return self._parse_insight(item_data, response.choices[0].message.content)
+
+    async def agenerate_construction_insights(self, items: List[Dict[str, Any]]
+                                              ) -> List[Optional[ConstructionInsight]]:
+        """Generate insights for several items in one structured-output request
+
+        Results keep the order of items; an item the model left out or answered
+        incompletely is None, so callers can retry only those.
+        """
+        response = await self._acomplete(
+            'insight_batch', self._batch_request(items), INSIGHT_OUTPUT_TOKENS_PER_ITEM * len(items),
+            *(shared_label(items, field) for field in ('phase_number', 'division'))
+        )
+        return self._parse_batch(items, response.choices[0].message.content)
+
+    def _batch_request(self, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the chat completion arguments for a batched insight request"""
+        prompt = INSIGHT_BATCH_PROMPT_TEMPLATE.format(items="\n        ".join(
+            batch_item_line(index, item_data) for index, item_data in enumerate(items)
+        ))
+        return dict(
+            model=INSIGHT_MODEL,
+            messages=[
+                {"role": "system", "content": INSIGHT_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            response_format=INSIGHT_BATCH_RESPONSE_FORMAT
+        )
+
+    def _parse_batch(self, items: List[Dict[str, Any]], content: Optional[str]
+                     ) -> List[Optional[ConstructionInsight]]:
+        """Map a batched JSON response onto the items it answers"""
+        results: List[Optional[ConstructionInsight]] = [None] * len(items)
+        try:
+            entries = json.loads(content or '')['insights']
+        except (ValueError, KeyError, TypeError) as e:
+            # Typically a response cut off at the token limit
+            logger.error(f"Unreadable batched insight response for {len(items)} items: {e}")
+            return results
+
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            index = entry.get('item_index')
+            if not isinstance(index, int) or not 0 <= index < len(items) or results[index] is not None:
+                continue
+            if not all(isinstance(entry.get(field), str) for field in INSIGHT_SECTION_FIELDS):
+                continue
+            if not entry['construction_details'].strip():
+                continue
+            item_data = items[index]
+            results[index] = ConstructionInsight(
+                item_key=item_data.get('key', ''),
+                phase_number=str(item_data.get('phase_number', '')),
+                **{field: entry[field].strip() for field in INSIGHT_SECTION_FIELDS}
+            )
+        return results
+
+    async def agenerate_element_notes(self, insight: ConstructionInsight,
+                                      item_data: Dict[str, Any]) -> str:
+        """Describe what one element needs beyond its family's shared insight"""
+        response = await self._acomplete(
+            'element_notes', self.element_notes_request(insight, item_data), ELEMENT_NOTES_OUTPUT_TOKENS,
+            item_data.get('phase_number', ''), item_data.get('division', '')
+        )
+        return (response.choices[0].message.content or '').strip()
+
+    def element_notes_request(self, insight: ConstructionInsight, item_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the chat completion arguments for an element notes request"""
+        prompt = ELEMENT_NOTES_PROMPT_TEMPLATE.format(
+            family=insight.item_key,
+            key=item_data.get('key', ''),
+            phase_number=item_data.get('phase_number', 'N/A'),
+            division=item_data.get('division', 'N/A'),
+            wbs_category=item_data.get('wbs_category', 'N/A'),
+            construction_details=insight.construction_details,
+            dependencies=insight.dependencies,
+            safety_considerations=insight.safety_considerations,
+            quality_control=insight.quality_control
+        )
+        return dict(
+            model=INSIGHT_MODEL,
             messages=[
-                {"role": "system", "content": "You are a knowledgeable construction expert providing detailed technical information."},
+                {"role": "system", "content": INSIGHT_SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ]
         )
 
-        return response.choices[0].message.content 
\ No newline at end of file
+    def _insight_request(self, item_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the chat completion arguments for an insight request"""
+        
+        # Create a prompt based on the item data
+        prompt = INSIGHT_PROMPT_TEMPLATE.format(**{
+            field: item_data.get(field, 'N/A') for field in INSIGHT_PROMPT_FIELDS
+        })
+        
+        return dict(
+            model=INSIGHT_MODEL,
+            messages=[
+                {"role": "system", "content": INSIGHT_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ]
+        )
+
+    def _parse_insight(self, item_data: Dict[str, Any], content: Optional[str]) -> ConstructionInsight:
+        """Parse the AI response into a ConstructionInsight"""
+        return ConstructionInsight(
+            item_key=item_data.get('key', ''),
+            phase_number=item_data.get('phase_number', ''),
+            **parse_sections(content or '')
+        )
+
+    def chat_with_insight(self, insight: ConstructionInsight, user_message: str, summary: str = '',
+                          history: Sequence[Dict[str, str]] = ()) -> str:
+        """Chat with the AI about specific construction insights, continuing an earlier conversation if given"""
+        response = self._complete(
+            'chat', self._chat_request(insight, user_message, summary, history),
+            CHAT_OUTPUT_TOKENS, insight.phase_number
+        )
+
+        return response.choices[0].message.content
+
+    async def achat_with_insight(self, insight: ConstructionInsight, user_message: str, summary: str = '',
+                                 history: Sequence[Dict[str, str]] = ()) -> str:
+        """Async variant of chat_with_insight that does not block the event loop"""
+        response = await self._acomplete(
+            'chat', self._chat_request(insight, user_message, summary, history),
+            CHAT_OUTPUT_TOKENS, insight.phase_number
+        )
+
+        return response.choices[0].message.content
+
+    async def astream_chat_with_insight(self, insight: ConstructionInsight, user_message: str,
+                                        summary: str = '', history: Sequence[Dict[str, str]] = ()
+                                        ) -> AsyncIterator[str]:
+        """Yield the chat answer in pieces as the model produces them
+
+        Closing the iterator early (e.g. when the client disconnects) closes
+        the OpenAI stream, so generation stops instead of running to the end.
+        The concurrency slot is held until the stream ends. Usage is accounted
+        from the final usage chunk, or estimated when the stream was cut short.
+        """
+        request = self._admit(self._chat_request(insight, user_message, summary, history), CHAT_OUTPUT_TOKENS)
+        first_token = True
+        parts = []
+        usage = None
+        async with self._openai_call():
+            started = time.perf_counter()
+            stream = await self.async_client.chat.completions.create(
+                **request, stream=True, stream_options={"include_usage": True}
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    text = chunk.choices[0].delta.content
+                    if not text:
+                        continue
+                    if first_token:
+                        first_token = False
+                        LLM_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - started, operation='chat')
+                    parts.append(text)
+                    yield text
+            finally:
+                await stream.close()
+                counts = usage_counts(usage) if usage is not None else (
+                    sum(estimate_tokens(message['content']) for message in request['messages']),
+                    estimate_tokens(''.join(parts)) if parts else 0,
+                    0
+                )
+                record_call('chat_stream', request['model'], *counts,
+                            time.perf_counter() - started, insight.phase_number)
+
+    async def asummarize_chat(self, summary: str, turns: Sequence[Dict[str, str]]) -> str:
+        """Fold older chat turns into the running summary of a conversation"""
+        conversation = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        response = await self._acomplete('chat_summary', dict(
+            model=INSIGHT_MODEL,
+            messages=[
+                {"role": "system", "content": CHAT_SYSTEM_PROMPT},
+                {"role": "user", "content": CHAT_SUMMARY_PROMPT_TEMPLATE.format(
+                    summary=summary or 'None', conversation=conversation
+                )}
+            ],
+            max_tokens=CHAT_SUMMARY_MAX_TOKENS
+        ), CHAT_SUMMARY_MAX_TOKENS)
+        return (response.choices[0].message.content or '').strip()
+
+    def _chat_request(self, insight: ConstructionInsight, user_message: str, summary: str = '',
+                      history: Sequence[Dict[str, str]] = ()) -> Dict[str, Any]:
+        """Build the chat completion arguments for a question about an insight
+
+        The instructions and insight data come first and do not change during a
+        conversation, so the provider can reuse its cached prompt prefix; the
+        summary of older turns, the recent turns and the question follow.
+        """
+        messages = [
+            {"role": "system", "content": CHAT_SYSTEM_PROMPT},
+            {"role": "system", "content": chat_context(insight)}
+        ]
+        if summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        messages.extend(history)
+        messages.append({"role": "user", "content": user_message})
+        return dict(model=CHAT_MODEL, messages=messages)
+
+
+_agent: Optional[ConstructionAIAgent] = None
+
+
+def get_agent() -> ConstructionAIAgent:
+    """The process-wide agent shared by every API"""
+    global _agent
+    if _agent is None:
+        _agent = ConstructionAIAgent()
+    return _agent
+
+
+async def close_agent():
+    global _agent
+    if _agent is not None:
+        agent, _agent = _agent, None
+        await agent.aclose()
@@ -0,0 +1,105 @@
+from typing import Dict, Hashable, List
+
+import numpy as np
+
+from filter_index import FilterIndex
+from versioned_cache import VersionedCache
+
+# Distinct filters remembered per data version
+FACET_CACHE_SIZE = 256
+
+
+def _label(value):
+    """Render whole-number phases as ints in JSON output"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _decode(values: List[Hashable], code: int):
+    return _label(values[code]) if code >= 0 else None
+
+
+def _sort_key(value):
+    """Numbers before strings, missing values last"""
+    return (value is None, isinstance(value, str), 0 if value is None else value)
+
+
+def _marginal(codes: np.ndarray, values: List[Hashable], durations: np.ndarray,
+              labor: np.ndarray) -> List[Dict]:
+    """Count, duration and labor totals per value of one dimension"""
+    # Shift by one so the -1 "missing" code lands in bin 0
+    shifted = codes + 1
+    size = len(values) + 1
+    counts = np.bincount(shifted, minlength=size)
+    duration_sums = np.bincount(shifted, weights=durations, minlength=size)
+    labor_sums = np.bincount(shifted, weights=labor, minlength=size)
+    rows = [
+        {
+            "value": _decode(values, code - 1),
+            "count": int(counts[code]),
+            "duration": float(duration_sums[code]),
+            "labor": float(labor_sums[code]),
+        }
+        for code in np.flatnonzero(counts)
+    ]
+    return sorted(rows, key=lambda row: _sort_key(row["value"]))
+
+
+def compute_facets(index: FilterIndex, mask: np.ndarray) -> Dict:
+    """Group the masked records by Phase x Division x WBS in one vectorized pass
+
+    Multi-valued Division/WBS cells are grouped under their first value, matching
+    how DocumentReference picks a record's division.
+    """
+    positions = np.flatnonzero(mask)
+    phase = index.phase_codes[positions] + 1
+    division = index.division_codes[positions] + 1
+    wbs = index.wbs_codes[positions] + 1
+    durations = np.nan_to_num(index.durations[positions])
+    labor = np.nan_to_num(index.labor[positions])
+
+    division_size = len(index.division_values) + 1
+    wbs_size = len(index.wbs_values) + 1
+    combined = (phase * division_size + division) * wbs_size + wbs
+
+    groups, inverse, counts = np.unique(combined, return_inverse=True, return_counts=True)
+    duration_sums = np.bincount(inverse, weights=durations, minlength=len(groups))
+    labor_sums = np.bincount(inverse, weights=labor, minlength=len(groups))
+
+    group_phase, remainder = np.divmod(groups, division_size * wbs_size)
+    group_division, group_wbs = np.divmod(remainder, wbs_size)
+
+    rows = [
+        {
+            "phase": _decode(index.phase_values, int(group_phase[i]) - 1),
+            "division": _decode(index.division_values, int(group_division[i]) - 1),
+            "wbs": _decode(index.wbs_values, int(group_wbs[i]) - 1),
+            "count": int(counts[i]),
+            "duration": float(duration_sums[i]),
+            "labor": float(labor_sums[i]),
+        }
+        for i in range(len(groups))
+    ]
+    rows.sort(key=lambda row: (
+        _sort_key(row["phase"]), _sort_key(row["division"]), _sort_key(row["wbs"])
+    ))
+
+    return {
+        "groups": rows,
+        "by_phase": _marginal(phase - 1, index.phase_values, durations, labor),
+        "by_division": _marginal(division - 1, index.division_values, durations, labor),
+        "by_wbs": _marginal(wbs - 1, index.wbs_values, durations, labor),
+        "totals": {
+            "count": int(len(positions)),
+            "duration": float(durations.sum()),
+            "labor": float(labor.sum()),
+        },
+    }
+
+
+class FacetCache(VersionedCache):
+    """LRU of facet results that is emptied whenever the data version changes"""
+
+    def __init__(self, maxsize: int = FACET_CACHE_SIZE):
+        super().__init__(maxsize)
@@ -0,0 +1,415 @@
+import asyncio
+import itertools
+import json
+import random
+import re
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WBS_CATEGORIES = [
+    "Foundation",
+    "Framing",
+    "Roof / Exterior Finishes",
+    "Interior Finishes",
+    "MEP Rough-In",
+    "Site Work",
+]
+DIVISIONS = ["01", "02", "03", "04", "05", "06", "07", "08", "09", "22", "23", "26"]
+
+INSIGHT_CONTENT = "\n\n".join([
+    "1. Construction Process: Lay out, form, place and finish per the drawings.",
+    "2. Best Practices: Verify dimensions before placement.",
+    "3. Safety Considerations: Fall protection and PPE at all times.",
+    "4. Dependencies: Requires completed inspections of preceding work.",
+    "5. Labor Requirements: Two-person crew, about 16 hours.",
+    "6. Material Specifications: Per project specifications section 03 30 00.",
+    "7. Submittals: Product data and shop drawings.",
+    "8. Specifications: CSI MasterFormat references.",
+    "9. RFIs: Clarify embed locations with the structural engineer.",
+    "10. Photos Required: Before and after placement.",
+    "11. Quality Control: Inspect tolerances before closing in.",
+])
+
+
+@dataclass
+class FakeServiceConfig:
+    latency: float = 0.05
+    # Latency is drawn uniformly from latency * (1 +/- jitter)
+    jitter: float = 0.2
+    # Share of requests answered with a retryable error (429 or 503)
+    error_rate: float = 0.0
+    seed: int = 1
+
+
+class FakeService:
+    def __init__(self, config: FakeServiceConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.requests = 0
+        self.errors = 0
+
+    async def delay(self):
+        spread = self.config.latency * self.config.jitter
+        await asyncio.sleep(max(0.0, self.config.latency + self.random.uniform(-spread, spread)))
+
+    async def simulate(self) -> Optional[JSONResponse]:
+        """Apply latency and maybe fail; returns an error response to send instead of the real one"""
+        self.requests += 1
+        await self.delay()
+        if self.random.random() < self.config.error_rate:
+            self.errors += 1
+            if self.random.random() < 0.5:
+                return JSONResponse({"error": "RATE_LIMITED"}, status_code=429,
+                                    headers={"Retry-After": "0.1"})
+            return JSONResponse({"error": "UNAVAILABLE"}, status_code=503)
+        return None
+
+
+def make_bim_records(count: int, seed: int = 1) -> List[Dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"rec{i:06d}",
+            "createdTime": "2024-01-01T00:00:00.000Z",
+            "fields": {
+                "key": f"{i}.1: EL_{i % 97}",
+                "Phase": rng.randint(0, 16),
+                "Duration": rng.randint(0, 5),
+                "WBS Category Level 1": rng.choice(WBS_CATEGORIES),
+                "Division": [rng.choice(DIVISIONS)],
+                "Labor": rng.randint(1, 40),
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def make_phase_mappings(count: int, seed: int = 1) -> List[Dict]:
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        start = date(2024, 1, 1) + timedelta(days=rng.randint(0, 300))
+        duration = rng.randint(1, 30)
+        records.append({
+            "id": f"recpm{i:05d}",
+            "createdTime": "2024-01-01T00:00:00.000Z",
+            "fields": {
+                "key": f"{i}.1: EL_{i % 97}",
+                "phase_number": str(rng.randint(0, 16)),
+                "division": rng.choice(DIVISIONS),
+                "wbs_category": rng.choice(WBS_CATEGORIES),
+                "duration": duration,
+                "percent_complete": round(rng.random(), 2),
+                "start_date": start.isoformat(),
+                "end_date": (start + timedelta(days=duration)).isoformat(),
+                "labor": rng.randint(1, 40),
+            },
+        })
+    return records
+
+
+class FakeAirtable(FakeService):
+    """Airtable REST API: list with offset paging, get, create, update, delete
+
+    The table named phase_table holds phase mappings, every other table the
+    BIM Layers records. filterByFormula is not evaluated (the backend filters
+    locally), except that last-modified syncs see no changes.
+    """
+
+    def __init__(self, config: FakeServiceConfig, records: int = 5000,
+                 phase_mappings: int = 200, phase_table: str = "phases"):
+        super().__init__(config)
+        self.phase_table = phase_table
+        self.tables = {
+            "bim": {r["id"]: r for r in make_bim_records(records, config.seed)},
+            phase_table: {r["id"]: r for r in make_phase_mappings(phase_mappings, config.seed)},
+        }
+        self._ids = itertools.count()
+
+    def table(self, name: str) -> Dict[str, Dict]:
+        return self.tables[self.phase_table if name == self.phase_table else "bim"]
+
+    def app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/v0/{base_id}/{table}")
+        async def list_records(table: str, request: Request):
+            error = await self.simulate()
+            if error:
+                return error
+            params = request.query_params
+            if "LAST_MODIFIED_TIME" in params.get("filterByFormula", ""):
+                return {"records": []}
+            records = list(self.table(table).values())
+            if params.get("maxRecords"):
+                records = records[:int(params["maxRecords"])]
+            offset = int(params.get("offset", 0))
+            size = min(int(params.get("pageSize", 100)), 100)
+            body = {"records": records[offset:offset + size]}
+            if offset + size < len(records):
+                body["offset"] = str(offset + size)
+            return body
+
+        @app.get("/v0/{base_id}/{table}/{record_id}")
+        async def get_record(table: str, record_id: str):
+            error = await self.simulate()
+            if error:
+                return error
+            record = self.table(table).get(record_id)
+            if record is None:
+                return JSONResponse({"error": "NOT_FOUND"}, status_code=404)
+            return record
+
+        @app.post("/v0/{base_id}/{table}")
+        async def create_record(table: str, request: Request):
+            error = await self.simulate()
+            if error:
+                return error
+            body = await request.json()
+            record = {
+                "id": f"recnew{next(self._ids):06d}",
+                "createdTime": "2024-01-01T00:00:00.000Z",
+                "fields": body["fields"],
+            }
+            self.table(table)[record["id"]] = record
+            return record
+
+        @app.patch("/v0/{base_id}/{table}/{record_id}")
+        async def update_record(table: str, record_id: str, request: Request):
+            error = await self.simulate()
+            if error:
+                return error
+            record = self.table(table).get(record_id)
+            if record is None:
+                return JSONResponse({"error": "NOT_FOUND"}, status_code=404)
+            record["fields"].update((await request.json())["fields"])
+            return record
+
+        @app.delete("/v0/{base_id}/{table}/{record_id}")
+        async def delete_record(table: str, record_id: str):
+            error = await self.simulate()
+            if error:
+                return error
+            self.table(table).pop(record_id, None)
+            return {"id": record_id, "deleted": True}
+
+        return app
+
+
+def structured_insights(prompt: str) -> str:
+    """A batched insight response with one entry per item_index found in the prompt"""
+    indices = [int(index) for index in re.findall(r'"item_index": (\d+)', prompt)]
+    sections = [section.split(": ", 1)[1] for section in INSIGHT_CONTENT.split("\n\n")]
+    fields = (
+        "construction_details", "best_practices", "safety_considerations", "dependencies",
+        "estimated_labor_hours", "material_specifications", "submittals", "specifications",
+        "rfis", "photos_required", "quality_control",
+    )
+    return json.dumps({"insights": [
+        dict(zip(fields, sections), item_index=index, coordination_notes=sections[3])
+        for index in indices
+    ]})
+
+
+def fake_usage(messages: List[Dict], content: str, seen_prefixes: Optional[set] = None) -> Dict:
+    """Token usage at about four characters per token
+
+    Like the provider, a system prefix of 1024 tokens or more that was sent
+    before counts as cached.
+    """
+    prompt_tokens = sum(len(message["content"]) for message in messages) // 4 + 1
+    completion_tokens = len(content) // 4 + 1
+    prefix = "".join(message["content"] for message in messages if message["role"] == "system")
+    cached_tokens = 0
+    if seen_prefixes is not None and len(prefix) // 4 >= 1024:
+        if prefix in seen_prefixes:
+            cached_tokens = len(prefix) // 4
+        seen_prefixes.add(prefix)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+
+class FakeOpenAI(FakeService):
+    """OpenAI chat completions, returning canned insight text (optionally streamed)
+
+    Requests with a json_schema response_format get a batched insight
+    response; completion latency grows with the number of items asked for.
+    Streamed responses send one word every token_delay seconds.
+    """
+
+    def __init__(self, config: FakeServiceConfig, token_delay: float = 0.002):
+        super().__init__(config)
+        self.token_delay = token_delay
+        self.streams_completed = 0
+        self.streams_cancelled = 0
+        self.prompt_prefixes: set = set()
+
+    def app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request):
+            error = await self.simulate()
+            if error:
+                return error
+            body = await request.json()
+            content = INSIGHT_CONTENT
+            if body.get("response_format", {}).get("type") == "json_schema":
+                content = structured_insights(body["messages"][-1]["content"])
+                # Output tokens dominate generation time; the first item is covered by simulate()
+                await asyncio.sleep(self.config.latency * 0.5 * max(content.count('"item_index"') - 1, 0))
+            usage = fake_usage(body["messages"], content, self.prompt_prefixes)
+            if body.get("stream"):
+                include_usage = body.get("stream_options", {}).get("include_usage", False)
+                return StreamingResponse(
+                    self._stream(body["model"], content, usage if include_usage else None),
+                    media_type="text/event-stream"
+                )
+            return {
+                "id": f"chatcmpl-{self.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        return app
+
+    async def _stream(self, model: str, content: str, usage: Optional[Dict] = None):
+        words = content.split(" ")
+        completed = False
+        try:
+            for i, word in enumerate(words):
+                chunk = {
+                    "id": f"chatcmpl-{self.requests}",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"content": word + (" " if i < len(words) - 1 else "")},
+                        "finish_reason": None,
+                    }],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(self.token_delay)
+            if usage is not None:
+                chunk = {
+                    "id": f"chatcmpl-{self.requests}",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [],
+                    "usage": usage,
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+            completed = True
+        finally:
+            if completed:
+                self.streams_completed += 1
+            else:
+                self.streams_cancelled += 1
+
+
+class FakeProcore(FakeService):
+    """Procore OAuth token, projects and project tasks"""
+
+    def __init__(self, config: FakeServiceConfig):
+        super().__init__(config)
+        self.tasks: Dict[int, List[Dict]] = {}
+        self._ids = itertools.count(1)
+
+    def app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/oauth/token")
+        async def token():
+            error = await self.simulate()
+            if error:
+                return error
+            return {"access_token": "fake-token", "token_type": "bearer", "expires_in": 7200}
+
+        @app.get("/rest/v1.0/projects")
+        async def projects():
+            error = await self.simulate()
+            if error:
+                return error
+            return [{"id": 1, "name": "Benchmark Project"}]
+
+        @app.get("/rest/v1.0/projects/{project_id}/tasks")
+        async def list_tasks(project_id: int):
+            error = await self.simulate()
+            if error:
+                return error
+            return self.tasks.get(project_id, [])
+
+        @app.post("/rest/v1.0/projects/{project_id}/tasks")
+        async def create_task(project_id: int, request: Request):
+            error = await self.simulate()
+            if error:
+                return error
+            task = dict(await request.json(), id=next(self._ids))
+            self.tasks.setdefault(project_id, []).append(task)
+            return task
+
+        @app.patch("/rest/v1.0/projects/{project_id}/tasks/{task_id}")
+        async def update_task(project_id: int, task_id: int, request: Request):
+            error = await self.simulate()
+            if error:
+                return error
+            for task in self.tasks.get(project_id, []):
+                if task["id"] == task_id:
+                    task.update(await request.json())
+                    return task
+            return JSONResponse({"error": "not found"}, status_code=404)
+
+        return app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class BackgroundServer:
+    """Serve an ASGI app with uvicorn on a daemon thread"""
+
+    def __init__(self, app, port: Optional[int] = None):
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=self.port, log_level="warning", lifespan="off"
+        ))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self, timeout: float = 10.0):
+        self.thread.start()
+        deadline = time.time() + timeout
+        while not self.server.started:
+            if time.time() > deadline:
+                raise RuntimeError(f"Fake service on port {self.port} did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
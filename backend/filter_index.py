@@ -0,0 +1,190 @@
+import bisect
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Field names exactly as they appear in Airtable
+PHASE_FIELD = "Phase"
+WBS_FIELD = "WBS Category Level 1"
+DURATION_FIELD = "Duration"
+DIVISION_FIELD = "Division"
+LABOR_FIELD = "Labor"
+KEY_FIELD = "key"
+
+# Stable result order used for pagination: (Phase, key, record id)
+SortKey = Tuple[float, str, str]
+
+
+def as_number(value) -> Optional[float]:
+    """Coerce an Airtable cell (number, numeric string or single-item list) to a float"""
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def as_strings(value) -> List[str]:
+    """Return an Airtable cell as a list of strings, flattening lookup/link arrays"""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(v) for v in value if v is not None]
+    return [str(value)]
+
+
+def _value_codes(values: List[List[Hashable]]) -> Tuple[List[Hashable], np.ndarray]:
+    """Dictionary-encode the first value of each cell; -1 marks an empty cell"""
+    lookup: Dict[Hashable, int] = {}
+    codes = np.fromiter(
+        (lookup.setdefault(cell[0], len(lookup)) if cell else -1 for cell in values),
+        dtype=np.int64, count=len(values)
+    )
+    return list(lookup), codes
+
+
+def _value_bitmaps(values: List[List[Hashable]], size: int) -> Dict[Hashable, np.ndarray]:
+    """Build one boolean bitmap per distinct value of a (possibly multi-valued) column"""
+    positions: Dict[Hashable, List[int]] = {}
+    for position, cell in enumerate(values):
+        for value in cell:
+            positions.setdefault(value, []).append(position)
+
+    bitmaps = {}
+    for value, hits in positions.items():
+        bitmap = np.zeros(size, dtype=bool)
+        bitmap[hits] = True
+        bitmaps[value] = bitmap
+    return bitmaps
+
+
+class FilterIndex:
+    """Immutable in-process index answering analytics filters with NumPy bitmap intersections
+
+    Phase, Division and WBS get one bitmap per distinct value; Duration is kept
+    as a sorted array so ranges resolve with two binary searches. Records are
+    also ranked by (Phase, key, id) so results can be paged with a keyset cursor.
+    """
+
+    def __init__(self, records: List[Dict]):
+        self.records = records
+        self.size = len(records)
+
+        fields = [record['fields'] for record in records]
+
+        phases = [as_number(f.get(PHASE_FIELD)) for f in fields]
+        phase_cells = [[] if p is None else [p] for p in phases]
+        division_cells = [as_strings(f.get(DIVISION_FIELD)) for f in fields]
+        wbs_cells = [as_strings(f.get(WBS_FIELD)) for f in fields]
+
+        self.phase_bitmaps = _value_bitmaps(phase_cells, self.size)
+        self.division_bitmaps = _value_bitmaps(division_cells, self.size)
+        self.wbs_bitmaps = _value_bitmaps(wbs_cells, self.size)
+
+        # Dictionary codes of each record's primary value, for vectorized grouping
+        self.phase_values, self.phase_codes = _value_codes(phase_cells)
+        self.division_values, self.division_codes = _value_codes(division_cells)
+        self.wbs_values, self.wbs_codes = _value_codes(wbs_cells)
+
+        durations = self._numeric_column(fields, DURATION_FIELD)
+        self.durations = durations
+        self.labor = self._numeric_column(fields, LABOR_FIELD)
+        valid = np.flatnonzero(~np.isnan(durations))
+        order = np.argsort(durations[valid], kind='stable')
+        self.duration_positions = valid[order]
+        self.duration_sorted = durations[self.duration_positions]
+
+        sort_keys: List[SortKey] = [
+            (float('inf') if phase is None else phase, str(f.get(KEY_FIELD, '')), record['id'])
+            for phase, f, record in zip(phases, fields, records)
+        ]
+        self.sorted_positions = np.array(
+            sorted(range(self.size), key=sort_keys.__getitem__), dtype=np.intp
+        )
+        self.sorted_keys = [sort_keys[i] for i in self.sorted_positions]
+        self.sort_rank = np.empty(self.size, dtype=np.intp)
+        self.sort_rank[self.sorted_positions] = np.arange(self.size)
+
+    @staticmethod
+    def _numeric_column(fields: List[Dict], field: str) -> np.ndarray:
+        """Float array of a numeric field, NaN where missing or non-numeric"""
+        return np.array(
+            [np.nan if v is None else v for v in (as_number(f.get(field)) for f in fields)],
+            dtype=float,
+        )
+
+    def _any_of(self, bitmaps: Dict, keys: Iterable) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        for key in keys:
+            bitmap = bitmaps.get(key)
+            if bitmap is not None:
+                mask |= bitmap
+        return mask
+
+    def phase_mask(self, phase_range: Tuple[float, float]) -> np.ndarray:
+        low, high = phase_range
+        return self._any_of(
+            self.phase_bitmaps, [p for p in self.phase_bitmaps if low <= p <= high]
+        )
+
+    def duration_mask(self, duration_range: Tuple[float, float]) -> np.ndarray:
+        low, high = duration_range
+        start = np.searchsorted(self.duration_sorted, low, side='left')
+        end = np.searchsorted(self.duration_sorted, high, side='right')
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.duration_positions[start:end]] = True
+        return mask
+
+    def mask(self,
+             phase_range: Tuple[float, float],
+             wbs_categories: Iterable[str] = (),
+             duration_range: Optional[Tuple[float, float]] = None,
+             divisions: Iterable[str] = ()) -> np.ndarray:
+        """Boolean mask over records matching every supplied filter dimension"""
+        mask = self.phase_mask(phase_range)
+        if duration_range is not None:
+            mask &= self.duration_mask(duration_range)
+        wbs_categories = list(wbs_categories)
+        if wbs_categories:
+            mask &= self._any_of(self.wbs_bitmaps, wbs_categories)
+        divisions = list(divisions)
+        if divisions:
+            mask &= self._any_of(self.division_bitmaps, divisions)
+        return mask
+
+    def positions(self, *args, **kwargs) -> np.ndarray:
+        """Positions of matching records, in table order"""
+        return np.flatnonzero(self.mask(*args, **kwargs))
+
+    def page(self,
+             phase_range: Tuple[float, float],
+             wbs_categories: Iterable[str] = (),
+             duration_range: Optional[Tuple[float, float]] = None,
+             divisions: Iterable[str] = (),
+             after: Optional[SortKey] = None,
+             limit: int = 25) -> Tuple[List[Dict], Optional[SortKey], int]:
+        """One page of matching records in (Phase, key, id) order
+
+        Returns (records, sort key to resume after or None on the last page, total matches).
+        Resuming by sort key rather than offset keeps pages stable while data changes.
+        """
+        positions = self.positions(phase_range, wbs_categories, duration_range, divisions)
+        total = len(positions)
+        ranks = self.sort_rank[positions]
+        if after is not None:
+            ranks = ranks[ranks >= bisect.bisect_right(self.sorted_keys, tuple(after))]
+        ranks = np.sort(ranks)[:limit + 1]
+        next_after = self.sorted_keys[ranks[limit - 1]] if len(ranks) > limit else None
+        return [self.records[i] for i in self.sorted_positions[ranks[:limit]]], next_after, total
+
+    def values(self, dimension: str) -> List:
+        """Distinct indexed values of 'phase', 'division' or 'wbs'"""
+        bitmaps = {
+            'phase': self.phase_bitmaps,
+            'division': self.division_bitmaps,
+            'wbs': self.wbs_bitmaps,
+        }[dimension]
+        return list(bitmaps.keys())
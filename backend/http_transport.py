@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import os
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Maximum open connections across all hosts
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '20'))
+# Idle connections kept alive for reuse
+HTTP_KEEPALIVE_CONNECTIONS = int(os.getenv('HTTP_KEEPALIVE_CONNECTIONS', '10'))
+# Seconds an idle keep-alive connection is kept open
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '30'))
+# Seconds before a request is abandoned
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '30'))
+# Retries after the first attempt for transient failures
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '3'))
+# Base of the exponential backoff, in seconds (1, 2, 4, ...)
+HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', '1'))
+# Never wait longer than this between retries, even if Retry-After asks for more
+HTTP_MAX_RETRY_DELAY = 60.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Methods safe to send again after a failure the server may already have acted on
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT', 'DELETE'}
+# Failures before the request reached the server, so any method can be retried
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class HttpTransport:
+    """Shared async HTTP client with keep-alive pooling, timeouts and retries
+
+    Transient failures (connection errors, timeouts, 429 and 5xx) are retried
+    with exponential backoff, honoring Retry-After when the server sends it.
+    POST and PATCH are only retried on 429 and on errors before the request
+    was sent: a timeout or 5xx may come after the server committed the
+    change, and sending it again would apply it twice.
+    """
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE,
+                 keepalive_connections: int = HTTP_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+                 timeout: float = HTTP_TIMEOUT,
+                 max_retries: int = HTTP_MAX_RETRIES,
+                 backoff_factor: float = HTTP_BACKOFF_FACTOR):
+        self.limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+        return self._client
+
+    def _backoff(self, attempt: int) -> float:
+        return self.backoff_factor * (2 ** attempt) * random.uniform(0.8, 1.2)
+
+    async def request(self, method: str, url: str,
+                      before_retry: Optional[Callable[[], Awaitable[None]]] = None,
+                      **kwargs) -> httpx.Response:
+        """Send a request, retrying transient failures; the final response is returned as-is
+
+        before_retry is awaited after the backoff and before every retry, for
+        example to take a rate-limit token for each one.
+        """
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                if attempt >= self.max_retries or not (idempotent or isinstance(e, CONNECT_ERRORS)):
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"{method} {url} failed ({e!r}), retrying in {delay:.1f}s")
+            else:
+                retryable = response.status_code == 429 or (idempotent and response.status_code in RETRY_STATUSES)
+                if not retryable or attempt >= self.max_retries:
+                    return response
+                retry_after = retry_after_seconds(response)
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                logger.warning(
+                    f"{method} {url} returned {response.status_code}, retrying in {delay:.1f}s"
+                )
+                await response.aclose()
+            await asyncio.sleep(min(delay, HTTP_MAX_RETRY_DELAY))
+            attempt += 1
+            if before_retry is not None:
+                await before_retry()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_transport: Optional[HttpTransport] = None
+
+
+def get_transport() -> HttpTransport:
+    """The process-wide transport shared by every outbound API client"""
+    global _transport
+    if _transport is None:
+        _transport = HttpTransport()
+    return _transport
+
+
+async def close_transport():
+    if _transport is not None:
+        await _transport.aclose()
@@ -0,0 +1,116 @@
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# ConstructionInsight fields filled in by the model, in the order the sections are asked for
+INSIGHT_SECTION_FIELDS = (
+    'construction_details', 'submittals', 'specifications', 'rfis', 'photos_required',
+    'best_practices', 'safety_considerations', 'dependencies', 'estimated_labor_hours',
+    'material_specifications', 'quality_control', 'coordination_notes'
+)
+
+# A numbered line that may be a section heading, in any of the styles the model uses:
+#   "1. Construction Process:", "**2. Required Submittals:**", "### 3) Specifications Reference"
+HEADING = re.compile(
+    r'\n ?(#{1,6}[ \t]*|\*\*[ \t]*)?(\d{1,2})[.)][ \t]+(\*\*)?'
+    r'([A-Za-z][^:*\n]{0,60})(?:\*\*)?[ \t]*:?[ \t]*(?:\*\*)?[ \t]*'
+)
+
+# Heading keyword -> fields the section fills, checked in order on the heading title only.
+# Fields after the first are filled only when no section of their own was found.
+SECTION_RULES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ('material', ('material_specifications',)),
+    ('submittal', ('submittals',)),
+    ('rfi', ('rfis',)),
+    ('photo', ('photos_required',)),
+    ('documentation', ('photos_required',)),
+    ('best practice', ('best_practices',)),
+    ('safety', ('safety_considerations',)),
+    ('dependenc', ('dependencies', 'coordination_notes')),
+    ('coordination', ('coordination_notes',)),
+    ('labor', ('estimated_labor_hours',)),
+    ('quality', ('quality_control',)),
+    ('process', ('construction_details',)),
+    ('construction detail', ('construction_details',)),
+    ('specification', ('specifications',)),
+)
+
+# Fields by section number in INSIGHT_PROMPT_TEMPLATE, for headings with an unfamiliar title
+SECTION_ORDER: Dict[int, Tuple[str, ...]] = {
+    1: ('construction_details',),
+    2: ('submittals',),
+    3: ('specifications',),
+    4: ('rfis',),
+    5: ('photos_required',),
+    6: ('best_practices',),
+    7: ('safety_considerations',),
+    8: ('dependencies', 'coordination_notes'),
+    9: ('estimated_labor_hours',),
+    10: ('material_specifications',),
+    11: ('quality_control',),
+}
+
+
+@lru_cache(maxsize=512)
+def fields_for_title(title: str) -> Optional[Tuple[str, ...]]:
+    title = title.lower()
+    for keyword, fields in SECTION_RULES:
+        if keyword in title:
+            return fields
+    return None
+
+
+def split_sections(content: str) -> List[Tuple[Tuple[str, ...], str]]:
+    """Walk the response once, returning (fields, body) for each numbered section
+
+    A numbered line starts a section when its title names one, or when it is
+    marked up as a heading and continues the numbering. Indented numbered
+    lines and ones continuing a numbered list inside the current section
+    stay in its body, unless they are marked up as headings.
+    """
+    text = '\n' + content.replace('\r\n', '\n')
+    sections: List[Tuple[Tuple[str, ...], int, int]] = []
+    last_number = 0
+    # Last item number of a numbered list inside the current section
+    list_number = 0
+    for match in HEADING.finditer(text):
+        markup, number, bold, title = match.groups()
+        number = int(number)
+        is_markup = markup is not None or bold is not None
+        fields = None
+        if is_markup or not list_number or number != list_number + 1:
+            fields = fields_for_title(title)
+            if fields is None and is_markup and number == last_number + 1:
+                fields = SECTION_ORDER.get(number)
+        if fields is None or number <= last_number:
+            list_number = number
+            continue
+        last_number = number
+        list_number = 0
+        sections.append((fields, match.start(), match.end()))
+
+    bodies = []
+    for position, (fields, _, body_start) in enumerate(sections):
+        end = sections[position + 1][1] if position + 1 < len(sections) else len(text)
+        bodies.append((fields, text[body_start:end].strip().lstrip('*').strip()))
+    return bodies
+
+
+def parse_sections(content: str) -> Dict[str, str]:
+    """Map a free-text insight response onto ConstructionInsight section fields
+
+    A response without recognizable headings is kept whole as construction_details.
+    """
+    primary: Dict[str, str] = {}
+    secondary: Dict[str, str] = {}
+    for fields, body in split_sections(content):
+        primary.setdefault(fields[0], body)
+        for field in fields[1:]:
+            secondary.setdefault(field, body)
+
+    if not primary and content.strip():
+        primary['construction_details'] = content.strip()
+    return {
+        field: primary.get(field) or secondary.get(field, "")
+        for field in INSIGHT_SECTION_FIELDS
+    }
@@ -0,0 +1,380 @@
+import asyncio
+import logging
+import os
+import re
+import uuid
+from functools import lru_cache
+from typing import Any, AsyncIterator, Awaitable, Callable, Coroutine, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from dotenv import load_dotenv
+
+from construction_ai_agent import (
+    ELEMENT_NOTES_OUTPUT_TOKENS,
+    INSIGHT_BATCH_BASE_TOKENS,
+    INSIGHT_MODEL,
+    INSIGHT_OUTPUT_TOKENS_PER_ITEM,
+    ConstructionAIAgent,
+    ConstructionInsight,
+    estimate_batch_item_tokens,
+    get_agent,
+    request_prompt_tokens,
+)
+from insight_store import InsightStore
+from llm_usage import (
+    LLMBudgetExceeded,
+    RequestUsage,
+    SharedUsage,
+    background_context,
+    request_usage,
+    start_in_background,
+)
+from single_flight import SingleFlight
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of insight requests in flight to OpenAI at once
+INSIGHT_CONCURRENCY = int(os.getenv('INSIGHT_CONCURRENCY', '8'))
+# Seconds before a single insight request is abandoned
+INSIGHT_TIMEOUT = float(os.getenv('INSIGHT_TIMEOUT', '60'))
+# Most items generated in one OpenAI request
+INSIGHT_BATCH_SIZE = int(os.getenv('INSIGHT_BATCH_SIZE', '8'))
+# Estimated prompt plus completion tokens allowed per batched request
+INSIGHT_BATCH_TOKEN_BUDGET = int(os.getenv('INSIGHT_BATCH_TOKEN_BUDGET', '8000'))
+# Seconds to wait for more cache misses before sending a batch that is not full
+INSIGHT_BATCH_WINDOW = float(os.getenv('INSIGHT_BATCH_WINDOW', '0.02'))
+# Times an item missing from a batched response is retried in a smaller batch
+INSIGHT_BATCH_RETRIES = int(os.getenv('INSIGHT_BATCH_RETRIES', '2'))
+# Generate one shared insight per element family instead of one per element
+INSIGHT_SHARE_FAMILIES = os.getenv('INSIGHT_SHARE_FAMILIES', 'true').lower() == 'true'
+# Seconds between checks for an insight another worker is generating
+LEASE_POLL_INTERVAL = 0.25
+# Store key marker for an element's insight with its element notes
+ELEMENT_NOTES_KEY = 'element_notes'
+
+# The instance number in front of an element key, "1.1: " in "1.1: A393_SERVICE_PIT_E30"
+KEY_INSTANCE_PREFIX = re.compile(r'^\s*\d+(?:\.\d+)*\s*:\s*')
+# Trailing key parts that number an instance rather than name a type: 12, #3, (2), [104512]
+INSTANCE_SUFFIX = re.compile(r'^(?:\d+|#\d+|\(\d+\)|\[\d+\])$')
+KEY_SEPARATORS = re.compile(r'[\s_\-]+')
+
+InsightKey = Tuple[str, str, str, str]
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+# Key, the future its insight is delivered to, and the usage its generation is charged to
+PendingInsight = Tuple[InsightKey, asyncio.Future, RequestUsage]
+# An insight, None when its generation failed, or the error when the LLM budget refused it
+InsightResult = Union[ConstructionInsight, LLMBudgetExceeded, None]
+
+
+def insight_key(item_data: Dict) -> InsightKey:
+    """Cache key for an Airtable record's insight: (key, Phase, Division, WBS)"""
+    return (
+        item_data.get('key', ''),
+        str(item_data.get('Phase', '')),
+        str(item_data.get('Division', '')),
+        str(item_data.get('WBS Category Level 1', ''))
+    )
+
+
+@lru_cache(maxsize=4096)
+def element_family(item_key: str) -> str:
+    """Normalize an element key to its family, "1.1: A393_SERVICE_PIT_2" -> "A393_SERVICE_PIT"
+
+    Trailing numbers that identify an instance are dropped. Marks that
+    start with a letter, such as F1, W2 or A393, name a type and are kept.
+    """
+    parts = [part for part in KEY_SEPARATORS.split(KEY_INSTANCE_PREFIX.sub('', item_key).upper()) if part]
+    while len(parts) > 1 and INSTANCE_SUFFIX.match(parts[-1]):
+        parts.pop()
+    return '_'.join(parts) or item_key
+
+
+def family_key(key: InsightKey) -> InsightKey:
+    """Cache key of the insight shared by every element of key's family in the same Phase, Division and WBS"""
+    if not INSIGHT_SHARE_FAMILIES or not key[0]:
+        return key
+    return (element_family(key[0]), *key[1:])
+
+
+def item_data_for(key: InsightKey) -> Dict[str, str]:
+    """Insight prompt fields for a cache key"""
+    item_key, phase, division, wbs = key
+    return {'key': item_key, 'phase_number': phase, 'division': division, 'wbs_category': wbs}
+
+
+def split_batches(entries: Sequence[PendingInsight], max_items: int,
+                  token_budget: int) -> List[List[PendingInsight]]:
+    """Pack entries in order into batches of at most max_items within the token budget
+
+    An entry that alone exceeds the budget still gets a batch of its own.
+    """
+    batches: List[List[PendingInsight]] = []
+    current: List[PendingInsight] = []
+    used = INSIGHT_BATCH_BASE_TOKENS
+    for entry in entries:
+        cost = estimate_batch_item_tokens(item_data_for(entry[0]))
+        if current and (len(current) >= max_items or used + cost > token_budget):
+            batches.append(current)
+            current, used = [], INSIGHT_BATCH_BASE_TOKENS
+        current.append(entry)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+class InsightPipeline:
+    """Generates AI insights concurrently on the async OpenAI client
+
+    Only successful generations are written to the persistent InsightStore,
+    and identical keys requested at the same time share a single OpenAI call,
+    also across worker processes: the first worker takes a lease in the store
+    and the others wait for its result.
+
+    Cache misses arriving within batch_window of each other are generated
+    together, several items per structured-output request, split by
+    batch_size and token_budget. Items missing from a response are retried
+    in smaller batches; the rest of the batch is kept.
+
+    Elements of one family (see element_family) with the same Phase, Division
+    and WBS share one generated insight. Element notes, one short extra call
+    per element, are only generated when asked for.
+
+    Shared generations and batches run outside the context of the request
+    that started them: their LLM cost is split among the requests waiting on
+    them, and each request's budget is checked when it joins, so no caller's
+    budget decides what others get.
+    """
+
+    def __init__(self, store: Optional[InsightStore] = None,
+                 concurrency: int = INSIGHT_CONCURRENCY, timeout: float = INSIGHT_TIMEOUT,
+                 batch_size: int = INSIGHT_BATCH_SIZE, token_budget: int = INSIGHT_BATCH_TOKEN_BUDGET,
+                 batch_window: float = INSIGHT_BATCH_WINDOW, retries: int = INSIGHT_BATCH_RETRIES):
+        self.store = store or InsightStore()
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.batch_size = max(1, batch_size)
+        self.token_budget = token_budget
+        self.batch_window = batch_window
+        self.retries = retries
+        self._queue: List[PendingInsight] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._batches: Set[asyncio.Task] = set()
+        self.batches_sent = 0
+        self.items_retried = 0
+        # Generations running for a key, each charged to the requests sharing it
+        self._inflight = SingleFlight(SharedUsage)
+        self._element_inflight = SingleFlight(SharedUsage)
+        self.element_notes_generated = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.joined_other_workers = 0
+
+    @property
+    def agent(self) -> ConstructionAIAgent:
+        # Looked up on each use: the shared agent is replaced after close_agent()
+        return get_agent()
+
+    @property
+    def lease_seconds(self) -> float:
+        # Covers every batch attempt, so a worker that dies holding a lease only stalls others that long
+        return self.timeout * (self.retries + 1)
+
+    async def _generate(self, key: InsightKey) -> ConstructionInsight:
+        """Queue a key for the next batch and wait for its insight"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((key, future, request_usage()))
+        if len(self._queue) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = background_context().run(loop.call_later, self.batch_window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._queue = self._queue, []
+        self._submit(pending, self.batch_size, attempt=0)
+
+    def _submit(self, pending: List[PendingInsight], max_items: int, attempt: int):
+        for batch in split_batches(pending, max_items, self.token_budget):
+            # Charged to the items' generations in equal parts, whoever filled the batch
+            usage = SharedUsage([item_usage for _, _, item_usage in batch])
+            task = start_in_background(self._run_batch(batch, attempt), usage)
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[PendingInsight], attempt: int):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        error: Exception = ValueError("No insight returned for this item")
+        try:
+            async with self._semaphore:
+                self.batches_sent += 1
+                insights = await asyncio.wait_for(
+                    self.agent.agenerate_construction_insights(
+                        [item_data_for(key) for key, _, _ in batch]
+                    ),
+                    timeout=self.timeout
+                )
+        except Exception as e:
+            logger.error(f"Batched insight request for {len(batch)} items failed: {e}")
+            error = e
+            insights = [None] * len(batch)
+
+        failed = []
+        for entry, insight in zip(batch, insights):
+            future = entry[1]
+            if future.done():
+                continue
+            if insight is not None:
+                future.set_result(insight)
+            else:
+                failed.append(entry)
+        if not failed:
+            return
+        if attempt < self.retries:
+            # Smaller batches make a truncated or partial response less likely the next time
+            self.items_retried += len(failed)
+            self._submit(failed, max(1, len(batch) // 2), attempt + 1)
+        else:
+            for _, future, _ in failed:
+                future.set_exception(error)
+
+    async def get(self, key: InsightKey, element_notes: bool = False) -> ConstructionInsight:
+        """Return the insight for an element, generating it on a cache miss
+
+        The insight is the one shared by the element's family, labelled with
+        the element's key; with element_notes it also carries the notes
+        specific to this element.
+        """
+        shared = await self._get_shared(family_key(key))
+        if element_notes:
+            return await self._element_insight(key, shared)
+        return shared.model_copy(update={'item_key': key[0]})
+
+    def _join(self, inflight: SingleFlight, key: InsightKey,
+              start: Callable[[], Coroutine[Any, Any, ConstructionInsight]]) -> Awaitable[ConstructionInsight]:
+        """Wait on the generation already running for key, or start it, sharing its cost"""
+        # A fresh context, so the generation is not held to the budget of the request that started it
+        result, usage = inflight.join(key, lambda usage: start_in_background(start(), usage))
+        usage.join(request_usage())
+        return result
+
+    async def _get_shared(self, key: InsightKey) -> ConstructionInsight:
+        insight = await asyncio.to_thread(self.store.get, key)
+        if insight is not None:
+            return insight
+        # The whole item plus a batch of its own, the most this request can be charged for it
+        item_tokens = estimate_batch_item_tokens(item_data_for(key))
+        with request_usage().reserve(
+            INSIGHT_MODEL, INSIGHT_BATCH_BASE_TOKENS + item_tokens - INSIGHT_OUTPUT_TOKENS_PER_ITEM,
+            INSIGHT_OUTPUT_TOKENS_PER_ITEM
+        ):
+            return await self._join(self._inflight, key, lambda: self._generate_and_store(key))
+
+    async def _element_insight(self, key: InsightKey, shared: ConstructionInsight) -> ConstructionInsight:
+        """The shared insight plus notes for this element, cached per element"""
+        insight = await asyncio.to_thread(self.store.get, (ELEMENT_NOTES_KEY, *key))
+        if insight is not None:
+            return insight
+        with request_usage().reserve(
+            INSIGHT_MODEL, request_prompt_tokens(self.agent.element_notes_request(shared, item_data_for(key))),
+            ELEMENT_NOTES_OUTPUT_TOKENS
+        ):
+            return await self._join(self._element_inflight, key,
+                                    lambda: self._generate_element_notes(key, shared))
+
+    async def _generate_element_notes(self, key: InsightKey, shared: ConstructionInsight) -> ConstructionInsight:
+        store_key = (ELEMENT_NOTES_KEY, *key)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            notes = await asyncio.wait_for(
+                self.agent.agenerate_element_notes(shared, item_data_for(key)),
+                timeout=self.timeout
+            )
+        self.element_notes_generated += 1
+        insight = shared.model_copy(update={'item_key': key[0], 'element_notes': notes})
+        try:
+            await asyncio.to_thread(self.store.set, store_key, insight)
+        except Exception as e:
+            logger.error(f"Failed to store element notes for {key[0]!r}: {e}")
+        return insight
+
+    async def _wait_for_other_worker(self, key: InsightKey) -> Optional[ConstructionInsight]:
+        """Poll the store until the lease holder's insight appears or the lease is free"""
+        while True:
+            await asyncio.sleep(LEASE_POLL_INTERVAL)
+            insight = await asyncio.to_thread(self.store.get, key, False)
+            if insight is not None:
+                self.joined_other_workers += 1
+                return insight
+            if await asyncio.to_thread(self.store.claim, key, self.owner, self.lease_seconds):
+                # The holder failed or gave up; this worker generates it instead
+                return None
+
+    async def _generate_and_store(self, key: InsightKey) -> ConstructionInsight:
+        if not await asyncio.to_thread(self.store.claim, key, self.owner, self.lease_seconds):
+            insight = await self._wait_for_other_worker(key)
+            if insight is not None:
+                return insight
+        try:
+            insight = await self._generate(key)
+            try:
+                await asyncio.to_thread(self.store.set, key, insight)
+            except Exception as e:
+                logger.error(f"Failed to store AI insight for {key[0]!r}: {e}")
+            return insight
+        finally:
+            await asyncio.to_thread(self.store.release, key, self.owner)
+
+    async def iter_completed(self, keys: Sequence[InsightKey], element_notes: bool = False
+                             ) -> AsyncIterator[Tuple[int, InsightResult]]:
+        """Yield (position, insight) pairs as soon as each key's insight is ready
+
+        A key whose generation fails or times out yields None; one refused
+        by the request's LLM budget yields the LLMBudgetExceeded error, so
+        callers can tell the client. Leaving the iteration early cancels the
+        remaining waits.
+        """
+        async def run(index: int, key: InsightKey) -> Tuple[int, InsightResult]:
+            try:
+                return index, await self.get(key, element_notes)
+            except LLMBudgetExceeded as e:
+                return index, e
+            except asyncio.TimeoutError:
+                logger.error(f"AI insight generation timed out for {key[0]!r}")
+            except Exception as e:
+                logger.error(f"AI insight generation failed for {key[0]!r}: {e}")
+            return index, None
+
+        tasks = [asyncio.ensure_future(run(index, key)) for index, key in enumerate(keys)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def generate_all(self, keys: Sequence[InsightKey],
+                           on_progress: Optional[ProgressCallback] = None,
+                           element_notes: bool = False
+                           ) -> List[InsightResult]:
+        """Generate insights for all keys concurrently; results keep the order of keys
+
+        A key whose generation fails or times out yields None, one refused by
+        the LLM budget its LLMBudgetExceeded error.
+        """
+        results: List[InsightResult] = [None] * len(keys)
+        done = 0
+        async for index, insight in self.iter_completed(keys, element_notes):
+            results[index] = insight
+            done += 1
+            if on_progress is not None:
+                await on_progress(done, len(keys))
+        return results
@@ -0,0 +1,322 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from dotenv import load_dotenv
+
+from airtable_scheduler import TokenBucket
+from filter_index import DIVISION_FIELD, PHASE_FIELD, as_number, as_strings
+from insight_pipeline import InsightKey, InsightPipeline, family_key, insight_key
+from llm_usage import start_in_background
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Progress of the current pre-warm job, read back to resume it after a restart
+PREWARM_CHECKPOINT_PATH = os.getenv(
+    'PREWARM_CHECKPOINT_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prewarm_checkpoint.json')
+)
+# Insights generated at once by a pre-warm job, leaving the rest of INSIGHT_CONCURRENCY to users
+PREWARM_CONCURRENCY = int(os.getenv('PREWARM_CONCURRENCY', '2'))
+# Insight generations a pre-warm job starts per second, to stay well under the OpenAI rate limit
+PREWARM_RATE = float(os.getenv('PREWARM_RATE', '1'))
+# Seconds between checkpoint writes while a job runs
+PREWARM_CHECKPOINT_INTERVAL = float(os.getenv('PREWARM_CHECKPOINT_INTERVAL', '5'))
+# Resume a job interrupted by a crash or restart when the app starts
+PREWARM_RESUME = os.getenv('PREWARM_RESUME', 'true').lower() == 'true'
+# Pre-warm the insights of new and changed records after every Airtable sync
+PREWARM_ON_SYNC = os.getenv('PREWARM_ON_SYNC', 'false').lower() == 'true'
+# Lease that keeps worker processes from running pre-warm jobs side by side
+PREWARM_LEASE_KEY = ('prewarm',)
+
+RecordLoader = Callable[[], Awaitable[Iterable[Dict]]]
+
+
+class PrewarmBusy(Exception):
+    """A pre-warm job is already running, in this worker or another"""
+
+
+class PrewarmJob:
+    """Work list and progress of one pre-warm run, as saved in the checkpoint"""
+
+    def __init__(self, keys: List[InsightKey], kind: str = 'full',
+                 phase: Optional[float] = None, division: Optional[str] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.phase = phase
+        self.division = division
+        self.keys = keys
+        self.done: Set[InsightKey] = set()
+        self.failed: Set[InsightKey] = set()
+        self.generated = 0
+        self.cached = 0
+        self.status = 'running'
+        self.started_at = time.time()
+        self.updated_at = self.started_at
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "phase": self.phase,
+            "division": self.division,
+            "status": self.status,
+            "keys": [list(key) for key in self.keys],
+            "done": [list(key) for key in self.done],
+            "failed": [list(key) for key in self.failed],
+            "generated": self.generated,
+            "cached": self.cached,
+            "started_at": self.started_at,
+            "updated_at": self.updated_at
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'PrewarmJob':
+        job = cls([tuple(key) for key in data["keys"]], data["kind"], data["phase"], data["division"])
+        job.id = data["id"]
+        job.status = data["status"]
+        job.done = {tuple(key) for key in data["done"]}
+        job.failed = {tuple(key) for key in data["failed"]}
+        job.generated = data["generated"]
+        job.cached = data["cached"]
+        job.started_at = data["started_at"]
+        job.updated_at = data["updated_at"]
+        return job
+
+    def summary(self) -> Dict:
+        elapsed = max(self.updated_at - self.started_at, 1e-9)
+        remaining = len(self.keys) - len(self.done) - len(self.failed)
+        rate = self.generated / elapsed
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "phase": self.phase,
+            "division": self.division,
+            "status": self.status,
+            "total": len(self.keys),
+            "done": len(self.done),
+            "generated": self.generated,
+            "cached": self.cached,
+            "failed": len(self.failed),
+            "remaining": remaining,
+            "started_at": self.started_at,
+            "updated_at": self.updated_at,
+            "eta_seconds": remaining / rate if self.status == 'running' and rate else None
+        }
+
+
+def write_checkpoint(path: str, job: PrewarmJob):
+    # Written to a temporary file and renamed, so a crash never leaves half a checkpoint
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(job.to_dict(), f)
+    os.replace(temp_path, path)
+
+
+def read_checkpoint(path: str) -> Optional[PrewarmJob]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return PrewarmJob.from_dict(json.load(f))
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error(f"Ignoring unreadable pre-warm checkpoint {path}: {e}")
+        return None
+
+
+def record_in_scope(fields: Dict, phase: Optional[float], division: Optional[str]) -> bool:
+    if phase is not None and as_number(fields.get(PHASE_FIELD)) != phase:
+        return False
+    if division is not None and division not in as_strings(fields.get(DIVISION_FIELD)):
+        return False
+    return True
+
+
+def job_keys(records: Iterable[Dict]) -> List[InsightKey]:
+    """The distinct shared insights a set of records needs, in a stable order"""
+    return sorted({family_key(insight_key(record['fields'])) for record in records})
+
+
+class InsightPrewarmer:
+    """Fills the insight cache ahead of users, one job at a time
+
+    A job walks the records of the whole table, or of one phase or
+    division, and generates every shared insight not yet cached, within
+    PREWARM_CONCURRENCY and PREWARM_RATE. Progress is checkpointed to
+    PREWARM_CHECKPOINT_PATH, so a job cut short by a crash or restart
+    resumes where it stopped. A lease in the insight store keeps worker
+    processes from running jobs side by side.
+
+    With on_sync, records changed by an Airtable sync are pre-warmed in
+    incremental jobs. Insights depend only on a record's key, phase,
+    division and WBS, so unchanged insights are cache hits and cost nothing.
+    """
+
+    def __init__(self, pipeline: InsightPipeline, load_records: RecordLoader,
+                 get_record: Callable[[str], Optional[Dict]] = lambda record_id: None,
+                 checkpoint_path: str = PREWARM_CHECKPOINT_PATH,
+                 concurrency: int = PREWARM_CONCURRENCY, rate: float = PREWARM_RATE,
+                 checkpoint_interval: float = PREWARM_CHECKPOINT_INTERVAL):
+        self.pipeline = pipeline
+        self.load_records = load_records
+        self.get_record = get_record
+        self.checkpoint_path = checkpoint_path
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.checkpoint_interval = checkpoint_interval
+        self.job: Optional[PrewarmJob] = None
+        self.owner = f"prewarm-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._task: Optional[asyncio.Task] = None
+        self._pending_ids: Set[str] = set()
+        self._checkpointed_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def lease_seconds(self) -> float:
+        # Renewed at every checkpoint; long enough to outlast one slow generation
+        return max(self.checkpoint_interval * 4, self.pipeline.lease_seconds * 2)
+
+    async def start(self, phase: Optional[float] = None, division: Optional[str] = None) -> PrewarmJob:
+        """Start a job over the whole table, or one phase or division of it"""
+        if self.running:
+            raise PrewarmBusy("A pre-warm job is already running")
+        records = [
+            record for record in await self.load_records()
+            if record_in_scope(record.get('fields', {}), phase, division)
+        ]
+        return await self._launch(PrewarmJob(job_keys(records), 'full', phase, division))
+
+    async def _launch(self, job: PrewarmJob) -> PrewarmJob:
+        if not await asyncio.to_thread(self.pipeline.store.claim, PREWARM_LEASE_KEY,
+                                       self.owner, self.lease_seconds):
+            raise PrewarmBusy("A pre-warm job is running in another worker")
+        self.job = job
+        await self._checkpoint(force=True)
+        # Charged to background: the request, sync or startup that launched it must not pay for or limit it
+        self._task = start_in_background(self._run(job))
+        return job
+
+    async def resume(self) -> Optional[PrewarmJob]:
+        """Continue the job in the checkpoint if it was still running when the process stopped"""
+        job = await asyncio.to_thread(read_checkpoint, self.checkpoint_path)
+        if job is None or job.status != 'running' or self.running:
+            return None
+        try:
+            await self._launch(job)
+        except PrewarmBusy:
+            return None
+        logger.info(f"Resuming insight pre-warm job {job.id}: {len(job.done)}/{len(job.keys)} done")
+        return job
+
+    def on_sync(self, changed: List[str], removed: List[str]):
+        """Mirror listener: pre-warm the insights of new and changed records"""
+        self._pending_ids.update(changed)
+        if not self.running:
+            start_in_background(self._start_incremental())
+
+    async def _start_incremental(self):
+        if self.running or not self._pending_ids:
+            return
+        ids, self._pending_ids = self._pending_ids, set()
+        records = [record for record in map(self.get_record, ids) if record is not None]
+        try:
+            await self._launch(PrewarmJob(job_keys(records), 'incremental'))
+        except PrewarmBusy:
+            # Another worker runs a job; its own mirror listener covers these records
+            logger.info(f"Skipping incremental pre-warm of {len(ids)} records, another worker is pre-warming")
+
+    async def cancel(self) -> bool:
+        if not self.running:
+            return False
+        self.job.status = 'cancelled'
+        await self.stop()
+        return True
+
+    async def stop(self):
+        """Stop the running job; unless cancelled, it stays resumable from its checkpoint"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Dict:
+        """The job running here, or else the last checkpointed job of any worker"""
+        job = self.job if self.running else read_checkpoint(self.checkpoint_path) or self.job
+        if job is None:
+            return {"status": "idle"}
+        return {**job.summary(), "running_here": self.running}
+
+    async def _checkpoint(self, force: bool = False):
+        now = time.time()
+        if not force and now - self._checkpointed_at < self.checkpoint_interval:
+            return
+        self._checkpointed_at = now
+        self.job.updated_at = now
+        try:
+            await asyncio.to_thread(write_checkpoint, self.checkpoint_path, self.job)
+            await asyncio.to_thread(self.pipeline.store.claim, PREWARM_LEASE_KEY,
+                                    self.owner, self.lease_seconds)
+        except Exception as e:
+            logger.error(f"Failed to checkpoint pre-warm job {self.job.id}: {e}")
+
+    async def _warm(self, job: PrewarmJob, key: InsightKey, bucket: TokenBucket):
+        if await asyncio.to_thread(self.pipeline.store.get, key, False) is not None:
+            job.cached += 1
+            job.done.add(key)
+            return
+        delay = await bucket.try_take()
+        while delay:
+            await asyncio.sleep(delay)
+            delay = await bucket.try_take()
+        try:
+            await self.pipeline.get(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Pre-warming the insight for {key[0]!r} failed: {e}")
+            job.failed.add(key)
+            return
+        job.generated += 1
+        job.done.add(key)
+
+    async def _run(self, job: PrewarmJob):
+        bucket = TokenBucket(self.rate, max(1, int(self.rate)))
+        pending = iter([key for key in job.keys if key not in job.done and key not in job.failed])
+
+        async def worker():
+            for key in pending:
+                await self._warm(job, key, bucket)
+                await self._checkpoint()
+
+        logger.info(f"Insight pre-warm job {job.id} ({job.kind}): {len(job.keys) - len(job.done)} insights to check")
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+            job.status = 'completed'
+            logger.info(
+                f"Insight pre-warm job {job.id} completed: {job.generated} generated, "
+                f"{job.cached} already cached, {len(job.failed)} failed"
+            )
+        except asyncio.CancelledError:
+            # Shutdown leaves the job 'running' in the checkpoint, so it resumes on the next start
+            raise
+        except Exception as e:
+            logger.error(f"Insight pre-warm job {job.id} failed: {e}")
+            job.status = 'failed'
+        finally:
+            await self._checkpoint(force=True)
+            await asyncio.to_thread(self.pipeline.store.release, PREWARM_LEASE_KEY, self.owner)
+            if job.status != 'running' and self._pending_ids:
+                start_in_background(self._start_incremental())
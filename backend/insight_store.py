@@ -0,0 +1,165 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, Optional, Sequence
+
+from dotenv import load_dotenv
+
+from construction_ai_agent import ConstructionInsight, insight_prompt_version
+from shared_state import ThreadConnections
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+INSIGHT_STORE_PATH = os.getenv(
+    'INSIGHT_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'insight_cache.sqlite3')
+)
+# Seconds before a cached insight is regenerated
+INSIGHT_CACHE_TTL = float(os.getenv('INSIGHT_CACHE_TTL', str(7 * 24 * 3600)))
+# Least recently used insights beyond this count are evicted
+INSIGHT_CACHE_MAX_ENTRIES = int(os.getenv('INSIGHT_CACHE_MAX_ENTRIES', '20000'))
+# How many writes between eviction passes
+EVICT_EVERY = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS insights (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS insights_accessed_at ON insights (accessed_at);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class InsightStore:
+    """SQLite-backed insight cache shared by every worker process on the host
+
+    Entries are keyed on the insight cache tuple plus the prompt/model version,
+    so changing the prompt template or model transparently starts a fresh cache.
+    """
+
+    def __init__(self, path: str = INSIGHT_STORE_PATH, ttl: float = INSIGHT_CACHE_TTL,
+                 max_entries: int = INSIGHT_CACHE_MAX_ENTRIES, version: Optional[str] = None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = version or insight_prompt_version()
+        self._connections = ThreadConnections(path, SCHEMA)
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    def key_for(self, key: Sequence) -> str:
+        return hashlib.sha256(
+            json.dumps([self.version, *key], default=str).encode()
+        ).hexdigest()
+
+    def get(self, key: Sequence, count: bool = True) -> Optional[ConstructionInsight]:
+        """Return a fresh cached insight, or None on a miss"""
+        conn = self._connection()
+        store_key = self.key_for(key)
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, created_at FROM insights WHERE key = ?", (store_key,)
+        ).fetchone()
+
+        if row is None or now - row[1] > self.ttl:
+            if row is not None:
+                conn.execute("DELETE FROM insights WHERE key = ?", (store_key,))
+            if count:
+                self._count('misses', 1)
+            return None
+
+        conn.execute("UPDATE insights SET accessed_at = ? WHERE key = ?", (now, store_key))
+        if count:
+            self._count('hits', 1)
+        try:
+            return ConstructionInsight.model_validate_json(row[0])
+        except ValueError as e:
+            logger.error(f"Discarding unreadable cached insight: {e}")
+            conn.execute("DELETE FROM insights WHERE key = ?", (store_key,))
+            return None
+
+    def set(self, key: Sequence, insight: ConstructionInsight):
+        """Store a successfully generated insight"""
+        now = time.time()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO insights (key, value, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?)",
+            (self.key_for(key), insight.model_dump_json(), now, now)
+        )
+        self._writes += 1
+        if self._writes % EVICT_EVERY == 0:
+            self.evict()
+
+    def claim(self, key: Sequence, owner: str, seconds: float) -> bool:
+        """Take or renew a lease; False while another worker holds it"""
+        now = time.time()
+        # The upsert only replaces an expired lease or renews the owner's own, so exactly one claimant wins
+        cursor = self._connection().execute(
+            "INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE leases.expires_at < ? OR leases.owner = excluded.owner",
+            (self.key_for(key), owner, now + seconds, now)
+        )
+        return cursor.rowcount == 1
+
+    def release(self, key: Sequence, owner: str):
+        self._connection().execute(
+            "DELETE FROM leases WHERE key = ? AND owner = ?", (self.key_for(key), owner)
+        )
+
+    def evict(self) -> int:
+        """Drop expired entries and trim to max_entries, least recently used first"""
+        conn = self._connection()
+        expired = conn.execute(
+            "DELETE FROM insights WHERE created_at < ?", (time.time() - self.ttl,)
+        ).rowcount
+        trimmed = conn.execute(
+            "DELETE FROM insights WHERE key IN ("
+            "SELECT key FROM insights ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        ).rowcount
+        if trimmed:
+            self._count('evictions', trimmed)
+        conn.execute("DELETE FROM leases WHERE expires_at < ?", (time.time(),))
+        return expired + trimmed
+
+    def _count(self, name: str, amount: int):
+        self._connection().execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters (shared across workers) and current size"""
+        conn = self._connection()
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        hits = counters.get('hits', 0)
+        misses = counters.get('misses', 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get('evictions', 0),
+            "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": conn.execute("SELECT COUNT(*) FROM insights").fetchone()[0],
+            "version": self.version,
+        }
@@ -0,0 +1,389 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import Context, ContextVar
+from typing import Any, Coroutine, Deque, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+from metrics import LLM_BUDGET_EXCEEDED, LLM_CALL_SECONDS, LLM_CALLS, LLM_COST, LLM_TOKENS
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds covered by one usage aggregation window
+LLM_USAGE_WINDOW = float(os.getenv('LLM_USAGE_WINDOW', '60'))
+# Windows kept for /api/llm/usage (default one day of minutes)
+LLM_USAGE_RETENTION = int(os.getenv('LLM_USAGE_RETENTION', '1440'))
+# Tokens one request may spend on LLM calls (0 for no limit); X-LLM-Token-Budget can lower it
+LLM_REQUEST_TOKEN_BUDGET = int(os.getenv('LLM_REQUEST_TOKEN_BUDGET', '0'))
+# US dollars one request may spend on LLM calls (0 for no limit); X-LLM-Cost-Budget can lower it
+LLM_REQUEST_COST_BUDGET = float(os.getenv('LLM_REQUEST_COST_BUDGET', '0'))
+# What to do with a call that would exceed its budget: reject, or degrade to a cheaper, shorter call
+LLM_BUDGET_ACTION = os.getenv('LLM_BUDGET_ACTION', 'reject')
+# Model a degraded call falls back to
+LLM_DEGRADE_MODEL = os.getenv('LLM_DEGRADE_MODEL', 'gpt-4o-mini')
+# Fewest completion tokens worth sending a degraded call for
+LLM_DEGRADE_MIN_TOKENS = 64
+
+# US dollars per million tokens: input, cached input, output; override with LLM_PRICES (same JSON shape)
+DEFAULT_PRICES = {
+    "gpt-4o-mini": [0.15, 0.075, 0.60],
+    "gpt-4o": [2.50, 1.25, 10.00],
+    "gpt-4-turbo-preview": [10.00, 10.00, 30.00],
+}
+PRICES: Dict[str, List[float]] = {**DEFAULT_PRICES, **json.loads(os.getenv('LLM_PRICES', '{}'))}
+
+# Fields usage can be grouped by
+GROUP_FIELDS = ('endpoint', 'operation', 'model', 'phase', 'division')
+# Endpoint label for calls made outside a request, such as pre-warming
+BACKGROUND_ENDPOINT = 'background'
+
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """US dollars for one call; models without a price cost 0"""
+    price = PRICES.get(model)
+    if price is None:
+        return 0.0
+    return ((prompt_tokens - cached_tokens) * price[0] + cached_tokens * price[1]
+            + completion_tokens * price[2]) / 1e6
+
+
+def usage_counts(usage: Any) -> Tuple[int, int, int]:
+    """(prompt, completion, cached prompt) tokens from an OpenAI usage object"""
+    if usage is None:
+        return 0, 0, 0
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return (
+        usage.prompt_tokens or 0,
+        usage.completion_tokens or 0,
+        (getattr(details, 'cached_tokens', None) or 0) if details is not None else 0
+    )
+
+
+class LLMBudgetExceeded(Exception):
+    """An LLM call would take a request past its token or cost budget"""
+
+
+class RequestUsage:
+    """LLM tokens and cost spent on behalf of one HTTP request, and its budget"""
+
+    def __init__(self, scope: Optional[Dict] = None, token_budget: int = 0, cost_budget: float = 0.0):
+        self.scope = scope
+        self.token_budget = token_budget
+        self.cost_budget = cost_budget
+        self.tokens = 0
+        self.cost = 0.0
+        # Estimates held for shared work this request waits on, until its charge lands
+        self.reserved_tokens = 0.0
+        self.reserved_cost = 0.0
+
+    @property
+    def endpoint(self) -> str:
+        # The route template is only known once the router has matched the request
+        route = self.scope.get('route') if self.scope is not None else None
+        return getattr(route, 'path', None) or BACKGROUND_ENDPOINT
+
+    def _left(self) -> Tuple[float, float]:
+        """Tokens and cost still available, net of what is spent and reserved"""
+        return (
+            self.token_budget - self.tokens - self.reserved_tokens if self.token_budget else math.inf,
+            self.cost_budget - self.cost - self.reserved_cost if self.cost_budget else math.inf
+        )
+
+    def _fits(self, model: str, prompt_tokens: int, completion_tokens: int) -> bool:
+        tokens_left, cost_left = self._left()
+        return (prompt_tokens + completion_tokens <= tokens_left
+                and call_cost(model, prompt_tokens, completion_tokens) <= cost_left)
+
+    def admit(self, model: str, prompt_tokens: int, completion_tokens: int,
+              truncate: bool = True) -> Tuple[str, Optional[int]]:
+        """The model and completion token cap for a call, or LLMBudgetExceeded
+
+        Estimates are checked against what the request has left. Degrading
+        switches to LLM_DEGRADE_MODEL and, unless truncate is False, caps the
+        completion to the tokens that remain. Structured output cut short
+        cannot be parsed, so those calls only switch model when the whole
+        completion fits.
+        """
+        if self._fits(model, prompt_tokens, completion_tokens):
+            return model, None
+
+        if LLM_BUDGET_ACTION == 'degrade':
+            cheaper = LLM_DEGRADE_MODEL if LLM_DEGRADE_MODEL in PRICES else model
+            if not truncate:
+                if cheaper != model and self._fits(cheaper, prompt_tokens, completion_tokens):
+                    LLM_BUDGET_EXCEEDED.inc(endpoint=self.endpoint, action='degraded')
+                    return cheaper, None
+                raise self.reject(prompt_tokens + completion_tokens)
+            tokens_left, cost_left = self._left()
+            max_tokens = min(completion_tokens, tokens_left - prompt_tokens)
+            price = PRICES.get(cheaper)
+            if price is not None and price[2] and cost_left != math.inf:
+                max_tokens = min(max_tokens, int(
+                    (cost_left - call_cost(cheaper, prompt_tokens, 0)) * 1e6 / price[2]
+                ))
+            if max_tokens >= LLM_DEGRADE_MIN_TOKENS:
+                LLM_BUDGET_EXCEEDED.inc(endpoint=self.endpoint, action='degraded')
+                return cheaper, int(max_tokens)
+
+        raise self.reject(prompt_tokens + completion_tokens)
+
+    @contextmanager
+    def reserve(self, model: str, prompt_tokens: int, completion_tokens: int) -> Iterator[None]:
+        """Hold the estimate of a share of shared work against the budget while waiting on it
+
+        Raises LLMBudgetExceeded when it does not fit. Shared work is sent
+        once for every request waiting on it, so it can neither be degraded
+        nor capped for one of them. The actual share is charged while the
+        work runs; the reservation is released when the wait ends, whether
+        it succeeded or not.
+        """
+        if not self._fits(model, prompt_tokens, completion_tokens):
+            raise self.reject(prompt_tokens + completion_tokens)
+        tokens = prompt_tokens + completion_tokens
+        cost = call_cost(model, prompt_tokens, completion_tokens)
+        self.reserved_tokens += tokens
+        self.reserved_cost += cost
+        try:
+            yield
+        finally:
+            self.reserved_tokens -= tokens
+            self.reserved_cost -= cost
+
+    def reject(self, tokens: int) -> LLMBudgetExceeded:
+        """Count a rejected call and return the error to raise"""
+        LLM_BUDGET_EXCEEDED.inc(endpoint=self.endpoint, action='rejected')
+        return LLMBudgetExceeded(
+            f"LLM budget exceeded: {round(self.tokens)} tokens and ${self.cost:.4f} spent, "
+            f"{round(self.reserved_tokens)} tokens reserved, "
+            f"next call needs about {tokens} tokens"
+        )
+
+    def shares(self) -> List[Tuple['RequestUsage', float]]:
+        """The requests a call made in this context is charged to, and the share each pays"""
+        return [(self, 1.0)]
+
+    def charge(self, call: 'LLMCall', share: float = 1.0):
+        """Add a share of a call to this request, the ledger and the metrics"""
+        call = call._replace(
+            endpoint=self.endpoint,
+            prompt_tokens=call.prompt_tokens * share,
+            completion_tokens=call.completion_tokens * share,
+            cached_tokens=call.cached_tokens * share,
+            cost=call.cost * share,
+            seconds=call.seconds * share
+        )
+        self.tokens += call.prompt_tokens + call.completion_tokens
+        self.cost += call.cost
+        LEDGER.record(call, share)
+        labels = dict(endpoint=call.endpoint, model=call.model)
+        LLM_CALLS.inc(share, operation=call.operation, prompt_cache='hit' if call.cached_tokens else 'miss',
+                      **labels)
+        LLM_TOKENS.inc(call.prompt_tokens - call.cached_tokens, kind='prompt', **labels)
+        LLM_TOKENS.inc(call.cached_tokens, kind='cached_prompt', **labels)
+        LLM_TOKENS.inc(call.completion_tokens, kind='completion', **labels)
+        LLM_COST.inc(call.cost, **labels)
+
+
+class SharedUsage(RequestUsage):
+    """LLM usage of work several requests wait on, such as one insight generation or batch
+
+    Calls are charged to the requests that joined, in equal parts, or to
+    background when none did. A batch is built from the SharedUsage of each
+    of its items, which split their part again among their own joiners. No
+    budget applies to the shared work itself; each request checks its share
+    when it joins.
+    """
+
+    def __init__(self, parts: Sequence['SharedUsage'] = ()):
+        super().__init__()
+        self.parts = list(parts)
+        self.sharers: List[RequestUsage] = []
+
+    def join(self, usage: RequestUsage):
+        self.sharers.append(usage)
+
+    def shares(self) -> List[Tuple[RequestUsage, float]]:
+        if self.parts:
+            return [(usage, share / len(self.parts)) for part in self.parts for usage, share in part.shares()]
+        if not self.sharers:
+            return [(RequestUsage(), 1.0)]
+        return [(usage, 1.0 / len(self.sharers)) for usage in self.sharers]
+
+
+# Usage of the request being served; calls outside a request are attributed to BACKGROUND_ENDPOINT
+current_usage: ContextVar[Optional[RequestUsage]] = ContextVar('current_usage', default=None)
+
+
+def request_usage() -> RequestUsage:
+    usage = current_usage.get()
+    return usage if usage is not None else RequestUsage()
+
+
+def background_context(usage: Optional[RequestUsage] = None) -> Context:
+    """A fresh context for work that outlives or is shared beyond the request that started it
+
+    Tasks copy the caller's context, which would charge their LLM calls to
+    that request and hold them to its budget. Without usage, calls are
+    charged to background.
+    """
+    context = Context()
+    if usage is not None:
+        context.run(current_usage.set, usage)
+    return context
+
+
+def start_in_background(coro: Coroutine[Any, Any, Any], usage: Optional[RequestUsage] = None) -> asyncio.Task:
+    """Start a task in a background context (see background_context)
+
+    Tasks take the context current when they are created; running the
+    creation in the context, rather than passing context=, works before
+    Python 3.11.
+    """
+    return background_context(usage).run(asyncio.get_running_loop().create_task, coro)
+
+
+class LLMCall(NamedTuple):
+    endpoint: str
+    operation: str
+    model: str
+    phase: str
+    division: str
+    # Fractional for a request's share of shared work
+    prompt_tokens: float
+    completion_tokens: float
+    cached_tokens: float
+    cost: float
+    seconds: float
+
+
+# Totals kept per group: calls, prompt, completion and cached tokens, cost, seconds
+TOTAL_FIELDS = ('calls', 'prompt_tokens', 'completion_tokens', 'cached_tokens', 'cost_usd', 'seconds')
+
+
+class UsageLedger:
+    """LLM usage totals per (endpoint, operation, model, phase, division) in fixed time windows"""
+
+    def __init__(self, window: float = LLM_USAGE_WINDOW, retention: int = LLM_USAGE_RETENTION):
+        self.window = window
+        self._windows: Deque[Tuple[float, Dict[Tuple[str, ...], List[float]]]] = deque(maxlen=retention)
+        self._lock = threading.Lock()
+
+    def record(self, call: LLMCall, calls: float = 1.0):
+        start = time.time() // self.window * self.window
+        key = tuple(getattr(call, field) for field in GROUP_FIELDS)
+        values = (calls, call.prompt_tokens, call.completion_tokens, call.cached_tokens, call.cost, call.seconds)
+        with self._lock:
+            if not self._windows or self._windows[-1][0] != start:
+                self._windows.append((start, {}))
+            totals = self._windows[-1][1].setdefault(key, [0.0] * len(TOTAL_FIELDS))
+            for i, value in enumerate(values):
+                totals[i] += value
+
+    def summary(self, seconds: float, group_by: Sequence[str] = ('endpoint',)) -> Dict:
+        """Totals over the windows that started in the last `seconds`, grouped by the given fields"""
+        indexes = [GROUP_FIELDS.index(field) for field in group_by]
+        since = time.time() - seconds
+        groups: Dict[Tuple[str, ...], List[float]] = {}
+        with self._lock:
+            windows = [(start, dict(entries)) for start, entries in self._windows if start + self.window > since]
+            for _, entries in windows:
+                for key, totals in entries.items():
+                    group = groups.setdefault(tuple(key[i] for i in indexes), [0.0] * len(TOTAL_FIELDS))
+                    for i, value in enumerate(totals):
+                        group[i] += value
+
+        def row(key: Tuple[str, ...], totals: List[float]) -> Dict:
+            values = dict(zip(TOTAL_FIELDS, totals))
+            # Requests sharing a call each count their share of it
+            values['calls'] = round(values['calls'], 2)
+            for field in ('prompt_tokens', 'completion_tokens', 'cached_tokens'):
+                values[field] = round(values[field])
+            values['prompt_cache_hit_ratio'] = (
+                values['cached_tokens'] / values['prompt_tokens'] if values['prompt_tokens'] else 0.0
+            )
+            values['mean_seconds'] = values['seconds'] / values['calls'] if values['calls'] else 0.0
+            return {**dict(zip(group_by, key)), **values}
+
+        rows = sorted((row(key, totals) for key, totals in groups.items()),
+                      key=lambda item: item['cost_usd'], reverse=True)
+        total = [sum(group[i] for group in groups.values()) for i in range(len(TOTAL_FIELDS))]
+        return {
+            "since": windows[0][0] if windows else None,
+            "window_seconds": self.window,
+            "group_by": list(group_by),
+            "groups": rows,
+            "total": row((), total) if groups else row((), [0.0] * len(TOTAL_FIELDS))
+        }
+
+
+LEDGER = UsageLedger()
+
+
+def record_call(operation: str, model: str, prompt_tokens: int, completion_tokens: int,
+                cached_tokens: int, seconds: float, phase: str = '', division: str = ''):
+    """Account one LLM call to the requests it serves, the ledger and the metrics"""
+    call = LLMCall('', operation, model, str(phase or ''), str(division or ''),
+                   prompt_tokens, completion_tokens, cached_tokens,
+                   call_cost(model, prompt_tokens, completion_tokens, cached_tokens), seconds)
+    for usage, share in request_usage().shares():
+        usage.charge(call, share)
+    LLM_CALL_SECONDS.observe(seconds, operation=operation, model=model)
+
+
+def header_budget(value: Optional[str], default: float, cast) -> float:
+    """A budget header may only lower the configured budget"""
+    if not value:
+        return default
+    try:
+        requested = cast(value)
+    except ValueError:
+        return default
+    return min(requested, default) if default else requested
+
+
+class LLMUsageMiddleware:
+    """ASGI middleware tracking LLM usage per request and applying its budget
+
+    Non-streamed responses report what the request spent in the
+    X-LLM-Tokens and X-LLM-Cost headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        usage = RequestUsage(
+            scope,
+            token_budget=int(header_budget(headers.get('x-llm-token-budget'), LLM_REQUEST_TOKEN_BUDGET, int)),
+            cost_budget=header_budget(headers.get('x-llm-cost-budget'), LLM_REQUEST_COST_BUDGET, float)
+        )
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start' and usage.tokens:
+                message = dict(message, headers=[
+                    *message.get('headers', []),
+                    (b'x-llm-tokens', str(round(usage.tokens)).encode()),
+                    (b'x-llm-cost', f"{usage.cost:.6f}".encode())
+                ])
+            await send(message)
+
+        token = current_usage.set(usage)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_usage.reset(token)
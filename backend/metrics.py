@@ -0,0 +1,255 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from cache hits up to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class Metric:
+    """A named metric family; label values are passed as keyword arguments"""
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], Dict[LabelValues, float]]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Values computed at scrape time instead of tracked on the hot path
+        self.function = function
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> Iterable[Sample]:
+        values = self.function() if self.function is not None else dict(self._values)
+        for key, value in values.items():
+            yield self.name, self._labels(key), value
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            series = {key: (list(counts), total[0]) for key, (counts, total) in self._series.items()}
+        for key, (counts, total) in series.items():
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', dict(labels, le=_format_value(bound)), cumulative
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ('method', 'route', 'status')
+)
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    'http_requests_in_flight', 'HTTP requests currently being served'
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    'stage_duration_seconds', 'Time spent in each stage of request handling', ('stage',)
+)
+EXTERNAL_REQUESTS = REGISTRY.counter(
+    'external_requests_total', 'Calls to external services', ('target', 'outcome')
+)
+EXTERNAL_REQUEST_SECONDS = REGISTRY.histogram(
+    'external_request_duration_seconds', 'Latency of calls to external services', ('target',)
+)
+EXTERNAL_REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    'external_requests_in_flight', 'Calls to external services awaiting a response', ('target',)
+)
+LLM_TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    'llm_time_to_first_token_seconds', 'Time from sending a streamed LLM request to its first token',
+    ('operation',)
+)
+STREAMS = REGISTRY.counter(
+    'streams_total', 'Streamed responses by how they ended', ('route', 'outcome')
+)
+LLM_CALLS = REGISTRY.counter(
+    'llm_calls_total', 'LLM calls by endpoint, operation, model and whether the prompt cache was used',
+    ('endpoint', 'operation', 'model', 'prompt_cache')
+)
+LLM_TOKENS = REGISTRY.counter(
+    'llm_tokens_total', 'LLM tokens by endpoint, model and kind (prompt, cached_prompt, completion)',
+    ('endpoint', 'model', 'kind')
+)
+LLM_COST = REGISTRY.counter(
+    'llm_cost_usd_total', 'Estimated LLM spend in US dollars', ('endpoint', 'model')
+)
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    'llm_call_duration_seconds', 'Latency of LLM calls, whole response', ('operation', 'model')
+)
+LLM_BUDGET_EXCEEDED = REGISTRY.counter(
+    'llm_budget_exceeded_total', 'LLM calls over their request budget, by what was done with them',
+    ('endpoint', 'action')
+)
+
+
+@contextmanager
+def track_external(target: str):
+    """Count and time one call to an external service (airtable, openai, procore)"""
+    EXTERNAL_REQUESTS_IN_FLIGHT.inc(target=target)
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        EXTERNAL_REQUESTS_IN_FLIGHT.dec(target=target)
+        EXTERNAL_REQUEST_SECONDS.observe(time.perf_counter() - started, target=target)
+        EXTERNAL_REQUESTS.inc(target=target, outcome=outcome)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency per route template and in-flight requests
+
+    Latency covers the whole response, including streamed bodies.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = scope.get('route')
+            # Unmatched paths share one label so scanners cannot explode the series count
+            path = getattr(route, 'path', None) or 'unmatched'
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope['method'], route=path, status=str(status[0])
+            )
@@ -0,0 +1,49 @@
+import base64
+import hashlib
+import json
+from typing import Dict, Iterable, Optional, Tuple
+
+from filter_index import SortKey
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+
+
+def canonical_filter(phase_range: Tuple[int, int],
+                     wbs_categories: Iterable[str],
+                     duration_range: Tuple[int, int],
+                     divisions: Iterable[str]) -> Dict:
+    """Order-insensitive representation of an analytics filter"""
+    return {
+        "phase_range": [phase_range[0], phase_range[1]],
+        "wbs_categories": sorted(set(wbs_categories)),
+        "duration_range": [duration_range[0], duration_range[1]],
+        "divisions": sorted(set(divisions)),
+    }
+
+
+def filter_fingerprint(canonical: Dict) -> str:
+    return hashlib.sha256(
+        json.dumps(canonical, sort_keys=True, separators=(',', ':')).encode()
+    ).hexdigest()[:16]
+
+
+def encode_cursor(after: SortKey, fingerprint: str) -> str:
+    """Opaque cursor pointing just past a sort key, tied to the filter that produced it"""
+    payload = json.dumps({"a": list(after), "f": fingerprint}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str], fingerprint: str) -> Optional[SortKey]:
+    """Return the sort key a cursor resumes after; raises ValueError if it is malformed or for another filter"""
+    if not cursor:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        phase, key, record_id = payload["a"]
+        cursor_fingerprint = payload["f"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Malformed cursor")
+    if cursor_fingerprint != fingerprint:
+        raise ValueError("Cursor does not belong to this filter")
+    return (float(phase), str(key), str(record_id))
@@ -6,6 +6,7 @@ from dateutil import parser
 from dotenv import load_dotenv
 import mimetypes
 import tempfile
+from metrics import track_external
 
 # Load environment variables
 load_dotenv()
@@ -25,9 +26,16 @@ class ProcoreClient:
     def __init__(self):
         self.client_id = os.getenv('PROCORE_CLIENT_ID')
         self.client_secret = os.getenv('PROCORE_CLIENT_SECRET')
-        self.base_url = "https://api.procore.com"
+        self.base_url = os.getenv('PROCORE_BASE_URL', 'https://api.procore.com').rstrip('/')
         self.access_token = None
         
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request to Procore, raising for error statuses"""
+        with track_external('procore'):
+            response = requests.request(method, url, **kwargs)
+            response.raise_for_status()
+        return response
+
     def authenticate(self):
         """Get OAuth2 access token"""
         auth_url = f"{self.base_url}/oauth/token"
@@ -37,8 +45,7 @@ class ProcoreClient:
             'client_secret': self.client_secret
         }
         
-        response = requests.post(auth_url, data=data)
-        response.raise_for_status()
+        response = self._request('POST', auth_url, data=data)
         
         self.access_token = response.json()['access_token']
         return self.access_token
@@ -55,29 +62,25 @@ class ProcoreClient:
     def get_projects(self) -> List[Dict]:
         """Get all projects"""
         url = f"{self.base_url}/rest/v1.0/projects"
-        response = requests.get(url, headers=self.get_headers())
-        response.raise_for_status()
+        response = self._request('GET', url, headers=self.get_headers())
         return response.json()
         
     def get_tasks(self, project_id: int) -> List[Dict]:
         """Get all tasks for a project"""
         url = f"{self.base_url}/rest/v1.0/projects/{project_id}/tasks"
-        response = requests.get(url, headers=self.get_headers())
-        response.raise_for_status()
+        response = self._request('GET', url, headers=self.get_headers())
         return response.json()
         
     def create_task(self, project_id: int, task_data: Dict) -> Dict:
         """Create a new task in Procore"""
         url = f"{self.base_url}/rest/v1.0/projects/{project_id}/tasks"
-        response = requests.post(url, headers=self.get_headers(), json=task_data)
-        response.raise_for_status()
+        response = self._request('POST', url, headers=self.get_headers(), json=task_data)
         return response.json()
         
     def update_task(self, project_id: int, task_id: int, task_data: Dict) -> Dict:
         """Update an existing task"""
         url = f"{self.base_url}/rest/v1.0/projects/{project_id}/tasks/{task_id}"
-        response = requests.patch(url, headers=self.get_headers(), json=task_data)
-        response.raise_for_status()
+        response = self._request('PATCH', url, headers=self.get_headers(), json=task_data)
         return response.json()
         
     def sync_airtable_to_procore(self, project_id: int, airtable_record: Dict) -> Dict:
@@ -114,8 +117,7 @@ class ProcoreClient:
         if folder_path:
             params['folder_path'] = folder_path
             
-        response = requests.get(url, headers=self.get_headers(), params=params)
-        response.raise_for_status()
+        response = self._request('GET', url, headers=self.get_headers(), params=params)
         
         return [ProcoreDocument(doc) for doc in response.json()]
 
@@ -124,8 +126,7 @@ class ProcoreClient:
         url = f"{self.base_url}/rest/v1.0/projects/{project_id}/documents/search"
         params = {'query': query}
         
-        response = requests.get(url, headers=self.get_headers(), params=params)
-        response.raise_for_status()
+        response = self._request('GET', url, headers=self.get_headers(), params=params)
         
         return [ProcoreDocument(doc) for doc in response.json()]
 
@@ -159,8 +160,7 @@ class ProcoreClient:
     def download_document(self, project_id: int, document_id: int, save_path: str = None) -> str:
         """Download a document and return its path"""
         url = f"{self.base_url}/rest/v1.0/projects/{project_id}/documents/{document_id}/download"
-        response = requests.get(url, headers=self.get_headers(), stream=True)
-        response.raise_for_status()
+        response = self._request('GET', url, headers=self.get_headers(), stream=True)
         
         # Determine file extension from content type
         content_type = response.headers.get('content-type')
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Set
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Messages buffered per client before the oldest is dropped
+PROGRESS_QUEUE_SIZE = int(os.getenv('PROGRESS_QUEUE_SIZE', '16'))
+# Maximum intermediate progress updates per second per topic
+PROGRESS_MAX_RATE = float(os.getenv('PROGRESS_MAX_RATE', '5'))
+# Topic used by clients and requests that do not name one
+BROADCAST_TOPIC = "broadcast"
+
+
+def is_terminal(progress: Optional[float]) -> bool:
+    """Start, completion and error updates are never coalesced away"""
+    return progress is None or progress <= 0 or progress >= 1
+
+
+class Subscriber:
+    """A WebSocket's bounded outbox, drained by its own sender task"""
+
+    def __init__(self, websocket, topic: str, queue_size: int):
+        self.websocket = websocket
+        self.topic = topic
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def offer(self, message: Dict[str, Any]):
+        """Queue a message without waiting, discarding the oldest one if the client is behind"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def run(self):
+        while True:
+            message = await self.queue.get()
+            await self.websocket.send_json(message)
+
+
+class ProgressHub:
+    """Topic-based progress pub/sub for WebSocket clients
+
+    Publishing never awaits a client: every subscriber has its own bounded
+    queue (drop-oldest) and sender task, so one slow socket cannot stall a
+    request or other clients. Intermediate updates on a topic are coalesced
+    to at most max_rate per second, always keeping the latest one.
+    """
+
+    def __init__(self, queue_size: int = PROGRESS_QUEUE_SIZE, max_rate: float = PROGRESS_MAX_RATE):
+        self.queue_size = queue_size
+        self.min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self._topics: Dict[str, Set[Subscriber]] = {}
+        self._last_sent: Dict[str, float] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._flush_scheduled: Set[str] = set()
+        self.published = 0
+        self.coalesced = 0
+
+    def subscribe(self, websocket, topic: str = BROADCAST_TOPIC) -> Subscriber:
+        subscriber = Subscriber(websocket, topic, self.queue_size)
+        self._topics.setdefault(topic, set()).add(subscriber)
+        subscriber.task = asyncio.create_task(self._drain(subscriber))
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self._topics.get(subscriber.topic)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._topics[subscriber.topic]
+                self._last_sent.pop(subscriber.topic, None)
+        if subscriber.task is not None and subscriber.task is not asyncio.current_task():
+            subscriber.task.cancel()
+
+    async def _drain(self, subscriber: Subscriber):
+        try:
+            await subscriber.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending progress to client: {e}")
+            self.unsubscribe(subscriber)
+
+    def subscriber_count(self, topic: Optional[str] = None) -> int:
+        if topic is not None:
+            return len(self._topics.get(topic, ()))
+        return sum(len(subscribers) for subscribers in self._topics.values())
+
+    def publish(self, topic: str, message: str, progress: Optional[float] = None):
+        """Queue a progress update for every subscriber of a topic"""
+        self.published += 1
+        payload = {"message": message, "progress": progress}
+
+        if is_terminal(progress):
+            self._pending.pop(topic, None)
+            self._deliver(topic, payload)
+            return
+
+        elapsed = time.monotonic() - self._last_sent.get(topic, 0.0)
+        if elapsed >= self.min_interval and topic not in self._pending:
+            self._deliver(topic, payload)
+            return
+
+        if topic in self._pending:
+            self.coalesced += 1
+        self._pending[topic] = payload
+        if topic not in self._flush_scheduled:
+            self._flush_scheduled.add(topic)
+            asyncio.get_running_loop().call_later(
+                max(self.min_interval - elapsed, 0.0), self._flush, topic
+            )
+
+    def _flush(self, topic: str):
+        self._flush_scheduled.discard(topic)
+        payload = self._pending.pop(topic, None)
+        if payload is not None:
+            self._deliver(topic, payload)
+
+    def _deliver(self, topic: str, payload: Dict[str, Any]):
+        subscribers = self._topics.get(topic)
+        if not subscribers:
+            return
+        self._last_sent[topic] = time.monotonic()
+        for subscriber in list(subscribers):
+            subscriber.offer(payload)
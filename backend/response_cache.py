@@ -0,0 +1,58 @@
+import hashlib
+import os
+import time
+from typing import Dict, Hashable, NamedTuple, Optional
+
+from dotenv import load_dotenv
+
+from versioned_cache import VersionedCache
+
+# Load environment variables
+load_dotenv()
+
+# Seconds a cached response is served before it is recomputed
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '300'))
+# Distinct requests remembered per data version
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '256'))
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    created_at: float
+    media_type: str
+    # Compressed copies of body by content coding, filled in on first use
+    variants: Dict[str, bytes]
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def make_entry(body: bytes, media_type: str = "application/json") -> CachedResponse:
+    return CachedResponse(body=body, etag=make_etag(body), created_at=time.time(),
+                          media_type=media_type, variants={})
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value names this ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return any(tag[2:] == etag if tag.startswith('W/') else tag == etag for tag in candidates)
+
+
+class ResponseCache(VersionedCache):
+    """LRU of serialized responses, emptied when the data version changes and expired by TTL"""
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        super().__init__(maxsize, ttl)
+
+    def set(self, version: int, key: Hashable, body: bytes,
+            media_type: str = "application/json") -> CachedResponse:
+        """Store a response body and return it with its ETag"""
+        entry = make_entry(body, media_type)
+        super().set(version, key, entry)
+        return entry
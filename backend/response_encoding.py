@@ -0,0 +1,110 @@
+import gzip
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+# Optional accelerators; plain json and gzip are used when they are missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Load environment variables
+load_dotenv()
+
+# Bodies smaller than this many bytes are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.getenv('RESPONSE_COMPRESS_MIN_SIZE', '1024'))
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = {MSGPACK_MEDIA_TYPE, "application/x-msgpack"}
+
+
+def dumps_json(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=str, separators=(',', ':')).encode()
+
+
+def encode(payload: Any, media_type: str) -> bytes:
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return msgpack.packb(payload, default=str)
+    return dumps_json(payload)
+
+
+def _parse_header(value: Optional[str]) -> Dict[str, float]:
+    """Map each token of an Accept-style header to its q-value"""
+    tokens = {}
+    for part in (value or "").split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, number = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        tokens[name] = quality
+    return tokens
+
+
+def negotiate_media_type(accept: Optional[str]) -> str:
+    """MessagePack when the client asks for it and msgpack is installed, JSON otherwise"""
+    if msgpack is None:
+        return JSON_MEDIA_TYPE
+    accepted = _parse_header(accept)
+    msgpack_quality = max((accepted.get(name, 0.0) for name in MSGPACK_MEDIA_TYPES), default=0.0)
+    json_quality = max(accepted.get(JSON_MEDIA_TYPE, 0.0), accepted.get("*/*", 0.0))
+    return MSGPACK_MEDIA_TYPE if msgpack_quality > 0 and msgpack_quality >= json_quality else JSON_MEDIA_TYPE
+
+
+def negotiate_content_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick br (if brotli is installed) or gzip from Accept-Encoding, None for identity"""
+    accepted = _parse_header(accept_encoding)
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+    best = None
+    for encoding in candidates:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def parse_list(value: Optional[str]) -> Optional[List[str]]:
+    """Comma-separated query parameter to a list; None when not given"""
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def project(mapping: Optional[Dict], keys: Optional[Iterable[str]], drop_empty: bool = False) -> Optional[Dict]:
+    """Keep only the given keys (all when keys is None), optionally dropping None/empty values"""
+    if mapping is None:
+        return None
+    if keys is not None:
+        mapping = {key: mapping[key] for key in keys if key in mapping}
+    if drop_empty:
+        mapping = {key: value for key, value in mapping.items() if value not in (None, "")}
+    return mapping
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Cross-worker progress and rate limiting; turn off for a single worker to skip the SQLite round trips
+SHARED_STATE_ENABLED = os.getenv('SHARED_STATE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SHARED_STATE_PATH = os.getenv(
+    'SHARED_STATE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shared_state.sqlite3')
+)
+# Seconds between progress exchanges with other workers
+PROGRESS_POLL_INTERVAL = float(os.getenv('PROGRESS_POLL_INTERVAL', '0.1'))
+# Progress events older than this many seconds are deleted
+PROGRESS_EVENT_RETENTION = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    worker TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    message TEXT NOT NULL,
+    progress REAL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS token_buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+ProgressEvent = Tuple[int, str, str, Optional[float]]
+
+
+class ThreadConnections:
+    """Per-thread connections to a SQLite database in WAL mode that several processes share
+
+    sqlite3 connections cannot be shared across threads, so each thread
+    opens its own on first use and creates the schema if it is missing;
+    nothing touches the file until then.
+    """
+
+    def __init__(self, path: str, schema: str):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.schema)
+            self._local.conn = conn
+        return conn
+
+
+class SharedState:
+    """SQLite database in WAL mode shared by every worker process on the host"""
+
+    def __init__(self, path: str = SHARED_STATE_PATH):
+        self.path = path
+        self._connections = ThreadConnections(path, SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    def last_event_id(self) -> int:
+        return self.connection().execute(
+            "SELECT COALESCE(MAX(id), 0) FROM progress_events"
+        ).fetchone()[0]
+
+    def exchange_events(self, outgoing: List[Tuple], after_id: int,
+                        worker: str) -> List[ProgressEvent]:
+        """Write this worker's events and return other workers' events newer than after_id"""
+        conn = self.connection()
+        if outgoing:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO progress_events (worker, topic, message, progress, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                outgoing
+            )
+            conn.execute("COMMIT")
+        return conn.execute(
+            "SELECT id, topic, message, progress FROM progress_events "
+            "WHERE id > ? AND worker != ? ORDER BY id",
+            (after_id, worker)
+        ).fetchall()
+
+    def trim_events(self, older_than: float):
+        self.connection().execute("DELETE FROM progress_events WHERE created_at < ?", (older_than,))
+
+    def take_token(self, name: str, rate: float, capacity: int) -> float:
+        """Take one token from a named bucket; returns 0, or the seconds to wait if it is empty"""
+        conn = self.connection()
+        # IMMEDIATE takes the write lock up front so two workers cannot both spend the last token
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM token_buckets WHERE name = ?", (name,)
+            ).fetchone()
+            now = time.time()
+            tokens = float(capacity) if row is None else min(
+                capacity, row[0] + max(now - row[1], 0.0) * rate
+            )
+            delay = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                delay = (1 - tokens) / rate
+            conn.execute(
+                "INSERT INTO token_buckets (name, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, "
+                "updated_at = excluded.updated_at",
+                (name, tokens, now)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return delay
+
+
+class SharedTokenBucket:
+    """Token bucket whose state lives in SharedState, so all workers draw from one budget"""
+
+    def __init__(self, state: SharedState, name: str, rate: float, capacity: int):
+        self.state = state
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+
+    async def try_take(self) -> float:
+        return await asyncio.to_thread(self.state.take_token, self.name, self.rate, self.capacity)
+
+
+class ProgressBroker:
+    """Relays progress between worker processes through SharedState
+
+    Updates go to the local hub immediately and are written to SQLite in
+    batches; each worker polls for other workers' updates and republishes
+    them to its own subscribers, so a socket on any worker sees progress
+    from a request handled by any other.
+    """
+
+    def __init__(self, hub, state: Optional[SharedState],
+                 poll_interval: float = PROGRESS_POLL_INTERVAL):
+        self.hub = hub
+        self.state = state
+        self.poll_interval = poll_interval
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._outbox: List[Tuple] = []
+        self._last_id = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def publish(self, topic: str, message: str, progress: Optional[float] = None):
+        self.hub.publish(topic, message, progress)
+        if self.state is not None:
+            self._outbox.append((self.worker_id, topic, message, progress, time.time()))
+
+    async def _exchange(self):
+        outgoing, self._outbox = self._outbox, []
+        events = await asyncio.to_thread(
+            self.state.exchange_events, outgoing, self._last_id, self.worker_id
+        )
+        for event_id, topic, message, progress in events:
+            self._last_id = event_id
+            self.hub.publish(topic, message, progress)
+
+    async def run(self):
+        self._last_id = await asyncio.to_thread(self.state.last_event_id)
+        last_trim = time.time()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self._exchange()
+                if time.time() - last_trim > PROGRESS_EVENT_RETENTION:
+                    last_trim = time.time()
+                    await asyncio.to_thread(
+                        self.state.trim_events, last_trim - PROGRESS_EVENT_RETENTION
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Progress exchange with other workers failed: {e}")
+
+    def start(self):
+        if self.state is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+_shared_state: Optional[SharedState] = None
+
+
+def get_shared_state() -> Optional[SharedState]:
+    """The host-wide shared state, or None when SHARED_STATE_ENABLED is off"""
+    global _shared_state
+    if SHARED_STATE_ENABLED and _shared_state is None:
+        _shared_state = SharedState()
+    return _shared_state
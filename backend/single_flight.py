@@ -0,0 +1,33 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    """One call per key at a time; callers asking for a key already in flight wait on that call
+
+    Each flight can carry state shared by its callers, such as who to charge
+    for it, made by state_factory when the flight starts.
+    """
+
+    def __init__(self, state_factory: Optional[Callable[[], Any]] = None):
+        self.state_factory = state_factory
+        self._flights: Dict[Hashable, Tuple[asyncio.Future, Any]] = {}
+        # Callers that joined a flight instead of starting one
+        self.joined = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def join(self, key: Hashable, start: Callable[[Any], Awaitable[Any]]) -> Tuple[Awaitable[Any], Any]:
+        """The result of the flight for key, started as start(state) if none is running, and its state"""
+        flight = self._flights.get(key)
+        if flight is None:
+            state = self.state_factory() if self.state_factory is not None else None
+            future = asyncio.ensure_future(start(state))
+            flight = self._flights[key] = (future, state)
+            future.add_done_callback(lambda f, key=key: self._flights.pop(key, None))
+        else:
+            self.joined += 1
+        future, state = flight
+        # Shielded so one cancelled caller does not cancel the call others are waiting on
+        return asyncio.shield(future), state
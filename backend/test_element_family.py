@@ -0,0 +1,31 @@
+from insight_pipeline import element_family
+
+# Element key -> the family whose insight it shares
+EXPECTED = {
+    '1.1: A393_SERVICE_PIT_2': 'A393_SERVICE_PIT',
+    '1.1: A393_SERVICE_PIT': 'A393_SERVICE_PIT',
+    '2.4: FOOTING_F1': 'FOOTING_F1',
+    '2.4: FOOTING_F2': 'FOOTING_F2',
+    '3.1: WALL TYPE W2 #3': 'WALL_TYPE_W2',
+    '3.1: Wall Type W2 (3)': 'WALL_TYPE_W2',
+    '3.1: WALL-TYPE-W2 [104512]': 'WALL_TYPE_W2',
+    '4.2: COLUMN_12': 'COLUMN',
+    '4.2: COLUMN 12 3': 'COLUMN',
+    '5.1: DOOR_A393': 'DOOR_A393',
+    '5.1: A393': 'A393',
+    '6.1: 12': '12',
+}
+
+
+def test_element_family():
+    print("\nTesting element families...")
+    for item_key, family in EXPECTED.items():
+        result = element_family(item_key)
+        print(f"  {item_key!r} -> {result!r}")
+        assert result == family, f"{item_key!r}: expected {family!r}, got {result!r}"
+    # Different type marks are different elements and must not share an insight
+    assert element_family('FOOTING_F1') != element_family('FOOTING_F2')
+
+
+if __name__ == "__main__":
+    test_element_family()
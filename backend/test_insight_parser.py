@@ -0,0 +1,127 @@
+import os
+import time
+
+from insight_parser import INSIGHT_SECTION_FIELDS, parse_sections
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_data', 'insight_responses')
+# Parses per response in the speed comparison
+ITERATIONS = 2000
+# Upper bound on the average parse time; an insight call itself takes seconds
+MAX_PARSE_MICROSECONDS = 1000
+
+# Per corpus file: field -> text the field must start with
+EXPECTED = {
+    'plain_numbered.txt': {
+        'construction_details': "- Excavation requirements and soil preparation",
+        'submittals': "- Shop drawings for reinforcement",
+        'specifications': "- Section 03 30 00 Cast-in-Place Concrete",
+        'rfis': "- Confirm pit depth",
+        'photos_required': "- Subgrade prior to reinforcement placement",
+        'best_practices': "- Keep the excavation dewatered",
+        'safety_considerations': "- Slope or shore excavations",
+        'dependencies': "- Geotechnical report",
+        'estimated_labor_hours': "- Crew of one foreman",
+        'material_specifications': "- Concrete: 4,000 psi",
+        'quality_control': "- Hold point for subgrade acceptance",
+        'coordination_notes': "- Geotechnical report",
+    },
+    'markdown_headings.txt': {
+        'construction_details': "The slab on grade is placed after underslab utilities are complete.",
+        'submittals': "- Mix design",
+        'specifications': "Section 03 30 00 and ACI 302.1R",
+        'quality_control': "Check subgrade elevations",
+        'material_specifications': "4,000 psi concrete",
+    },
+    'bold_headings.txt': {
+        'construction_details': "Set anchor bolts with templates",
+        'rfis': "Connection details at the moment frames",
+        'estimated_labor_hours': "Raising gang of five ironworkers",
+        'quality_control': "Third-party inspection",
+    },
+    'nested_lists.txt': {
+        'construction_details': "1. Lay out the wall lines",
+        'submittals': "1. Product data for studs and track",
+        'specifications': "Section 05 40 00",
+        'dependencies': "Slab cured and layout approved",
+        'coordination_notes': "Coordinate blocking locations",
+    },
+    'unnumbered.txt': {
+        'construction_details': "This element is a standard interior partition.",
+        'quality_control': "",
+    },
+}
+
+
+def load_corpus():
+    corpus = {}
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        with open(os.path.join(CORPUS_DIR, name), encoding='utf-8') as f:
+            corpus[name] = f.read()
+    return corpus
+
+
+def legacy_parse(content: str):
+    """The previous parser: a substring search over every paragraph for each field"""
+    sections = content.split('\n\n')
+
+    def extract(keyword):
+        for section in sections:
+            if keyword.lower() in section.lower():
+                return section.strip()
+        return ""
+
+    return {
+        'construction_details': extract("construction process"),
+        'submittals': extract("submittals"),
+        'specifications': extract("specifications"),
+        'rfis': extract("rfi"),
+        'photos_required': extract("photos"),
+        'best_practices': extract("best practices"),
+        'safety_considerations': extract("safety"),
+        'dependencies': extract("dependencies"),
+        'estimated_labor_hours': extract("labor"),
+        'material_specifications': extract("material"),
+        'quality_control': extract("quality"),
+        'coordination_notes': extract("coordination"),
+    }
+
+
+def test_insight_parser():
+    print("\nTesting insight response parser...")
+    corpus = load_corpus()
+    assert set(EXPECTED) <= set(corpus)
+
+    for name, content in corpus.items():
+        parsed = parse_sections(content)
+        assert set(parsed) == set(INSIGHT_SECTION_FIELDS)
+        for field, start in EXPECTED.get(name, {}).items():
+            assert parsed[field].startswith(start), f"{name} {field}: {parsed[field][:80]!r}"
+        print(f"  {name}: {sum(1 for value in parsed.values() if value)} sections")
+
+    # Sections hold only their own content: sub-lists stay put, quality control is not
+    # taken from the construction process section that mentions it
+    parsed = parse_sections(corpus['plain_numbered.txt'])
+    assert "Quality control checkpoints" in parsed['construction_details']
+    assert "Quality control checkpoints" not in parsed['quality_control']
+    assert "Required Submittals" not in parsed['construction_details']
+    assert legacy_parse(corpus['plain_numbered.txt'])['quality_control'].startswith("1. Construction Process")
+    parsed = parse_sections(corpus['nested_lists.txt'])
+    assert "3. Quality control checkpoint" in parsed['construction_details']
+    assert parsed['quality_control'].startswith("Verify plumb")
+    # Multi-paragraph sections are kept whole
+    parsed = parse_sections(corpus['markdown_headings.txt'])
+    assert "saw-cut control joints" in parsed['construction_details']
+
+    timings = {}
+    for label, parse in (("legacy", legacy_parse), ("single pass", parse_sections)):
+        started = time.perf_counter()
+        for _ in range(ITERATIONS):
+            for content in corpus.values():
+                parse(content)
+        timings[label] = (time.perf_counter() - started) / (ITERATIONS * len(corpus)) * 1e6
+        print(f"  {label}: {timings[label]:.1f} us per response")
+    assert timings["single pass"] < MAX_PARSE_MICROSECONDS
+
+
+if __name__ == "__main__":
+    test_insight_parser()
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import tempfile
+
+from construction_ai_agent import INSIGHT_MODEL, ConstructionInsight
+from insight_pipeline import InsightPipeline
+from insight_prewarm import InsightPrewarmer, PrewarmJob, job_keys, read_checkpoint, write_checkpoint
+from insight_store import InsightStore
+from llm_usage import LEDGER, RequestUsage, current_usage, record_call, request_usage
+
+# Records in the simulated table; each is its own element family
+RECORDS = 30
+# Tokens one simulated insight call uses
+PROMPT_TOKENS = 120
+COMPLETION_TOKENS = 700
+# Optional insight sections the fake answers leave out
+OPTIONAL_SECTIONS = (
+    'estimated_labor_hours', 'material_specifications', 'submittals', 'specifications', 'rfis', 'quality_control',
+    'photos_required', 'coordination_notes'
+)
+# Budget of the request that starts the job, far below what the job spends
+CALLER_TOKEN_BUDGET = 5000
+
+
+class FakeAgent:
+    """Stands in for OpenAI, admitting and accounting calls like ConstructionAIAgent does"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def agenerate_construction_insights(self, items):
+        prompt, completion = PROMPT_TOKENS * len(items), COMPLETION_TOKENS * len(items)
+        request_usage().admit(INSIGHT_MODEL, prompt, completion)
+        await asyncio.sleep(0.01)
+        self.calls += 1
+        record_call('insight_batch', INSIGHT_MODEL, prompt, completion, 0, 0.01)
+        return [
+            ConstructionInsight(item_key=item['key'], phase_number=str(item['phase_number']),
+                                construction_details='details', best_practices='',
+                                safety_considerations='', dependencies='', **dict.fromkeys(OPTIONAL_SECTIONS))
+            for item in items
+        ]
+
+
+class FakeAgentPipeline(InsightPipeline):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fake_agent = FakeAgent()
+
+    @property
+    def agent(self):
+        return self.fake_agent
+
+
+def make_records():
+    return [
+        {'id': f'rec{i}', 'fields': {
+            'key': f'{i}.1: ELEMENT_{chr(65 + i % 26)}{chr(65 + i // 26)}', 'Phase': i % 4,
+            'Division': ['03'], 'WBS Category Level 1': 'Foundation'
+        }}
+        for i in range(RECORDS)
+    ]
+
+
+async def run_prewarm_test(directory: str):
+    records = make_records()
+    checkpoint_path = os.path.join(directory, 'prewarm_checkpoint.json')
+    pipeline = FakeAgentPipeline(store=InsightStore(path=os.path.join(directory, 'insights.sqlite3')))
+
+    async def load_records():
+        return records
+
+    prewarmer = InsightPrewarmer(pipeline, load_records, checkpoint_path=checkpoint_path,
+                                 concurrency=4, rate=1000, checkpoint_interval=0.05)
+
+    # Started from a request with a small budget, as POST /api/insights/prewarm would be
+    caller = RequestUsage(token_budget=CALLER_TOKEN_BUDGET)
+    token = current_usage.set(caller)
+    try:
+        job = await prewarmer.start()
+    finally:
+        current_usage.reset(token)
+    await prewarmer._task
+
+    total = len(job_keys(records))
+    background = [group for group in LEDGER.summary(600)['groups'] if group['endpoint'] == 'background']
+    print(f"  {job.generated}/{total} generated, {len(job.failed)} failed, caller charged {caller.tokens} tokens")
+    # The job is neither limited by nor charged to the request that started it
+    assert not job.failed
+    assert job.generated == total and job.status == 'completed'
+    assert caller.tokens == 0
+    assert background and background[0]['completion_tokens'] >= COMPLETION_TOKENS * total
+    assert read_checkpoint(checkpoint_path).status == 'completed'
+
+    # A job cut short resumes from its checkpoint; finished keys are not generated again
+    keys = job_keys(records) + [('NEW_ELEMENT', '1', "['03']", 'Foundation')]
+    interrupted = PrewarmJob(keys)
+    interrupted.done = set(keys[:10])
+    write_checkpoint(checkpoint_path, interrupted)
+    calls_before = pipeline.fake_agent.calls
+    resumed = await prewarmer.resume()
+    await prewarmer._task
+    print(f"  resumed: {resumed.generated} generated, {resumed.cached} cached")
+    assert resumed.id == interrupted.id
+    assert resumed.generated == 1 and resumed.cached == len(keys) - 11
+    assert pipeline.fake_agent.calls == calls_before + 1
+
+
+def test_insight_prewarm():
+    print("\nTesting insight pre-warming...")
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run_prewarm_test(directory))
+
+
+if __name__ == "__main__":
+    test_insight_prewarm()
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import tempfile
+
+from construction_ai_agent import (
+    INSIGHT_BATCH_BASE_TOKENS, INSIGHT_MODEL, INSIGHT_OUTPUT_TOKENS_PER_ITEM, ConstructionInsight,
+    estimate_batch_item_tokens
+)
+from insight_pipeline import InsightPipeline, insight_key
+from insight_store import InsightStore
+from llm_usage import LLMBudgetExceeded, RequestUsage, current_usage, record_call, request_usage
+
+# Records one request asks insights for, each its own element family
+ITEMS = 25
+# Optional insight sections the fake answers leave out
+OPTIONAL_SECTIONS = (
+    'estimated_labor_hours', 'material_specifications', 'submittals', 'specifications', 'rfis', 'quality_control',
+    'photos_required', 'coordination_notes'
+)
+# Budget of the request, enough for a few of its insights only
+TOKEN_BUDGET = 3000
+
+
+class FakeAgent:
+    """Stands in for OpenAI, admitting and accounting calls like ConstructionAIAgent does"""
+
+    async def agenerate_construction_insights(self, items):
+        # Priced like a real batch: the shared prompt plus each item's line and answer
+        prompt = INSIGHT_BATCH_BASE_TOKENS + sum(
+            estimate_batch_item_tokens(item) - INSIGHT_OUTPUT_TOKENS_PER_ITEM for item in items
+        )
+        completion = INSIGHT_OUTPUT_TOKENS_PER_ITEM * len(items)
+        request_usage().admit(INSIGHT_MODEL, prompt, completion)
+        await asyncio.sleep(0.01)
+        record_call('insight_batch', INSIGHT_MODEL, prompt, completion, 0, 0.01)
+        return [
+            ConstructionInsight(item_key=item['key'], phase_number=str(item['phase_number']),
+                                construction_details='details', best_practices='',
+                                safety_considerations='', dependencies='', **dict.fromkeys(OPTIONAL_SECTIONS))
+            for item in items
+        ]
+
+
+class FakeAgentPipeline(InsightPipeline):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fake_agent = FakeAgent()
+
+    @property
+    def agent(self):
+        return self.fake_agent
+
+
+async def run_budget_test(directory: str):
+    pipeline = FakeAgentPipeline(store=InsightStore(path=os.path.join(directory, 'insights.sqlite3')))
+    keys = [
+        insight_key({'key': f'{i}.1: ELEMENT_{chr(65 + i)}', 'Phase': 1,
+                     'Division': ['03'], 'WBS Category Level 1': 'Foundation'})
+        for i in range(ITEMS)
+    ]
+
+    usage = RequestUsage(token_budget=TOKEN_BUDGET)
+    token = current_usage.set(usage)
+    try:
+        results = await pipeline.generate_all(keys)
+    finally:
+        current_usage.reset(token)
+
+    generated = [result for result in results if isinstance(result, ConstructionInsight)]
+    refused = [result for result in results if isinstance(result, LLMBudgetExceeded)]
+    print(f"  {len(generated)} generated, {len(refused)} refused, charged {usage.tokens} of {TOKEN_BUDGET} tokens")
+    # Concurrent items reserve their estimate, so together they cannot overrun the budget
+    assert 0 < usage.tokens <= TOKEN_BUDGET
+    assert generated and refused
+    # Every item is accounted for: none is dropped without saying why
+    assert len(generated) + len(refused) == ITEMS
+    assert usage.reserved_tokens == 0 and usage.reserved_cost == 0
+
+
+def test_llm_budget():
+    print("\nTesting LLM budget reservations...")
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run_budget_test(directory))
+
+
+if __name__ == "__main__":
+    test_llm_budget()
@@ -0,0 +1,105 @@
+import asyncio
+import random
+import time
+
+from progress_hub import ProgressHub
+
+# Simulated clients per run
+FAST_CLIENTS = 400
+SLOW_CLIENTS = 50
+BROKEN_CLIENTS = 50
+# Progress updates published by one simulated analytics request
+UPDATES = 500
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0.0, broken: bool = False):
+        self.delay = delay
+        self.broken = broken
+        self.received = []
+
+    async def send_json(self, message):
+        if self.broken:
+            raise ConnectionResetError("client went away")
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received.append(message)
+
+
+async def run_load_test():
+    hub = ProgressHub(queue_size=8, max_rate=20)
+
+    fast = [FakeWebSocket(delay=random.uniform(0, 0.002)) for _ in range(FAST_CLIENTS)]
+    slow = [FakeWebSocket(delay=1.0) for _ in range(SLOW_CLIENTS)]
+    broken = [FakeWebSocket(broken=True) for _ in range(BROKEN_CLIENTS)]
+    other_topic = [FakeWebSocket() for _ in range(10)]
+
+    for websocket in fast + slow + broken:
+        hub.subscribe(websocket, "request-1")
+    for websocket in other_topic:
+        hub.subscribe(websocket, "request-2")
+
+    # Publishing must never wait on clients, however slow
+    publish_times = []
+
+    def publish(message, progress):
+        started = time.perf_counter()
+        hub.publish("request-1", message, progress)
+        publish_times.append(time.perf_counter() - started)
+
+    publish("Starting analysis...", 0)
+    for i in range(1, UPDATES):
+        publish(f"Processing record {i}/{UPDATES}...", i / UPDATES)
+        if i % 50 == 0:
+            await asyncio.sleep(0.05)
+    publish("Analysis complete!", 1.0)
+
+    await asyncio.sleep(0.5)
+
+    delivered = [len(websocket.received) for websocket in fast]
+    results = {
+        "clients": FAST_CLIENTS + SLOW_CLIENTS + BROKEN_CLIENTS,
+        "updates_published": hub.published,
+        "updates_coalesced": hub.coalesced,
+        "publish_time_max_ms": max(publish_times) * 1000,
+        "fast_client_messages_min": min(delivered),
+        "fast_client_messages_max": max(delivered),
+        "slow_client_queue_max": max(hub_queue_size(hub, websocket) for websocket in slow),
+        "subscribers_left": hub.subscriber_count("request-1"),
+    }
+
+    assert results["publish_time_max_ms"] < 100
+    # Every fast client saw the final message, and far fewer messages than were published
+    assert all(websocket.received[-1]["progress"] == 1.0 for websocket in fast)
+    assert max(delivered) < UPDATES / 5
+    # Slow clients never buffer more than the queue bound
+    assert results["slow_client_queue_max"] <= 8
+    # Broken clients were dropped, healthy ones kept
+    assert results["subscribers_left"] == FAST_CLIENTS + SLOW_CLIENTS
+    # Other topics are isolated
+    assert all(not websocket.received for websocket in other_topic)
+
+    for subscribers in list(hub._topics.values()):
+        for subscriber in list(subscribers):
+            hub.unsubscribe(subscriber)
+
+    return results
+
+
+def hub_queue_size(hub: ProgressHub, websocket) -> int:
+    for subscribers in hub._topics.values():
+        for subscriber in subscribers:
+            if subscriber.websocket is websocket:
+                return subscriber.queue.qsize()
+    return 0
+
+
+def test_progress_load():
+    print("\nTesting progress fan-out under load...")
+    results = asyncio.run(run_load_test())
+    for name, value in results.items():
+        print(f"  {name}: {value:.2f}" if isinstance(value, float) else f"  {name}: {value}")
+
+
+if __name__ == "__main__":
+    test_progress_load()